@@ -0,0 +1,127 @@
+import os
+import numpy as np
+import geopandas as gpd
+import pytest
+from shapely.geometry import box
+
+class FakeBand:
+    """In-memory stand-in for a gdal.Band."""
+    def __init__(self, array, block, nodata):
+        self.array = array
+        self.block = block
+        self.nodata = nodata
+        self.DataType = 6 if array.dtype == np.float32 else 7
+        self.reads = 0
+
+    def GetBlockSize(self):
+        return list(self.block)
+
+    def GetNoDataValue(self):
+        return self.nodata
+
+    def SetNoDataValue(self, value):
+        self.nodata = value
+
+    def ReadAsArray(self, xoff=0, yoff=0, width=None, height=None):
+        self.reads += 1
+        width = self.array.shape[1] if width is None else width
+        height = self.array.shape[0] if height is None else height
+        return self.array[yoff:yoff+height, xoff:xoff+width].copy()
+
+    def WriteArray(self, array, xoff, yoff):
+        self.array[yoff:yoff+array.shape[0], xoff:xoff+array.shape[1]] = array
+
+class FakeDataset:
+    """In-memory stand-in for a single band gdal.Dataset."""
+    def __init__(self, array, gt=(0, 1, 0, 0, 0, -1), block=(64, 64), nodata=-9999):
+        self.band = FakeBand(array, block, nodata)
+        self.RasterXSize = array.shape[1]
+        self.RasterYSize = array.shape[0]
+        self.gt = gt
+
+    def GetRasterBand(self, i):
+        return self.band
+
+    def GetGeoTransform(self):
+        return self.gt
+
+    def SetGeoTransform(self, gt):
+        self.gt = gt
+
+    def GetProjection(self):
+        return ""
+
+    def SetProjection(self, wkt):
+        pass
+
+    def GetDescription(self):
+        return "fake"
+
+    def ReadAsArray(self, xoff, yoff, width, height):
+        return self.band.ReadAsArray(xoff, yoff, width, height)
+
+    def FlushCache(self):
+        pass
+
+@pytest.fixture
+def synthetic_dem():
+    """Smooth random terrain with pits and a block of nodata."""
+    from scipy import ndimage
+    rng = np.random.default_rng(1)
+    z = ndimage.gaussian_filter(rng.normal(size=(120,150)), 3) * 50
+    z[40:50,20:45] = np.nan
+    return z
+
+def write_asgs_gpkg(path, nx=8, ny=8, mb_split=2):
+    """Write a small ASGS Main Structure geopackage: 2 states split into 2 SA4s each, with unit SA1s."""
+    def frame(rows):
+        for row in rows:
+            row.setdefault('AUS_CODE_2021', 'AUS')
+            row.setdefault('AREA_ALBERS_SQKM', row['geometry'].area)
+            row.setdefault('ASGS_LOCI_URI_2021', 'uri')
+        return gpd.GeoDataFrame(rows, crs='EPSG:7844')
+
+    states, gccsa, sa4, sa3, sa2, sa1, mb = [], [], [], [], [], [], []
+    state_names = ['Queensland', 'New South Wales']
+    gccsa_names = ['Greater Brisbane', 'Greater Sydney']
+    for s in range(2):
+        code = str(s + 1)
+        x0 = s * nx / 2
+        state = dict(STATE_CODE_2021=code, STATE_NAME_2021=state_names[s])
+        states.append(dict(state, geometry=box(x0, 0, x0 + nx/2, ny)))
+        gcc = dict(state, GCCSA_CODE_2021=code + 'GRE', GCCSA_NAME_2021=gccsa_names[s])
+        gccsa.append(dict(gcc, geometry=box(x0, 0, x0 + nx/2, ny)))
+        for a in range(2):
+            c4 = code + '0' + str(a)
+            geom = box(x0, a*ny/2, x0 + nx/2, (a + 1)*ny/2)
+            r4 = dict(gcc, SA4_CODE_2021=c4, SA4_NAME_2021='SA4 ' + c4)
+            sa4.append(dict(r4, geometry=geom))
+            r3 = dict(r4, SA3_CODE_2021=c4 + '01', SA3_NAME_2021='SA3 ' + c4)
+            sa3.append(dict(r3, geometry=geom))
+            r2 = dict(r3, SA2_CODE_2021=c4 + '010001', SA2_NAME_2021='SA2 ' + c4)
+            sa2.append(dict(r2, geometry=geom))
+            k = 0
+            for i in range(int(nx/2)):
+                for j in range(int(ny/2)):
+                    x, y = x0 + i, a*ny/2 + j
+                    r1 = dict(r2, SA1_CODE_2021=r2['SA2_CODE_2021'] + '%02d' % k)
+                    sa1.append(dict(r1, geometry=box(x, y, x + 1, y + 1)))
+                    w = 1 / mb_split
+                    for m in range(mb_split):
+                        mb.append(dict(r1, MB_CODE_2021='M' + r1['SA1_CODE_2021'] + str(m),
+                                       geometry=box(x + m*w, y, x + (m + 1)*w, y + 1)))
+                    k += 1
+    layers = {'AUS_2021_AUST_GDA2020': [dict(AUS_CODE_2021='AUS', AUS_NAME_2021='Australia', geometry=box(0, 0, nx, ny))],
+              'STE_2021_AUST_GDA2020': states, 'GCCSA_2021_AUST_GDA2020': gccsa,
+              'SA4_2021_AUST_GDA2020': sa4, 'SA3_2021_AUST_GDA2020': sa3,
+              'SA2_2021_AUST_GDA2020': sa2, 'SA1_2021_AUST_GDA2020': sa1, 'MB_2021_AUST_GDA2020': mb}
+    fpath = os.path.join(path, 'ASGS_2021_Main_Structure_GDA2020.gpkg')
+    for layer, rows in layers.items():
+        frame(rows).to_file(fpath, layer=layer, driver='GPKG', engine='pyogrio')
+    return fpath
+
+@pytest.fixture
+def asgs_dir(tmp_path):
+    """Directory holding a synthetic ASGS Main Structure geopackage."""
+    write_asgs_gpkg(str(tmp_path))
+    return str(tmp_path)
@@ -0,0 +1,29 @@
+from wombat.cache import LRUCache
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+    assert cache.stats()['evictions'] == 1
+
+def test_byte_limit():
+    cache = LRUCache(maxsize=None, max_bytes=10, sizeof=len)
+    cache.put('a', 'x'*6)
+    cache.put('b', 'x'*6)
+    assert list(cache._data) == ['b'] and cache.nbytes == 6
+    cache.put('c', 'x'*11)
+    assert 'c' not in cache
+
+def test_get_or_compute_counts():
+    cache = LRUCache()
+    calls = []
+    for _ in range(3):
+        assert cache.get_or_compute('k', lambda: calls.append(1) or 42) == 42
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (2, 1)
+    cache.clear()
+    assert len(cache) == 0 and cache.stats()['hits'] == 2
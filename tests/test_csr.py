@@ -0,0 +1,12 @@
+import numpy as np
+from wombat.csr import expand_ranges, csr_rows
+
+def test_csr_rows():
+    indptr, indices = np.array([0, 2, 2, 5]), np.array([7, 8, 1, 2, 3])
+    assert csr_rows(indptr, indices, [2, 0]).tolist() == [1, 2, 3, 7, 8]
+    assert csr_rows(indptr, indices, [1]).tolist() == []
+
+def test_expand_ranges():
+    values, owner = expand_ranges(np.array([0, 2, 2, 5]), np.array([2, 0]))
+    assert values.tolist() == [2, 3, 4, 0, 1]
+    assert owner.tolist() == [0, 0, 0, 1, 1]
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from conftest import FakeDataset
+from wombat.elevation import Elevation
+from wombat.raster import RasterBlocks
+
+def fake_elevation(z, gt=(150.0, 0.01, 0, -30.0, 0, -0.01)):
+    """Elevation reading an in-memory DEM, without any dataset files."""
+    elevation = Elevation.__new__(Elevation)
+    elevation.ds = FakeDataset(z, gt=gt, block=(16, 16))
+    elevation.blocks = RasterBlocks(elevation.ds)
+    elevation.gt = gt
+    return elevation
+
+def pixel_lonlat(gt, cols, rows):
+    """Coordinates of fractional pixel positions, the inverse of lonlat_to_pixel."""
+    return gt[0] + np.asarray(cols)*gt[1], gt[3] + np.asarray(rows)*gt[5]
+
+@pytest.mark.parametrize("method, surface", [('bilinear', lambda x, y: 2 + 0.5*x - 0.25*y),
+                                             ('bicubic', lambda x, y: 1 + 0.1*x*x - 0.2*x*y + 0.05*y*y)])
+def test_sample_reproduces_surface(method, surface):
+    # pixel values are the surface at the pixel centres
+    y, x = np.mgrid[0:40, 0:50] + 0.5
+    elevation = fake_elevation(surface(x, y))
+    rng = np.random.default_rng(0)
+    cols, rows = rng.uniform(3, 47, 200), rng.uniform(3, 37, 200)
+    lons, lats = pixel_lonlat(elevation.gt, cols, rows)
+    assert np.allclose(elevation.sample(lons, lats, method=method), surface(cols, rows))
+
+def test_sample_outside_and_nearest():
+    z = np.arange(40*50, dtype=np.float64).reshape(40, 50)
+    elevation = fake_elevation(z)
+    lons, lats = pixel_lonlat(elevation.gt, [10.7, -1.0, 20.2], [5.2, 3.0, 45.0])
+    out = elevation.sample(lons, lats)
+    assert out[0] == z[5, 10] and np.isnan(out[1:]).all()
+
+def test_line_of_sight_over_a_wall():
+    z = np.zeros((60, 60))
+    z[:35, 30] = 50.0
+    z[55, 55] = -9999
+    elevation = fake_elevation(z)
+    src = pixel_lonlat(elevation.gt, [10.5, 10.5, 10.5, 10.5, 10.5, 10.5], [10.5, 50.5, 10.5, 20.5, 10.5, 10.5])
+    dst = pixel_lonlat(elevation.gt, [50.5, 50.5, 50.5, 25.5, 70.5, 55.5], [10.5, 50.5, 10.5, 20.5, 10.5, 55.5])
+    heights = [2.0, 2.0, 500.0, 2.0, 2.0, 2.0]
+    visible = elevation.line_of_sight(*src, heights, *dst, 2.0, curvature_coeff=0, chunk_size=2)
+    # behind the wall, past its end, high above it, in front of it, off the DEM, onto nodata
+    assert visible.tolist() == [False, True, True, True, False, False]
+
+class FakeViewshed:
+    """Stand-in for gdal.ViewshedGenerate marking cells within 3 pixels of the observer as visible (1)."""
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, band, driver, name, options, x, y, observer_height, target_height, *args):
+        self.calls.append(dict(band=band, driver=driver, x=x, y=y, observer_height=observer_height,
+                               max_distance=args[-1]))
+        gt = band.dataset.GetGeoTransform()
+        rows, cols = np.mgrid[0:band.array.shape[0], 0:band.array.shape[1]]
+        near = np.hypot(cols + 0.5 - x / gt[1], rows + 0.5 - y / gt[5]) <= 3
+        return FakeDataset(np.where(near, 1.0, 0.0))
+
+def test_gdal_viewshed_mem_dataset(monkeypatch):
+    import wombat.elevation as elevation_module
+    datasets = []
+    def open_array(array):
+        ds = FakeDataset(array, gt=None, nodata=None)
+        ds.band.dataset = ds
+        datasets.append(ds)
+        return ds
+    fake = FakeViewshed()
+    monkeypatch.setattr(elevation_module.gdal_array, 'OpenArray', open_array, raising=False)
+    monkeypatch.setattr(elevation_module.gdal, 'ViewshedGenerate', fake, raising=False)
+    monkeypatch.setattr(elevation_module.gdal, 'GVM_Edge', 2, raising=False)
+
+    z = np.zeros((60, 80), dtype=np.float32)
+    z[30, 40] = -9999
+    elevation = fake_elevation(z)
+    elevation.x_start, elevation.y_start = 20, 10
+    elevation.elevation_data = z[10:50, 20:70]
+    elevation.extent = [150.2, 150.7, -30.5, -30.1]
+    lons, lats = pixel_lonlat(elevation.gt, [25.5, 60.5], [15.5, 40.5])
+
+    visible = elevation.gdal_viewshed(lons, lats, observer_height=10.0, max_distance=500.0, workers=1)
+    assert visible.shape == (2, 40, 50) and visible.dtype == bool
+    # one MEM dataset per thread, float32 with the nodata cell as NaN and a local metric geotransform
+    assert len(datasets) == 1
+    array = datasets[0].band.array
+    assert array.dtype == np.float32 and np.isnan(array[20, 20]) and np.isnan(array).sum() == 1
+    assert np.isnan(datasets[0].band.nodata)
+    gt = datasets[0].GetGeoTransform()
+    assert gt[0] == 0 and gt[3] == 0 and gt[1] > 0 and gt[5] < 0
+    assert [fake.calls[i]['x'] / gt[1] for i in range(2)] == [5.5, 40.5]
+    assert [fake.calls[i]['y'] / gt[5] for i in range(2)] == [5.5, 30.5]
+    assert all(c['driver'] == 'MEM' and c['observer_height'] == 10.0 and c['max_distance'] == 500.0 for c in fake.calls)
+    assert visible[0, 5, 5] and not visible[0, 30, 40] and visible[1, 30, 40]
+    single = elevation.gdal_viewshed(lons[0], lats[0], workers=1)
+    assert single.shape == (40, 50) and np.array_equal(single, visible[0])
+
+@pytest.mark.parametrize("all_touched", [False, True])
+def test_compare_dem_files_zonal_stats(monkeypatch, all_touched):
+    import geopandas as gpd
+    import shapely
+    import wombat.elevation as elevation_module
+    gt = (150.0, 0.01, 0, -30.0, 0, -0.01)
+    rng = np.random.default_rng(3)
+    ref, other = rng.normal(size=(30, 40)), rng.normal(size=(30, 40))
+    monkeypatch.setattr(elevation_module.gdal, 'Open', lambda fname: FakeDataset(ref.copy(), gt=gt, block=(16, 16)), raising=False)
+    monkeypatch.setattr(elevation_module, 'warp_to_window', lambda fname, ds, window, resampling: FakeDataset(other.copy(), block=(16, 16)))
+    # a zone over pixels 0-9 x 0-19 and one well inside pixel (25, 15) that misses its centre
+    big = shapely.box(150.0, -30.1, 150.2, -30.0)
+    small = shapely.box(150.2502, -30.1598, 150.2504, -30.1596)
+    zones = gpd.GeoDataFrame({'name': ['big', 'small']}, geometry=[big, small], index=['big', 'small'])
+    stats = elevation_module.compare_dem_files('ref.tif', 'other.tif', zones=zones, tile_size=16, all_touched=all_touched)
+    diff = ref - other
+    assert stats.loc['big', 'count'] == 200
+    assert np.isclose(stats.loc['big', 'mean'], diff[:10, :20].mean())
+    assert np.isclose(stats.loc['big', 'rmse'], np.sqrt((diff[:10, :20]**2).mean()))
+    assert np.isclose(stats.loc['big', 'max'], diff[:10, :20].max())
+    if not all_touched:
+        assert stats.loc['small', 'count'] == 0 and np.isnan(stats.loc['small', 'mean'])
+    else:
+        assert stats.loc['small', 'count'] == 1 and np.isclose(stats.loc['small', 'mean'], diff[15, 25])
@@ -0,0 +1,229 @@
+import os
+import geopandas as gpd
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pyproj
+import pytest
+import shapely
+from wombat.boundary import GeoHierarchy, RadiusIndex, node_to_gdf
+import wombat.hierarchy as hierarchy
+from wombat.hierarchy import HierarchyStore, AncestorIndex, LabelIndex, load_layer_manifest
+
+def constructed(asgs_dir):
+    h = GeoHierarchy(asgs_dir)
+    h.gpkg_files = h.gpkg_files[:1]
+    h.construct_full_hierarchy()
+    return h
+
+def built(asgs_dir):
+    h = GeoHierarchy(asgs_dir)
+    h.gpkg_files = h.gpkg_files[:1]
+    h.build(workers=1)
+    return h
+
+def test_store_round_trip(asgs_dir):
+    h = constructed(asgs_dir)
+    h.save(gpickle=False, columnar=True)
+    loaded = GeoHierarchy(asgs_dir)
+    loaded.load()
+    nodes = list(h.G.nodes)
+    assert loaded.store.ids.tolist() == nodes
+    assert set(loaded.G.edges) == set(h.G.edges)
+    assert node_to_gdf(h.G, nodes).geometry.geom_equals(loaded.to_gdf(nodes).geometry).all()
+
+def test_build_matches_graph_construction(asgs_dir):
+    ref = constructed(asgs_dir)
+    h = built(asgs_dir)
+    assert list(ref.G.nodes) == h.store.ids.tolist()
+    assert set(ref.G.edges) == set(h.G.edges)
+    for n in ref.G.nodes:
+        for key in ['label','uri','area_sqkm','level']:
+            assert ref.G.nodes[n][key] == h.G.nodes[n][key], (n, key)
+    nodes = list(ref.G.nodes)
+    assert node_to_gdf(ref.G, nodes).geometry.geom_equals(h.to_gdf(nodes).geometry).all()
+
+def test_rebuild_keeps_derived_files(asgs_dir):
+    h = built(asgs_dir)
+    h.build_pyramids(['SA2'], tolerances=[0.01])
+    h.build_topology(['SA1'])
+    h.build(workers=1)
+    assert os.path.exists(h.store.pyramid_path('SA2', 0.01))
+    assert os.path.exists(h.store.topology_path('SA1'))
+
+def test_ancestor_index_matches_graph(asgs_dir):
+    G = constructed(asgs_dir).G
+    store = HierarchyStore.from_graph(G, geometry=False)
+    ancestry = AncestorIndex(store.parent_indptr, store.parent_indices)
+    for pos in store.level_positions('MB')[:10]:
+        expected = sorted(store.ids.get_indexer(list(nx.ancestors(G, store.ids[pos]))))
+        assert ancestry.ancestors_of([pos]).tolist() == expected
+
+def test_label_index_modes():
+    index = LabelIndex(np.array(['Greater Sydney', 'Sydney City', 'Brisbane Inner', None], dtype=object))
+    assert sorted(index.search('Sydney')) == [0, 1]
+    assert list(index.search('sydney', mode='prefix', case=False)) == [1]
+    assert list(index.search('Brisbane Inner', mode='exact')) == [2]
+
+def test_locate_reads_ancestors_off_meshblocks(asgs_dir):
+    h = built(asgs_dir)
+    rng = np.random.default_rng(0)
+    lons, lats = rng.uniform(-1, 9, 500), rng.uniform(-1, 9, 500)
+    df = h.locate(lons, lats, chunk_size=128, workers=2)
+    points = shapely.points(lons, lats)
+    ids = h.store.ids.to_numpy()
+    interior = (np.abs(lons - np.round(lons)) > 1e-6) & (np.abs(lats - np.round(lats)) > 1e-6)
+    for level in ['SA1','SA4','STATE']:
+        ref = h.point_in_level(points, level)
+        assert ((ref < 0) == df[level].isna()).all()
+        assert (ids[ref[(ref >= 0) & interior]] == df[level].to_numpy()[(ref >= 0) & interior]).all()
+    outside = df['MB'].isna()
+    assert outside.any() and all(v is None for v in df.loc[outside, 'STATE'])
+
+def test_gpickle_load_keeps_geometry(asgs_dir, monkeypatch):
+    import pickle
+    h = constructed(asgs_dir)
+    with open(h.fileout, 'wb') as f:
+        pickle.dump(h.G, f)
+    monkeypatch.setattr(nx, 'read_gpickle', lambda path: pickle.load(open(path, 'rb')), raising=False)
+    loaded = GeoHierarchy(asgs_dir)
+    loaded.load()
+    assert loaded.store.has_geometry
+    tree, pos = loaded.level_tree('SA1')
+    assert len(tree.geometries) == len(pos) == 64
+
+def test_missing_geometry_raises(asgs_dir):
+    store = HierarchyStore.from_graph(constructed(asgs_dir).G, geometry=False)
+    with pytest.raises(ValueError, match="geometry not available"):
+        store.get_wkb([0])
+
+def test_neighbours_queen_and_rook(asgs_dir):
+    h = built(asgs_dir)
+    assert sorted(h.get_neighbours('100', contiguity='queen')) == ['101', '200', '201']
+    assert sorted(h.get_neighbours('100', contiguity='rook')) == ['101', '200']
+
+def test_spatial_weights_row_standardised(asgs_dir):
+    h = built(asgs_dir)
+    W, ids = h.spatial_weights('SA4', contiguity='rook', row_standardise=True)
+    assert list(ids) == list(h.store.ids[h.store.level_positions('SA4')])
+    assert np.allclose(W.sum(axis=1), 1.0)
+    row = dict(zip(ids, W.toarray()[list(ids).index('100')]))
+    assert row == {'100': 0.0, '101': 0.5, '200': 0.5, '201': 0.0}
+
+def test_aggregate(asgs_dir):
+    h = built(asgs_dir)
+    mb = pd.Series(1.0, index=h.store.ids[h.store.level_positions('MB')])
+    assert h.aggregate(mb, to_levels='STATE').to_dict() == {'1': 64.0, '2': 64.0}
+    sums = h.aggregate(mb, to_levels=['SA1', 'SA4'])
+    assert (sums['SA1'] == 2).all() and (sums['SA4'] == 32).all()
+    # the two meshblocks of every SA1 hold 1 and 3 and have the same area
+    odd = mb.index.str[-1] == '1'
+    mb[odd] = 3.0
+    assert (h.aggregate(mb, to_levels='STATE', how='mean') == 2).all()
+    assert np.allclose(h.aggregate(mb, to_levels='STATE', how='weighted'), 2)
+    weights = pd.Series(np.where(odd, 3.0, 1.0), index=mb.index)
+    assert np.allclose(h.aggregate(mb, to_levels='STATE', how='weighted', weights=weights), 2.5)
+
+def test_aggregate_nan_only_targets(asgs_dir):
+    h = built(asgs_dir)
+    mb = pd.Series(1.0, index=h.store.ids[h.store.level_positions('MB')])
+    mb[mb.index.str.startswith('M1')] = np.nan
+    for how in ['sum', 'mean', 'weighted']:
+        state = h.aggregate(mb, to_levels='STATE', how=how)
+        assert np.isnan(state['1']) and state['2'] == (64 if how == 'sum' else 1)
+
+def geod_distance_km(geoms, lon, lat):
+    """Brute-force geodesic distance (km) from a centre to densified geometries, zero inside."""
+    geod = pyproj.Geod(ellps='WGS84')
+    out = []
+    for geom in geoms:
+        xy = shapely.get_coordinates(shapely.segmentize(geom, 0.005))
+        d = geod.inv(np.full(len(xy), lon), np.full(len(xy), lat), xy[:, 0], xy[:, 1])[2].min() / 1000
+        out.append(0.0 if geom.contains(shapely.points(lon, lat)) else d)
+    return np.array(out)
+
+def test_radius_index_matches_geod():
+    rng = np.random.default_rng(2)
+    points = shapely.points(rng.uniform(150, 152, 400), rng.uniform(-35, -33, 400))
+    index = RadiusIndex(points)
+    lons, lats, radii = [151.0, 150.2, 151.8], [-34.0, -33.1, -34.9], [50.0, 20.0, 120.0]
+    membership = index.query(lons, lats, radii).toarray()
+    for i in range(3):
+        d = geod_distance_km(points, lons[i], lats[i])
+        # the index works on a sphere, so allow for the ellipsoid at the edge of the radius
+        clear = np.abs(d - radii[i]) > 0.005 * radii[i]
+        assert (membership[i][clear] == (d[clear] <= radii[i])).all()
+
+def test_within_radius_matches_geod(asgs_dir):
+    h = built(asgs_dir)
+    membership, ids = h.within_radius([2.3, 6.5], [3.7, 1.2], [150.0, 60.0], 'SA1')
+    tree, pos = h.level_tree('SA1')
+    assert list(ids) == list(h.store.ids[pos])
+    for i, (lon, lat, radius) in enumerate([(2.3, 3.7, 150.0), (6.5, 1.2, 60.0)]):
+        d = geod_distance_km(tree.geometries, lon, lat)
+        clear = np.abs(d - radius) > 0.005 * radius
+        selected = membership.toarray()[i]
+        assert selected.any() and (selected[clear] == (d[clear] <= radius)).all()
+
+def test_query_cache_hands_out_copies(asgs_dir):
+    h = built(asgs_dir)
+    first = h.query('SA4', belonging_to='Queensland')
+    assert (h.cache_info()['hits'], h.cache_info()['misses']) == (0, 1)
+    expected = first.copy()
+    first['label'] = 'changed'
+    first.drop(first.index[0], inplace=True)
+    second = h.query('SA4', belonging_to='Queensland')
+    assert (h.cache_info()['hits'], h.cache_info()['misses']) == (1, 1)
+    assert second is not first and len(second) == 2
+    assert second.drop(columns='geometry').equals(expected.drop(columns='geometry'))
+    assert second.geometry.geom_equals(expected.geometry).all()
+
+def write_indigenous_gpkg(path, name='Region'):
+    """Indigenous Structure geopackage with one region, area and location per state of write_asgs_gpkg."""
+    layers = {'IREG': [], 'IARE': [], 'ILOC': []}
+    for s in range(2):
+        state, geom = str(s + 1), shapely.box(4*s, 0, 4*s + 4, 8)
+        common = dict(AUS_CODE_2021='AUS', STATE_CODE_2021=state, AREA_ALBERS_SQKM=geom.area, ASGS_LOCI_URI_2021='uri', geometry=geom)
+        layers['IREG'].append(dict(common, IREG_CODE_2021='R' + state, IREG_NAME_2021=name + state))
+        layers['IARE'].append(dict(common, IREG_CODE_2021='R' + state, IARE_CODE_2021='A' + state, IARE_NAME_2021='Area' + state))
+        layers['ILOC'].append(dict(common, IARE_CODE_2021='A' + state, ILOC_CODE_2021='L' + state, ILOC_NAME_2021='Loc' + state))
+    fpath = os.path.join(path, 'ASGS_Ed3_2021_Indigenous_Structure_GDA2020.gpkg')
+    for level, rows in layers.items():
+        gpd.GeoDataFrame(rows, crs='EPSG:7844').to_file(fpath, layer=level + '_2021_AUST_GDA2020', driver='GPKG', engine='pyogrio')
+    return fpath
+
+def test_layer_manifest_rescans_changed_files(asgs_dir, monkeypatch):
+    main = os.path.join(asgs_dir, 'ASGS_2021_Main_Structure_GDA2020.gpkg')
+    indigenous = write_indigenous_gpkg(asgs_dir)
+    fmanifest = os.path.join(asgs_dir, 'manifest.json')
+    scanned = []
+    scan = hierarchy.scan_gpkg_layers
+    monkeypatch.setattr(hierarchy, 'scan_gpkg_layers', lambda fpath: scanned.append(fpath) or scan(fpath))
+    manifest = load_layer_manifest([main, indigenous], fmanifest)
+    assert scanned == [main, indigenous]
+    assert 'IREG_2021_AUST_GDA2020' in manifest[os.path.abspath(indigenous)]['layers']
+    assert load_layer_manifest([main, indigenous], fmanifest) == manifest and len(scanned) == 2
+    stat = os.stat(indigenous)
+    os.utime(indigenous, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    load_layer_manifest([main, indigenous], fmanifest)
+    assert scanned == [main, indigenous, indigenous]
+
+def test_incremental_build_rereads_changed_layers(asgs_dir):
+    write_indigenous_gpkg(asgs_dir)
+    h = GeoHierarchy(asgs_dir)
+    h.gpkg_files = [h.gpkg_files[0], h.gpkg_files[3]]
+    first = h.build(workers=1, fingerprint='content')
+    assert 'MB_2021_AUST_GDA2020' in first and 'IREG_2021_AUST_GDA2020' in first
+    write_indigenous_gpkg(asgs_dir, name='Renamed')
+    second = h.build(workers=1, fingerprint='content')
+    # only the renamed layer is read again, every Main Structure layer comes from the cache
+    assert [k for k in second if k.endswith('GDA2020')] == ['IREG_2021_AUST_GDA2020']
+    assert h.store.nodes.loc['R1', 'label'] == 'Renamed1'
+
+def test_load_keeps_graph_lazy(asgs_dir):
+    built(asgs_dir)
+    h = GeoHierarchy(asgs_dir)
+    h.load()
+    assert h._G is None and len(h.store) > 0
+    assert h.get_neighbours('100') and h._G is None
+    assert h.G.number_of_nodes() == len(h.store) and h._G is not None
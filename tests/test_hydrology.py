@@ -0,0 +1,102 @@
+import types
+import numpy as np
+import pytest
+from scipy import ndimage
+from conftest import FakeDataset
+import wombat.hydrology as hydrology
+from wombat.hydrology import priority_flood, d8_flow_direction, flow_accumulation, InundationSweep
+
+def naive_fill(z):
+    """Iterate filled = max(z, min(filled of the 8 neighbours)) from the edges until nothing changes."""
+    valid = np.isfinite(z)
+    edge = ~ndimage.binary_erosion(valid, structure=np.ones((3, 3)), border_value=0) & valid
+    filled = np.where(edge, z, np.inf)
+    while True:
+        lowest = ndimage.minimum_filter(np.where(valid, filled, np.inf), size=3, mode='constant', cval=np.inf)
+        new = np.where(valid, np.maximum(z, np.minimum(filled, lowest)), np.nan)
+        if np.array_equal(new, filled, equal_nan=True):
+            return filled
+        filled = new
+
+def test_priority_flood_matches_naive_fill(synthetic_dem):
+    filled = priority_flood(synthetic_dem, epsilon=False)
+    assert np.array_equal(filled, naive_fill(synthetic_dem), equal_nan=True)
+    assert (np.nan_to_num(filled - synthetic_dem) >= 0).all()
+
+def test_epsilon_fill_drains_every_cell(synthetic_dem):
+    filled = priority_flood(synthetic_dem)
+    assert np.nanmax(np.abs(filled - priority_flood(synthetic_dem, epsilon=False))) < 1e-9
+    direction = d8_flow_direction(filled)
+    # only cells on the border or next to nodata may lack a downslope neighbour
+    interior = ndimage.binary_erosion(np.isfinite(synthetic_dem), structure=np.ones((3, 3)), border_value=0)
+    assert (direction[interior] >= 0).all()
+
+@pytest.mark.parametrize('method', ['d8', 'dinf'])
+def test_flow_accumulation_conserves_cells(synthetic_dem, method):
+    filled = priority_flood(synthetic_dem)
+    acc = flow_accumulation(filled, method=method)
+    outlets = (d8_flow_direction(filled) < 0) & np.isfinite(filled)
+    assert np.nanmin(acc) >= 1
+    assert np.isclose(np.nansum(acc[outlets]), np.isfinite(synthetic_dem).sum())
+
+class SerialExecutor:
+    """Runs pool tasks in this process, so the tests see the monkeypatched dataset."""
+    def __init__(self, max_workers=None, initializer=None, initargs=()):
+        initializer(*initargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
+
+@pytest.mark.parametrize('tile_size', [16, 37, 64, 1000])
+def test_fill_tiled_matches_priority_flood(synthetic_dem, monkeypatch, tile_size):
+    src = FakeDataset(np.where(np.isnan(synthetic_dem), -9999, synthetic_dem))
+    dst = FakeDataset(np.full(synthetic_dem.shape, -1.0))
+    monkeypatch.setattr(hydrology, 'gdal', types.SimpleNamespace(
+        Open=lambda filename: src, GDT_Float32=6,
+        GetDriverByName=lambda name: types.SimpleNamespace(Create=lambda *args: dst)))
+    monkeypatch.setattr(hydrology, 'ProcessPoolExecutor', SerialExecutor)
+    hydrology.fill_tiled('dem.tif', 'filled.tif', tile_size=tile_size)
+    expected = priority_flood(synthetic_dem, epsilon=False).astype(np.float32)
+    assert np.array_equal(dst.band.array, expected, equal_nan=True)
+
+def test_inundation_matches_connected_flooding(synthetic_dem):
+    seeds = np.zeros(synthetic_dem.shape, dtype=bool)
+    seeds[:, 0] = True
+    sweep = InundationSweep(synthetic_dem, seeds=seeds)
+    for level in [-20.0, 0.0, 5.0, 30.0]:
+        wet, _ = ndimage.label(synthetic_dem <= level, structure=np.ones((3, 3)))
+        expected = np.isin(wet, np.unique(wet[seeds & (synthetic_dem <= level)])) & (wet > 0)
+        assert np.array_equal(sweep.extent(level), expected)
+        assert np.allclose(sweep.depth(level)[expected], level - synthetic_dem[expected])
+
+def test_inundation_curves_match_extents(synthetic_dem):
+    sweep = InundationSweep(synthetic_dem)
+    zones = np.full(synthetic_dem.shape, -1)
+    zones[10:30, 10:30], zones[60:100, 80:140] = 3, 7
+    curves = sweep.curves(zones, [0.0, 10.0]).set_index(['zone', 'level'])
+    for zone in [3, 7]:
+        inside = (zones == zone) & np.isfinite(synthetic_dem)
+        for level in [0.0, 10.0]:
+            wet = sweep.extent(level) & inside
+            row = curves.loc[(zone, level)]
+            assert row['inundated'] == wet.sum() and row['cells'] == inside.sum()
+            assert np.isclose(row['mean_depth'], (level - synthetic_dem[wet]).sum() / inside.sum())
+
+def test_inundation_seeds():
+    dem = np.random.default_rng(0).random((20, 25)) * 10
+    # without nodata the flood starts from the border, as in priority_flood
+    assert np.array_equal(InundationSweep(dem).first_level, priority_flood(dem, epsilon=False))
+    with pytest.raises(ValueError):
+        InundationSweep(dem, seeds=np.zeros(dem.shape, dtype=bool))
+
+def test_inundation_curves_without_zone_cells():
+    sweep = InundationSweep(np.random.default_rng(0).random((10, 10)))
+    curves = sweep.curves(-np.ones((10, 10), int), [0.5])
+    assert curves.empty
+    assert list(curves.columns) == ['zone', 'level', 'cells', 'inundated', 'fraction', 'mean_depth', 'max_depth']
@@ -0,0 +1,52 @@
+import numpy as np
+from conftest import FakeDataset
+from wombat.cache import LRUCache
+from wombat.raster import RasterBlocks, lonlat_to_pixel
+
+def grid():
+    z = np.arange(100*130, dtype=np.float32).reshape(100, 130)
+    z[5, 7] = -9999
+    return z
+
+def test_gather_reads_each_block_once():
+    z = grid()
+    ds = FakeDataset(z, block=(32, 16))
+    rows = np.append(np.repeat(np.arange(100), 13), [-1, 100, 5, np.nan])
+    cols = np.append(np.tile(np.arange(0, 130, 10), 100), [0, 0, 7, 3])
+    values = RasterBlocks(ds).gather(rows, cols)
+    inside = np.isfinite(rows) & (rows >= 0) & (rows < 100)
+    expected = np.full(len(rows), np.nan)
+    expected[inside] = z[rows[inside].astype(int), cols[inside]]
+    expected[expected == -9999] = np.nan
+    assert np.array_equal(values, expected, equal_nan=True)
+    # the sampled columns stop short of the last block column
+    assert ds.band.reads == 4*7
+
+def test_window_matches_slicing():
+    z = grid()
+    blocks = RasterBlocks(FakeDataset(z, block=(32, 16)))
+    out = blocks.window(-3, 90, 40, 20)
+    ref = np.full((20, 40), np.nan)
+    ref[:10, 3:] = z[90:100, 0:37]
+    assert np.array_equal(out, ref, equal_nan=True)
+    assert np.isnan(blocks.window(5, 3, 4, 4)[2, 2])
+
+def test_native_window_keeps_dtype_and_nodata():
+    z = grid()
+    out = RasterBlocks(FakeDataset(z, block=(32, 16))).window(0, 0, 140, 10, native=True)
+    assert out.dtype == np.float32
+    assert out[5, 7] == -9999 and out[0, 135] == -9999
+    assert np.array_equal(out[:, :130], z[:10])
+
+def test_cached_blocks_are_read_once():
+    ds = FakeDataset(grid(), block=(32, 16))
+    blocks = RasterBlocks(ds, cache=LRUCache(maxsize=100))
+    blocks.window(0, 0, 64, 32)
+    assert ds.band.reads == 2*2
+    blocks.window(0, 0, 130, 100)
+    assert ds.band.reads == 5*7
+    assert blocks.read_block(0, 0).flags.writeable is False
+
+def test_lonlat_to_pixel():
+    cols, rows = lonlat_to_pixel((140.0, 0.5, 0, -30.0, 0, -0.25), np.array([140.1, 141.9]), np.array([-30.1, -30.9]))
+    assert np.allclose(cols, [0.2, 3.8]) and np.allclose(rows, [0.4, 3.6])
@@ -0,0 +1,31 @@
+import numpy as np
+from wombat.terrain import slope, aspect, tpi, compute_products, terrain_halo, TERRAIN_PRODUCTS
+
+def test_plane_slope_and_aspect():
+    # rises 1 m per 1 m pixel towards the east, so it faces (drains) west
+    z = np.tile(np.arange(10, dtype=np.float64), (10, 1))
+    assert np.allclose(slope(z, 1.0, 1.0), 45.0)
+    assert np.allclose(aspect(z, 1.0, 1.0), 270.0)
+    assert np.isnan(aspect(np.zeros((5, 5)), 1.0, 1.0)).all()
+
+def test_tpi_ignores_nodata_windows():
+    z = np.zeros((9, 9))
+    z[4, 4] = 8.0
+    z[0, 0] = np.nan
+    out = tpi(z, radius=1)
+    assert out[3, 3] == 8.0 and out[2, 3] == -1.0
+    assert np.isnan(out[0, 0]) and np.isfinite(out[0, 1:]).all() and np.isfinite(out[2:, 0]).all()
+
+def test_tiles_match_whole_grid(synthetic_dem):
+    products, tile = TERRAIN_PRODUCTS, 32
+    kwargs = dict(tpi_radius=2, azimuth=300.0, altitude=40.0)
+    halo = terrain_halo(products, kwargs['tpi_radius'])
+    padded = np.pad(synthetic_dem, halo, constant_values=np.nan)
+    whole = compute_products(padded, products, 30.0, 30.0, halo, **kwargs)
+    ny, nx = synthetic_dem.shape
+    for y in range(0, ny, tile):
+        for x in range(0, nx, tile):
+            h, w = min(tile, ny - y), min(tile, nx - x)
+            parts = compute_products(padded[y:y+h+2*halo, x:x+w+2*halo], products, 30.0, 30.0, halo, **kwargs)
+            for ref, part in zip(whole, parts):
+                assert np.array_equal(ref[y:y+h, x:x+w], part, equal_nan=True)
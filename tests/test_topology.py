@@ -0,0 +1,46 @@
+import numpy as np
+import shapely
+from wombat.topology import Topology
+
+def tessellation(n=200, seed=0):
+    """Voronoi cells clipped to a 1 degree square, with a hole and a MultiPolygon."""
+    rng = np.random.default_rng(seed)
+    env = shapely.box(147, -43, 148, -42)
+    cells = shapely.get_parts(shapely.voronoi_polygons(shapely.multipoints(rng.uniform([147,-43], [148,-42], (n, 2))),
+                                                       extend_to=env))
+    cells = shapely.segmentize(shapely.intersection(cells, env), 0.01)
+    cells[0] = cells[0].difference(cells[0].centroid.buffer(1e-3))
+    cells[1] = shapely.multipolygons([cells[1], shapely.box(149, -41, 149.01, -40.99)])
+    return np.append(cells, [None])
+
+def test_round_trip():
+    cells = tessellation()
+    topo = Topology.from_geometries(cells)
+    out = topo.geometries()
+    assert out[-1] is None
+    assert shapely.get_num_interior_rings(out[0]) == 1
+    assert shapely.get_type_id(out[1]) == shapely.GeometryType.MULTIPOLYGON
+    ref = shapely.set_precision(cells[:-1], topo.step)
+    assert shapely.equals_exact(shapely.normalize(out[:-1]), shapely.normalize(ref), tolerance=2*topo.step).all()
+
+def test_shared_edges_stored_once():
+    cells = tessellation()
+    topo = Topology.from_geometries(cells)
+    assert len(topo.arc_xy) < shapely.get_num_coordinates(cells[:-1]).sum()
+
+def test_save_load(tmp_path):
+    topo = Topology.from_geometries(tessellation(), ids=['a%d' % i for i in range(201)])
+    path = str(tmp_path / "topo.npz")
+    topo.save(path)
+    loaded = Topology.load(path)
+    assert loaded.ids.tolist() == topo.ids.tolist()
+    assert loaded.positions(['a3', 'a0']).tolist() == [3, 0]
+    assert all(shapely.equals_exact(loaded.geometries(np.arange(5)), topo.geometries(np.arange(5)), 0))
+
+def test_simplified_neighbours_stay_seamless():
+    cells = tessellation()[2:-1]
+    simplified = Topology.from_geometries(cells).simplify(0.01).geometries()
+    simplified = simplified[simplified != None]
+    assert shapely.is_valid(simplified).all()
+    # no gaps or overlaps: the parts add up to their union
+    assert np.isclose(shapely.area(simplified).sum(), shapely.area(shapely.union_all(simplified)))
@@ -0,0 +1,30 @@
+import numpy as np
+from wombat.viewshed import viewshed, cumulative_viewshed, ring_cells
+
+def test_flat_ground_is_visible():
+    dem = np.zeros((41, 41))
+    assert viewshed(dem, 20, 20, curvature_coeff=0).all()
+
+def test_wall_hides_cells_behind_it():
+    dem = np.zeros((41, 41))
+    dem[:, 25] = 50
+    vis = viewshed(dem, 20, 20, curvature_coeff=0)
+    assert vis[:, :25].all() and vis[:, 25].any()
+    assert not vis[15:26, 26:].any()
+
+def test_max_distance_and_nodata():
+    dem = np.zeros((41, 41))
+    dem[0, 0] = np.nan
+    vis = viewshed(dem, 20, 20, max_distance=10, curvature_coeff=0)
+    assert vis[20, 30] and not vis[20, 31] and not vis[0, 0]
+
+def test_ring_cells_cover_the_ring():
+    dy, dx = ring_cells(0, 0, 2, 10, 10)
+    assert sorted(zip(dy.tolist(), dx.tolist())) == [(0, 2), (1, 2), (2, 0), (2, 1), (2, 2)]
+
+def test_cumulative_matches_single_viewsheds():
+    rng = np.random.default_rng(0)
+    dem = rng.random((30, 30)) * 5
+    rows, cols = [3, 15, 27], [4, 20, 10]
+    expected = sum(viewshed(dem, r, c).astype(np.int32) for r, c in zip(rows, cols))
+    assert np.array_equal(cumulative_viewshed(dem, rows, cols, workers=2), expected)
@@ -1,6 +1,5 @@
 import geopandas as gpd
-from geopandas.tools import sjoin
-from shapely.geometry import Point,Polygon
+from shapely.geometry import Polygon
 import wombat.helper as helper
 import os
 from wombat.datasets import Datasets,City
@@ -11,6 +10,13 @@ import numpy as np
 from collections import deque
 from pyvis.network import Network as pyvisNetwork
 import pandas as pd
+import shapely
+from concurrent.futures import ThreadPoolExecutor
+from wombat.cache import LRUCache
+from wombat.topology import TOPOLOGY_STEP
+from scipy import sparse
+from wombat.csr import csr_rows
+from wombat.hierarchy import HierarchyStore, AncestorIndex, LabelIndex, build_hierarchy_store, load_layer_manifest, zoom_to_resolution, PYRAMID_TOLERANCES
 
 def has_parent_with_label(G, node, parent_label):
     """Check if node has any parent (up to the root) with the specified label.
@@ -323,13 +329,60 @@ def count_nodes_in_levels(level_index):
     """
     level_counts = {level: len(nodes) for level, nodes in level_index.items()}
     return level_counts
+
+ASGS_ROOT = {'layer':'AUS_2021_AUST_GDA2020','node_col':'AUS_CODE_2021','parent_col':None}
+
+ASGS_LAYERS = {
+    'ASGS_2021_Main_Structure_GDA2020': [
+        #{'layer':'AUS_2021_AUST_GDA2020',  'node_col':'AUS_CODE_2021',  'parent_col':'root'},
+        {'layer':'STE_2021_AUST_GDA2020',  'node_col':'STATE_CODE_2021','parent_col':'AUS_CODE_2021'},
+        {'layer':'GCCSA_2021_AUST_GDA2020','node_col':'GCCSA_CODE_2021',  'parent_col':'STATE_CODE_2021'},
+        {'layer':'SA4_2021_AUST_GDA2020',  'node_col':'SA4_CODE_2021',  'parent_col':'STATE_CODE_2021'},
+        {'layer':'SA4_2021_AUST_GDA2020',  'node_col':'SA4_CODE_2021',  'parent_col':'GCCSA_CODE_2021'},
+        {'layer':'SA3_2021_AUST_GDA2020',  'node_col':'SA3_CODE_2021',  'parent_col':'SA4_CODE_2021'},
+        {'layer':'SA2_2021_AUST_GDA2020',  'node_col':'SA2_CODE_2021',  'parent_col':'SA3_CODE_2021'},
+        {'layer':'SA1_2021_AUST_GDA2020',  'node_col':'SA1_CODE_2021',  'parent_col':'SA2_CODE_2021'},
+        {'layer':'MB_2021_AUST_GDA2020',   'node_col':'MB_CODE_2021',   'parent_col':'SA1_CODE_2021'}
+    ],
+    'ASGS_Ed3_Non_ABS_Structures_GDA2020_updated_2023': [
+        {'layer':'SAL_2021_AUST_GDA2020',  'node_col':'SAL_CODE_2021',  'parent_col':'STATE_CODE_2021'},
+        {'layer':'ADD_2021_AUST_GDA2020',  'node_col':'ADD_CODE_2021',  'parent_col':'AUS_CODE_2021'},
+        {'layer':'TR_2021_AUST_GDA2020',   'node_col':'TR_CODE_2021',   'parent_col':'STATE_CODE_2021'},
+        {'layer':'CED_2021_AUST_GDA2020',  'node_col':'CED_CODE_2021',  'parent_col':'STATE_CODE_2021'},
+        {'layer':'SED_2022_AUST_GDA2020',  'node_col':'SED_CODE_2022',  'parent_col':'STATE_CODE_2021'},
+        {'layer':'DZN_2021_AUST_GDA2020',  'node_col':'DZN_CODE_2021',  'parent_col':'SA2_CODE_2021'},
+        {'layer':'POA_2021_AUST_GDA2020',  'node_col':'POA_CODE_2021',  'parent_col':'AUS_CODE_2021'},
+        {'layer':'LGA_2023_AUST_GDA2020',  'node_col':'LGA_CODE_2023',  'parent_col':'STATE_CODE_2021'}
+    ],
+    'ASGS_2021_SUA_UCL_SOS_SOSR_GPKG_GDA2020': [
+        {'layer':'SOS_2021_AUST_GDA2020',  'node_col':'SOS_CODE_2021',  'parent_col':'STATE_CODE_2021'},
+        {'layer':'SOSR_2021_AUST_GDA2020',  'node_col':'SOSR_CODE_2021',  'parent_col':'SOS_CODE_2021'},
+        {'layer':'UCL_2021_AUST_GDA2020',  'node_col':'UCL_CODE_2021',  'parent_col':'SOSR_CODE_2021'},
+        {'layer':'SUA_2021_AUST_GDA2020',  'node_col':'SUA_CODE_2021',  'parent_col':'AUS_CODE_2021'},
+    ],
+    'ASGS_Ed3_2021_Indigenous_Structure_GDA2020': [
+        {'layer':'IREG_2021_AUST_GDA2020',  'node_col':'IREG_CODE_2021',  'parent_col':'STATE_CODE_2021'},
+        {'layer':'IARE_2021_AUST_GDA2020',  'node_col':'IARE_CODE_2021',  'parent_col':'IREG_CODE_2021'},
+        {'layer':'ILOC_2021_AUST_GDA2020',  'node_col':'ILOC_CODE_2021',  'parent_col':'IARE_CODE_2021'},
+    ]
+}
+
 class GeoHierarchy:
-    def __init__(self, boundary_path,fname_save = "2023_AUS_Boundaries"):
+    def __init__(self, boundary_path,fname_save = "2023_AUS_Boundaries",cache_size=64,cache_bytes=512*1024**2):
         self.boundary_path = boundary_path
         self.fname_save = fname_save
         self.fileout = os.path.join(boundary_path,"%s.gpickle"%fname_save)
         self.fileout_gexf = os.path.join(boundary_path,"%s.gexf"%fname_save)
+        self.fileout_store = os.path.join(boundary_path,"%s.hierarchy"%fname_save)
         self.G = nx.DiGraph()
+        self.store = None
+        self.ancestry = None
+        self.label_lookup = None
+        self.level_trees = {}
+        self.memberships = {}
+        self.mb_ancestor_levels = None
+        # GeoDataFrames returned by query(), keyed on (level, label, belonging_to, resolution)
+        self.query_cache = LRUCache(maxsize=cache_size,max_bytes=cache_bytes,sizeof=gdf_nbytes)
         
         self.gpkg_files = ['ASGS_2021_Main_Structure_GDA2020',
                            'ASGS_Ed3_Non_ABS_Structures_GDA2020_updated_2023',
@@ -337,7 +390,7 @@ class GeoHierarchy:
                            'ASGS_Ed3_2021_Indigenous_Structure_GDA2020']
         
         # initialise root boundary node if graph file does not exist
-        if not os.path.exists(self.fileout):
+        if not os.path.exists(self.fileout) and not os.path.exists(self.fileout_store):
             full_fpath = os.path.join(self.boundary_path,'ASGS_2021_Main_Structure_GDA2020')+".gpkg"
             if os.path.exists(full_fpath):
                 df = gpd.read_file(full_fpath,layer='AUS_2021_AUST_GDA2020')
@@ -356,44 +409,44 @@ class GeoHierarchy:
             
     def construct_full_hierarchy(self):
         for fname in self.gpkg_files:
-            self.index = None
-            if "Main" in fname:
-                self.index = [
-                    #{'layer':'AUS_2021_AUST_GDA2020',  'node_col':'AUS_CODE_2021',  'parent_col':'root'},
-                    {'layer':'STE_2021_AUST_GDA2020',  'node_col':'STATE_CODE_2021','parent_col':'AUS_CODE_2021'},
-                    {'layer':'GCCSA_2021_AUST_GDA2020','node_col':'GCCSA_CODE_2021',  'parent_col':'STATE_CODE_2021'},
-                    {'layer':'SA4_2021_AUST_GDA2020',  'node_col':'SA4_CODE_2021',  'parent_col':'STATE_CODE_2021'},
-                    {'layer':'SA4_2021_AUST_GDA2020',  'node_col':'SA4_CODE_2021',  'parent_col':'GCCSA_CODE_2021'},
-                    {'layer':'SA3_2021_AUST_GDA2020',  'node_col':'SA3_CODE_2021',  'parent_col':'SA4_CODE_2021'},
-                    {'layer':'SA2_2021_AUST_GDA2020',  'node_col':'SA2_CODE_2021',  'parent_col':'SA3_CODE_2021'},
-                    {'layer':'SA1_2021_AUST_GDA2020',  'node_col':'SA1_CODE_2021',  'parent_col':'SA2_CODE_2021'},
-                    {'layer':'MB_2021_AUST_GDA2020',   'node_col':'MB_CODE_2021',   'parent_col':'SA1_CODE_2021'}
-                ]
-            if "Non_ABS" in fname:
-                self.index = [
-                    {'layer':'SAL_2021_AUST_GDA2020',  'node_col':'SAL_CODE_2021',  'parent_col':'STATE_CODE_2021'},
-                    {'layer':'ADD_2021_AUST_GDA2020',  'node_col':'ADD_CODE_2021',  'parent_col':'AUS_CODE_2021'},
-                    {'layer':'TR_2021_AUST_GDA2020',   'node_col':'TR_CODE_2021',   'parent_col':'STATE_CODE_2021'},
-                    {'layer':'CED_2021_AUST_GDA2020',  'node_col':'CED_CODE_2021',  'parent_col':'STATE_CODE_2021'},
-                    {'layer':'SED_2022_AUST_GDA2020',  'node_col':'SED_CODE_2022',  'parent_col':'STATE_CODE_2021'},
-                    {'layer':'DZN_2021_AUST_GDA2020',  'node_col':'DZN_CODE_2021',  'parent_col':'SA2_CODE_2021'},
-                    {'layer':'POA_2021_AUST_GDA2020',  'node_col':'POA_CODE_2021',  'parent_col':'AUS_CODE_2021'},
-                    {'layer':'LGA_2023_AUST_GDA2020',  'node_col':'LGA_CODE_2023',  'parent_col':'STATE_CODE_2021'}
-                ]
-            if "Indigenous_Structure" in fname:
-                self.index = [
-                    {'layer':'IREG_2021_AUST_GDA2020',  'node_col':'IREG_CODE_2021',  'parent_col':'STATE_CODE_2021'},
-                    {'layer':'IARE_2021_AUST_GDA2020',  'node_col':'IARE_CODE_2021',  'parent_col':'IREG_CODE_2021'},
-                    {'layer':'ILOC_2021_AUST_GDA2020',  'node_col':'ILOC_CODE_2021',  'parent_col':'IARE_CODE_2021'},
-                ]
-            if "SUA" in fname:
-                self.index = [
-                    {'layer':'SOS_2021_AUST_GDA2020',  'node_col':'SOS_CODE_2021',  'parent_col':'STATE_CODE_2021'},
-                    {'layer':'SOSR_2021_AUST_GDA2020',  'node_col':'SOSR_CODE_2021',  'parent_col':'SOS_CODE_2021'},
-                    {'layer':'UCL_2021_AUST_GDA2020',  'node_col':'UCL_CODE_2021',  'parent_col':'SOSR_CODE_2021'},
-                    {'layer':'SUA_2021_AUST_GDA2020',  'node_col':'SUA_CODE_2021',  'parent_col':'AUS_CODE_2021'},
-                ]       
+            self.index = ASGS_LAYERS.get(fname)
             self.construct_hierarchy_for_file(fname)
+    
+    def build(self,workers=None,incremental=True,fingerprint='metadata'):
+        """Build the columnar hierarchy store directly from the GeoPackages.
+        
+        Layers are read in parallel worker processes and the node and edge tables are
+        assembled with columnar operations, rather than row by row into a networkx graph.
+        Layer tables are cached with a fingerprint of their source, so when only one
+        GeoPackage (e.g. the non-ABS structures) is updated only its layers are re-read.
+        
+        Args:
+            workers (int, optional): Number of reader processes. Defaults to the CPU count.
+            incremental (bool, optional): Only re-read layers whose fingerprint changed. Defaults to True.
+            fingerprint (str, optional): 'metadata' or 'content', see fingerprint_layer. Defaults to 'metadata'.
+        
+        Returns:
+            dict: Per-layer read and assembly timings in seconds.
+        """
+        files = {fname: os.path.join(self.boundary_path,fname+".gpkg") for fname in self.gpkg_files}
+        specs = [(files[self.gpkg_files[0]],ASGS_ROOT)]
+        for fname in self.gpkg_files:
+            specs += [(files[fname],spec) for spec in ASGS_LAYERS.get(fname,[])]
+        timings = build_hierarchy_store(specs,self.fileout_store,workers=workers,
+                                        incremental=incremental,fingerprint=fingerprint)
+        self.load()
+        return timings
+    
+    @property
+    def G(self):
+        # graphs loaded from the columnar store are only materialised for graph walks
+        if self._G is None and self.store is not None:
+            self._G = self.store.to_networkx()
+        return self._G
+    
+    @G.setter
+    def G(self, G):
+        self._G = G
             
     def get_nodes(self,level=None, label=None):
         if level is not None:
@@ -475,9 +528,12 @@ class GeoHierarchy:
                     
                 self.G.add_edge(parent_node_key, current_node_key)
                 
-    def save(self,gpickle=True,gexf=False):
+    def save(self,gpickle=True,gexf=False,columnar=False):
         if gpickle:
             nx.write_gpickle(self.G,self.fileout)
+        
+        if columnar:
+            HierarchyStore.from_graph(self.G).save(self.fileout_store)
             
         if gexf:
             outG = self.G.copy()
@@ -487,20 +543,97 @@ class GeoHierarchy:
             nx.write_gexf(outG, "%s.gexf"%self.fileout_gexf)
         
     def load(self):
-        if os.path.exists(self.fileout):
+        # prefer the columnar store, which loads without unpickling any geometry
+        if os.path.exists(self.fileout_store):
+            self.G = None
+            self.store = HierarchyStore.load(self.fileout_store)
+        elif os.path.exists(self.fileout):
             self.G = nx.read_gpickle(self.fileout)
-            # Then you can use this index for quick lookups:
-            self.level_index = build_index(self.G,'level')
-            #nodes_at_level_x = level_index.get(x)
-            self.label_index = build_index(self.G,'label')
-            self.level_counts = count_nodes_in_levels(self.level_index)
+            self.store = HierarchyStore.from_graph(self.G)
+        else:
+            return
+        # Then you can use this index for quick lookups:
+        self.level_index = self.store.build_index('level')
+        self.label_index = self.store.build_index('label')
+        self.level_counts = count_nodes_in_levels(self.level_index)
+        self.ancestry = AncestorIndex(self.store.parent_indptr,self.store.parent_indices)
+        self.label_lookup = LabelIndex(self.store.nodes['label'].to_numpy(dtype=object))
+        self.level_trees = {}
+        self.memberships = {}
+        self.mb_ancestor_levels = None
+        self.query_cache.clear()
+    
+    def to_gdf(self,node_ids,level=None,label=None,resolution=None,zoom=None,topology=False):
+        """GeoDataFrame of the given nodes.
+        
+        Args:
+            node_ids (list): Node ids to return.
+            level (str, optional): Keep only nodes at this level. Defaults to None.
+            label (str, optional): Keep only nodes with this label. Defaults to None.
+            resolution (float, optional): Acceptable simplification in degrees. Defaults to None.
+            zoom (int, optional): Web map zoom level, used to pick a resolution when none is given. Defaults to None.
+            topology (bool, optional): Reassemble polygons from the shared-arc topologies built
+                with build_topology, so simplified neighbours stay seamless. Defaults to False.
+        """
+        if resolution is None and zoom is not None:
+            resolution = zoom_to_resolution(zoom)
+        if self.store is not None and self.store.has_geometry:
+            return self.store.to_gdf(node_ids,level=level,label=label,resolution=resolution,topology=topology)
+        return node_to_gdf(self.G,node_ids,level=level,label=label,resolution=resolution)
+    
+    def build_pyramids(self,levels=None,tolerances=PYRAMID_TOLERANCES):
+        """Precompute simplified geometries for levels of the columnar store.
+        
+        Args:
+            levels (list, optional): Levels to simplify. Defaults to all levels.
+            tolerances (list, optional): Tolerances in degrees. Defaults to PYRAMID_TOLERANCES.
+        """
+        if levels is None:
+            levels = list(self.level_index.keys())
+        for level in levels:
+            print("Simplifying:",level)
+            self.store.build_pyramid(level,tolerances)
+        self.query_cache.clear()
+            
+    def build_topology(self,levels=['MB','SA1','SA2'],step=TOPOLOGY_STEP):
+        """Encode levels that tile the country as shared, quantised arcs, see wombat.topology.
+        
+        Args:
+            levels (list, optional): Levels to encode. Defaults to ['MB','SA1','SA2'].
+            step (float, optional): Quantisation grid in degrees. Defaults to TOPOLOGY_STEP.
+        """
+        for level in levels:
+            print("Encoding topology:",level)
+            topo = self.store.build_topology(level,step=step)
+            print(" > %d areas, %d arcs, %.1f MB" % (len(topo),topo.n_arcs,topo.nbytes/1024**2))
+        self.query_cache.clear()
             
     def print_tree(self,node,depth=1,children=True,parents=False,cousins=False):
         nodex = self.G.nodes[node.index]
         print_tree(self.G,nodex,depth,children=children,parents=parents,cousins=cousins)
     
+    def find_labels(self,text,mode='substring',level=None,case=True):
+        """Find nodes by label through the inverted label index.
+        
+        Args:
+            text (str): Query string, e.g. "Brisbane" matches Greater Brisbane, Brisbane Inner, ...
+            mode (str, optional): 'exact', 'prefix' or 'substring'. Defaults to 'substring'.
+            level (str, optional): Only return nodes at this level. Defaults to None.
+            case (bool, optional): Case-sensitive matching. Defaults to True.
+        
+        Returns:
+            list: Matching node ids.
+        """
+        pos = self.label_lookup.search(text,mode=mode,case=case)
+        if level is not None:
+            pos = np.intersect1d(pos,self.store.level_positions(level),assume_unique=True)
+        return self.store.ids[pos].tolist()
+    
     def get_parents_with_label(self,label,parent_label):
-        return get_parents_with_label(self.G, label, parent_label)
+        parent_pos = self.label_lookup.search(parent_label)
+        child_pos = np.unique(csr_rows(self.store.child_indptr,self.store.child_indices,parent_pos))
+        pos = np.intersect1d(self.store.level_positions(label),child_pos,assume_unique=True)
+        return self.store.ids[pos].tolist()
     
     def get_parents_with_level(self,label,parent_level):
         return get_parents_with_level(self.G, label, parent_level)
@@ -520,24 +653,348 @@ class GeoHierarchy:
         children_at_level = get_children_with_level(self.G,node,child_level_label)
         return list(children_at_level) #[self.G.nodes[c]['id'] for c in children_at_level]
 
+    def get_neighbours(self,node,contiguity='queen'):
+        """Ids of the areas bordering a node within its own level."""
+        pos = self.store.positions([node])[0]
+        level = self.store.nodes['level'].iloc[pos]
+        level_pos = self.store.level_positions(level)
+        i = np.searchsorted(level_pos,pos)
+        indptr, indices = self.store.adjacency(level,contiguity)
+        return list(self.store.ids[level_pos[indices[indptr[i]:indptr[i+1]]]])
+    
+    def spatial_weights(self,level,contiguity='queen',row_standardise=False):
+        """Contiguity spatial-weights matrix of a level.
+        
+        Args:
+            level (str): Level, e.g. 'SA2'.
+            contiguity (str, optional): 'queen' or 'rook'. Defaults to 'queen'.
+            row_standardise (bool, optional): Scale each row to sum to one. Defaults to False.
+        
+        Returns:
+            tuple: (scipy.sparse.csr_matrix of shape (n, n), node ids of the rows and columns).
+        """
+        indptr, indices = self.store.adjacency(level,contiguity)
+        n = len(indptr) - 1
+        W = sparse.csr_matrix((np.ones(len(indices)),indices,indptr),shape=(n,n))
+        if row_standardise:
+            counts = np.diff(indptr)
+            W = sparse.diags(np.divide(1.0,counts,out=np.zeros(n),where=counts > 0)) @ W
+        return W.tocsr(), self.store.ids[self.store.level_positions(level)]
+    
+    def build_adjacency(self,levels=None,contiguity='queen'):
+        """Precompute and store the contiguity graphs of levels (defaults to all levels)."""
+        if levels is None:
+            levels = list(self.level_index.keys())
+        for level in levels:
+            print("Computing %s adjacency:" % contiguity,level)
+            self.store.build_adjacency(level,contiguity)
+    
+    def get_descendants_with_label(self, level, parent_label):
+        """Nodes at a level with any ancestor whose label contains parent_label.
+        
+        Equivalent to get_parents_with_label_traverse, answered from the label and ancestor
+        indices rather than by climbing predecessors for every node at the level.
+        """
+        anc_pos = self.label_lookup.search(parent_label)
+        pos = self.ancestry.descendants_of(anc_pos,candidates=self.store.level_positions(level))
+        return self.store.ids[pos].tolist()
+    
+    def has_ancestor(self, node, ancestor):
+        """Check whether ancestor sits anywhere above node in the hierarchy."""
+        node_pos, anc_pos = self.store.positions([node,ancestor])
+        return self.ancestry.is_ancestor(anc_pos,node_pos)
+
+    def ancestors_at_level(self, positions, level):
+        """Position of the ancestor at a given level for each node position (-1 where none)."""
+        positions = np.asarray(positions,dtype=np.int64)
+        anc = self.ancestry.ancestors
+        cols = csr_rows(anc.indptr,anc.indices,positions)
+        rows = np.repeat(np.arange(len(positions)),np.diff(anc.indptr)[positions])
+        hit = self.store.level_codes[cols] == self.store.level_code(level)
+        rows_hit, first = np.unique(rows[hit],return_index=True)
+        out = np.full(len(positions),-1,dtype=np.int64)
+        out[rows_hit] = cols[hit][first]
+        return out
+    
+    def level_tree(self, level):
+        """STRtree over the geometries of one level, built on first use and kept."""
+        if level not in self.level_trees:
+            pos = self.store.level_positions(level)
+            self.level_trees[level] = (shapely.STRtree(self.store.get_geometry(pos)),pos)
+        return self.level_trees[level]
+    
+    def within_radius(self, lons, lats, radii, level):
+        """Select the areas of a level within a geodesic radius of each centre.
+        
+        Args:
+            lons (array-like): Centre longitudes.
+            lats (array-like): Centre latitudes.
+            radii (float or array-like): Radius in kilometres (not degrees or metres), one for all
+                centres or one per centre.
+            level (str): Level of the areas, e.g. 'SA1'.
+        
+        Returns:
+            tuple: (scipy.sparse.csr_matrix of shape (centres, areas), node ids of the area columns).
+        """
+        tree, pos = self.level_tree(level)
+        membership = RadiusIndex(tree.geometries,tree=tree).query(lons,lats,radii)
+        return membership, self.store.ids[pos]
+    
+    def point_in_level(self, points, level):
+        """Position of the node at a level containing each point (-1 where none)."""
+        tree, pos = self.level_tree(level)
+        point_idx, geom_idx = tree.query(points,predicate='intersects')
+        # points on a shared edge match several polygons, keep the first
+        point_idx, first = np.unique(point_idx,return_index=True)
+        out = np.full(len(points),-1,dtype=np.int64)
+        out[point_idx] = pos[geom_idx[first]]
+        return out
+    
+    def locate(self, lons, lats, levels=['MB','SA1','SA2','SA3','SA4','GCCSA','STATE'], chunk_size=100000, workers=None):
+        """Reverse-geocode points to the codes of the areas containing them.
+        
+        A single point-in-polygon pass is made against the meshblocks, and every level
+        above the meshblocks in the hierarchy (SA1 up to STATE) is read off the ancestor
+        index. Levels that are not meshblock ancestors, such as LGA or POA, get their own
+        point-in-polygon pass against that level.
+        
+        Args:
+            lons (array-like): Point longitudes.
+            lats (array-like): Point latitudes.
+            levels (list, optional): Levels to return codes for. Defaults to the main structure.
+            chunk_size (int, optional): Points per chunk. Defaults to 100000.
+            workers (int, optional): Threads used to process chunks. Defaults to the executor default.
+        
+        Returns:
+            pandas.DataFrame: One row per point and one column of codes per level (None where
+            the point falls outside every area).
+        """
+        lons = np.asarray(lons,dtype=float)
+        lats = np.asarray(lats,dtype=float)
+        assert len(lons) == len(lats), print("lons and lats must have the same length.")
+        
+        mb_levels = self.meshblock_ancestor_levels()
+        derived = [l for l in levels if l != 'MB' and self.store.level_code(l) in mb_levels]
+        direct = ['MB'] + [l for l in levels if l != 'MB' and l not in derived]
+        for level in direct:
+            self.level_tree(level)
+        
+        def run(start):
+            points = shapely.points(lons[start:start+chunk_size],lats[start:start+chunk_size])
+            return {level: self.point_in_level(points,level) for level in direct}
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            chunks = list(executor.map(run,range(0,len(lons),chunk_size)))
+        found = {level: np.concatenate([c[level] for c in chunks]) if chunks else np.empty(0,dtype=np.int64) for level in direct}
+        
+        # walk up from the unique meshblocks hit rather than every point
+        mb_hit, inverse = np.unique(found['MB'],return_inverse=True)
+        for level in derived:
+            anc = self.ancestors_at_level(np.maximum(mb_hit,0),level)
+            found[level] = np.where(mb_hit >= 0,anc,-1)[inverse]
+        
+        ids = self.store.ids.to_numpy()
+        result = {}
+        for level in levels:
+            pos = found[level]
+            codes = np.full(len(pos),None,dtype=object)
+            codes[pos >= 0] = ids[pos[pos >= 0]]
+            result[level] = codes
+        # object columns keep None, a string dtype would turn it into NaN
+        return pd.DataFrame(result,dtype=object)
+
+    def meshblock_ancestor_levels(self):
+        """Level codes of the areas above the meshblocks in the hierarchy, built on first use and kept."""
+        if self.mb_ancestor_levels is None:
+            mb_pos = self.store.level_positions('MB')
+            self.mb_ancestor_levels = np.unique(self.store.level_codes[self.ancestry.ancestors_of(mb_pos)])
+        return self.mb_ancestor_levels
+
+    def membership(self, from_level, to_level):
+        """Sparse (to_level x from_level) membership matrix, built on first use and kept."""
+        key = (from_level,to_level)
+        if key not in self.memberships:
+            self.memberships[key] = self.ancestry.membership(self.store.level_positions(from_level),
+                                                             self.store.level_positions(to_level))
+        return self.memberships[key]
+
+    def aggregate(self, values, from_level='MB', to_levels=['SA1','SA2','SA3','SA4','GCCSA','STATE'], how='sum', weights=None):
+        """Roll values up from one level of the hierarchy to the levels above it.
+        
+        Each target level is a single sparse matrix product with a precomputed membership
+        matrix, so every target level is produced in one call without walking the graph.
+        Missing (NaN) values are skipped; target areas without any valid member value are NaN.
+        
+        Args:
+            values (pandas.Series or pandas.DataFrame): Values indexed by the codes of from_level
+                (e.g. meshblock codes). Codes not given are treated as missing.
+            from_level (str, optional): Level the values belong to. Defaults to 'MB'.
+            to_levels (str or list, optional): Target level(s). Defaults to SA1 up to STATE.
+            how (str, optional): 'sum', 'mean' or 'weighted' (weighted mean). Defaults to 'sum'.
+            weights (pandas.Series, optional): Weights indexed like values for how='weighted'.
+                Defaults to the area (sqkm) of each from_level area.
+        
+        Returns:
+            pandas.Series or pandas.DataFrame: Aggregated values indexed by the target codes, or a
+            dict of these keyed on level when to_levels is a list.
+        """
+        assert how in ['sum','mean','weighted'], print("Please use 'sum', 'mean' or 'weighted'.")
+        single = isinstance(to_levels,str)
+        if single:
+            to_levels = [to_levels]
+        
+        from_pos = self.store.level_positions(from_level)
+        from_ids = self.store.ids[from_pos]
+        frame = values.to_frame() if isinstance(values,pd.Series) else values
+        data = frame.reindex(from_ids).to_numpy(dtype=np.float64)
+        valid = ~np.isnan(data)
+        data = np.where(valid,data,0.0)
+        
+        if how == 'sum':
+            w = None
+        elif how == 'mean':
+            w = valid.astype(np.float64)
+        else:
+            if weights is None:
+                weights = self.store.nodes['area_sqkm'].iloc[from_pos].set_axis(from_ids)
+            w = weights.reindex(from_ids).to_numpy(dtype=np.float64)[:,None]
+            w = np.where(valid & ~np.isnan(w),w,0.0)
+        
+        result = {}
+        for level in to_levels:
+            M = self.membership(from_level,level)
+            if w is None:
+                out = M @ data
+                # areas with no valid member values are missing rather than zero
+                out[(M @ valid.astype(np.float64)) == 0] = np.nan
+            else:
+                total = M @ w
+                with np.errstate(invalid='ignore',divide='ignore'):
+                    out = (M @ (data*w)) / total
+            agg = pd.DataFrame(out,index=self.store.ids[self.store.level_positions(level)],columns=frame.columns)
+            result[level] = agg.iloc[:,0].rename(values.name) if isinstance(values,pd.Series) else agg
+        return result[to_levels[0]] if single else result
+
     def search_nodes(self, level, parent_label=None): #, traverse=False):
         if parent_label is not None:
-            node_ids = get_parents_with_label_traverse(self.G, level, parent_label)
+            node_ids = self.get_descendants_with_label(level, parent_label)
             assert len(node_ids) > 0, print("No areas were found, please fix search.")
         else:
             node_ids = self.level_index[level]
         return node_ids #node_to_gdf(self.G,node_ids)
     
-    def query(self, string_query, belonging_to=None, as_gdf=True):
+    def query(self, string_query, belonging_to=None, as_gdf=True, resolution=None, zoom=None, label=None):
+        if as_gdf:
+            if resolution is None and zoom is not None:
+                resolution = zoom_to_resolution(zoom)
+            key = (string_query,label,belonging_to,resolution)
+            gdf = self.query_cache.get_or_compute(key,lambda: self.to_gdf(self.query(string_query,belonging_to,False,label=label),resolution=resolution))
+            # hand out a copy so callers cannot modify the cached frame
+            return gdf.copy()
         if belonging_to is not None:
             node_ids = self.search_nodes(level=string_query,parent_label=belonging_to)
+            if label is not None:
+                labelled = set(self.label_index.get(label,[]))
+                node_ids = [n for n in node_ids if n in labelled]
         else:
-            node_ids = self.get_nodes(level=string_query)
+            node_ids = self.get_nodes(level=string_query,label=label)
         assert len(node_ids)>0, print("No objects found (node_ids)!!")
-        if as_gdf:
-            return node_to_gdf(self.G,node_ids)
-        else:
-            return node_ids
+        return node_ids
+    
+    def cache_info(self):
+        return self.query_cache.stats()
+
+def gdf_nbytes(gdf):
+    """Approximate memory held by a boundary GeoDataFrame, counting 16 bytes per coordinate."""
+    return int(gdf.drop(columns='geometry').memory_usage(deep=True).sum() +
+               16*shapely.get_num_coordinates(gdf.geometry.values).sum())
+
+EARTH_RADIUS_KM = 6371.0088
+
+def aeqd_project(lons, lats, lon0, lat0):
+    """Spherical azimuthal equidistant projection of points about per-point centres.
+    
+    Distances from the centre are exact on the sphere, so a polygon projected about a
+    centre can be tested against a radius with a planar distance.
+    
+    Args:
+        lons, lats (numpy.ndarray): Point coordinates in degrees.
+        lon0, lat0 (numpy.ndarray): Projection centre of each point in degrees.
+    
+    Returns:
+        numpy.ndarray: (n, 2) projected coordinates in km.
+    """
+    lam, phi = np.radians(lons), np.radians(lats)
+    lam0, phi0 = np.radians(lon0), np.radians(lat0)
+    dlam = lam - lam0
+    # haversine form of the angular distance keeps precision for nearby points
+    hav = np.sin((phi-phi0)/2)**2 + np.cos(phi0)*np.cos(phi)*np.sin(dlam/2)**2
+    c = 2*np.arcsin(np.sqrt(np.clip(hav,0,1)))
+    with np.errstate(invalid='ignore',divide='ignore'):
+        k = np.where(c > 0, c/np.sin(c), 1.0)
+    x = EARTH_RADIUS_KM*k*np.cos(phi)*np.sin(dlam)
+    y = EARTH_RADIUS_KM*k*(np.cos(phi0)*np.sin(phi) - np.sin(phi0)*np.cos(phi)*np.cos(dlam))
+    return np.column_stack([x,y])
+
+class RadiusIndex:
+    """Batched selection of the polygons within a geodesic radius, in kilometres, of many centres.
+    
+    The STRtree over the polygons is built once and kept. Each centre is first turned into
+    a lon/lat box that is wide enough at its latitude, which the tree uses to find candidate
+    polygons. Each candidate is then projected to an azimuthal equidistant frame about its
+    centre and kept when its planar distance to the origin is within the radius.
+    
+    Args:
+        geometries (array-like): Polygons in EPSG:4326, e.g. gdf.geometry.
+        tree (shapely.STRtree, optional): Existing tree over the same geometries. Defaults to None.
+    """
+    def __init__(self,geometries,tree=None):
+        self.geometries = np.asarray(geometries,dtype=object)
+        self.tree = tree if tree is not None else shapely.STRtree(self.geometries)
+    
+    def __len__(self):
+        return len(self.geometries)
+    
+    def candidates(self,lons,lats,radii):
+        """(centre, polygon) pairs whose bounding boxes intersect each centre's radius box (radii in km)."""
+        dlat = np.degrees(radii/EARTH_RADIUS_KM)
+        # use the latitude closest to the pole within the box so the box stays conservative
+        coslat = np.cos(np.radians(np.minimum(np.abs(lats)+dlat,89.9)))
+        dlon = np.minimum(dlat/coslat,180.0)
+        boxes = shapely.box(lons-dlon,lats-dlat,lons+dlon,lats+dlat)
+        return self.tree.query(boxes,predicate='intersects')
+    
+    def query(self,lons,lats,radii,chunk_size=100000):
+        """Select the polygons within a radius of each centre.
+        
+        Args:
+            lons (array-like): Centre longitudes.
+            lats (array-like): Centre latitudes.
+            radii (float or array-like): Radius in kilometres, one for all centres or one per centre.
+            chunk_size (int, optional): Candidate pairs tested at once. Defaults to 100000.
+        
+        Returns:
+            scipy.sparse.csr_matrix: Boolean (centres x polygons) membership matrix.
+        """
+        lons = np.atleast_1d(np.asarray(lons,dtype=float))
+        lats = np.atleast_1d(np.asarray(lats,dtype=float))
+        radii = np.broadcast_to(np.asarray(radii,dtype=float),lons.shape)
+        assert len(lons) == len(lats), print("lons and lats must have the same length.")
+        
+        centre_idx, poly_idx = self.candidates(lons,lats,radii)
+        keep = np.zeros(len(centre_idx),dtype=bool)
+        origin = shapely.points(0.0,0.0)
+        for start in range(0,len(centre_idx),chunk_size):
+            c = centre_idx[start:start+chunk_size]
+            geoms = self.geometries[poly_idx[start:start+chunk_size]]
+            # every coordinate is projected about the centre of its own pair
+            owner = np.repeat(c,shapely.get_num_coordinates(geoms))
+            projected = shapely.transform(geoms,lambda xy: aeqd_project(xy[:,0],xy[:,1],lons[owner],lats[owner]))
+            keep[start:start+chunk_size] = shapely.distance(origin,projected) <= radii[c]
+        
+        centre_idx, poly_idx = centre_idx[keep], poly_idx[keep]
+        return sparse.csr_matrix((np.ones(len(centre_idx),dtype=bool),(centre_idx,poly_idx)),
+                                 shape=(len(lons),len(self)))
 
 def polygons_within_radius(gdf,lat,lon,radius):
     """Find polygons within a given radius of a center point.
@@ -549,20 +1006,11 @@ def polygons_within_radius(gdf,lat,lon,radius):
         radius (float): The radius in kilometers.
     
     Returns:
-        GeoDataFrame: A GeoDataFrame containing polygons that intersect with the buffered center point.
+        GeoDataFrame: A GeoDataFrame containing polygons within the radius of the center point.
     """
-    center_point = gpd.GeoDataFrame(geometry=gpd.points_from_xy([lon],[lat]), crs='EPSG:4326')
-    
-    # Ensure that GeoJSON is in same CRS as the center point
-    gdf = gdf.to_crs(center_point.crs)
-
-    # Buffer center point by 10km radius (assuming the CRS is in degrees, 
-    # if it's in meters, adjust the buffer value accordingly)
-    center_point.geometry = center_point.geometry.buffer(radius/111.32) # Rough conversion from km to degrees
-
-    # Use spatial join to find polygons that intersect with buffered center point
-    polygons_in_radius = sjoin(gdf, center_point, op='intersects')
-    return polygons_in_radius 
+    gdf = gdf.to_crs("EPSG:4326")
+    membership = RadiusIndex(gdf.geometry.values).query([lon],[lat],radius)
+    return gdf.iloc[np.sort(membership.indices)]
 
 def load_statistical_area(filename,layer,column_name=None,filter_value=None):
     gdf = gpd.read_file(filename,layer=layer)
@@ -603,12 +1051,7 @@ class BoundaryJSON(Datasets):
         self.graph = GeoHierarchy(self.boundary_path)
         self.graph.load()
         
-        files = glob.glob(os.path.join(self.boundary_path,"*.gpkg"))
-        self.Areas = {}
-        for filei in files:
-            layers = fiona.listlayers(filei)
-            for l in layers:
-                self.Areas[l.split("_")[0]] = {'filename':filei,'layer':l}
+        self.Areas = layer_areas(self.boundary_path)
 
         self.Australia_BoundingBox_Poly = gpd.GeoDataFrame(geometry=g)
 
@@ -642,10 +1085,42 @@ class BoundaryJSON(Datasets):
     def set_radius(self,radius=10):
         self.gdf = polygons_within_radius(self.gdf,self.City.lat,self.City.lon,radius)
 
-def node_to_gdf(G,node_ids,level=None,label=None):
+def layer_areas(boundary_path,validate='mtime'):
+    """Map each statistical area prefix (e.g. "SA2") to the GeoPackage and layer holding it.
+    
+    Layer names are read from a manifest cached next to the GeoPackages, which is only
+    rescanned for files whose size or modification time (or hash) changed.
+    
+    Args:
+        boundary_path (str): Directory containing the ASGS GeoPackages.
+        validate (str, optional): 'mtime' or 'hash', see file_signature. Defaults to 'mtime'.
+        
+    Returns:
+        dict: Area prefix -> {'filename', 'layer', 'rows', 'bounds'}.
+    """
+    files = glob.glob(os.path.join(boundary_path,"*.gpkg"))
+    manifest = load_layer_manifest(files,os.path.join(boundary_path,"layer_manifest.json"),validate=validate)
+    areas = {}
+    for filei in files:
+        for l, info in manifest[os.path.abspath(filei)]['layers'].items():
+            areas[l.split("_")[0]] = {'filename':filei,'layer':l,'rows':info['rows'],'bounds':info['bounds']}
+    return areas
+
+def node_to_gdf(G,node_ids,level=None,label=None,resolution=None,topology=None):
     #return gpd.GeoDataFrame(nodes,crs="EPSG:4326").sort_values(['level','label'])
     gdf = gpd.GeoDataFrame([G.nodes[c] for c in node_ids],crs="EPSG:4326")
     gdf.index = node_ids
+    if topology is not None:
+        # reassemble the geometries of the nodes covered by the topology from its shared arcs
+        if resolution is not None:
+            topology = topology.simplify(resolution)
+            resolution = None
+        pos = topology.ids.get_indexer(list(node_ids))
+        covered = pos >= 0
+        gdf.loc[covered,'geometry'] = topology.geometries(pos[covered])
+    if resolution is not None:
+        # graphs carry no precomputed pyramids, so simplify on the fly
+        gdf['geometry'] = gdf['geometry'].simplify(resolution,preserve_topology=True)
     gdf = gdf.sort_values(['level','label'])
     gdf = gdf[~gdf['geometry'].isna()]
     if level is not None:
@@ -660,15 +1135,10 @@ class Boundary(Datasets):
         super().__init__(dataset_path)
         self.dataset_path = dataset_path
         
-        self.graph = GeoHierarchy(self.boundary_path)
-        self.graph.load()
+        # the hierarchy is only loaded on first use, see the graph property
+        self._graph = None
         
-        files = glob.glob(os.path.join(self.boundary_path,"*.gpkg"))
-        self.Areas = {}
-        for filei in files:
-            layers = fiona.listlayers(filei)
-            for l in layers:
-                self.Areas[l.split("_")[0]] = {'filename':filei,'layer':l}
+        self.Areas = layer_areas(self.boundary_path)
 
         self.Australia_BoundingBox_Poly = gpd.GeoDataFrame(geometry=g)
          
@@ -700,86 +1170,92 @@ class Boundary(Datasets):
         #"Remoteness Areas divide Australia and the states and territories into 5 classes of remoteness on the basis of their relative access to services. Remoteness Areas are based on the Accessibility/Remoteness Index of Australia Plus (ARIA+), produced by the Hugo Centre for Population and Migration Studies.",                           
         self.info = pd.Series(info) #,columns=['Code','Description'])
 
-    def get_boundaries_down(self,node,level=None,label=None):
+    @property
+    def graph(self):
+        if self._graph is None:
+            self._graph = GeoHierarchy(self.boundary_path)
+            self._graph.load()
+        return self._graph
+    
+    @graph.setter
+    def graph(self, graph):
+        self._graph = graph
+
+    def get_boundaries_down(self,node,level=None,label=None,resolution=None,zoom=None):
         node_ids = self.graph.get_children(node,depth=1)
-        gdf = node_to_gdf(self.graph.G,node_ids,level=level,label=label)
+        gdf = self.graph.to_gdf(node_ids,level=level,label=label,resolution=resolution,zoom=zoom)
         return gdf
     
-    def get_boundaries_up(self,node,level=None,label=None):
+    def get_boundaries_up(self,node,level=None,label=None,resolution=None,zoom=None):
         node_ids = self.graph.get_parents(node,depth=1)
-        return node_to_gdf(self.graph.G,node_ids)
+        return self.graph.to_gdf(node_ids,resolution=resolution,zoom=zoom)
     
-    def get_boundary(self,level,label,belonging_to=None,as_gdf=True):
+    def get_boundary(self,level,label,belonging_to=None,as_gdf=True,resolution=None,zoom=None):
         if belonging_to is not None:
             return self.graph.search_nodes(level=level,parent_label=belonging_to)
-        node_ids = self.graph.get_nodes(level=level,label=label)
-        if as_gdf:
-            return node_to_gdf(self.graph.G,node_ids)
-        else:
-            return node_ids
+        return self.graph.query(level, None, as_gdf, resolution, zoom, label=label)
         
-    def get_country(self,as_gdf=True):
-        return self.graph.query("AUS", None, as_gdf)
+    def get_country(self,as_gdf=True,resolution=None,zoom=None):
+        return self.graph.query("AUS", None, as_gdf, resolution, zoom)
     
-    def get_state(self,state,as_gdf=True):
-        node_ids = self.graph.get_nodes(label=state,level="STATE")
-        return node_to_gdf(self.graph.G,node_ids)
+    def get_state(self,state,as_gdf=True,resolution=None,zoom=None):
+        return self.graph.query("STATE", None, as_gdf, resolution, zoom, label=state)
         
-    def get_states(self,as_gdf=True):
-        return self.graph.query("STATE", None, as_gdf)
+    def get_states(self,as_gdf=True,resolution=None,zoom=None):
+        return self.graph.query("STATE", None, as_gdf, resolution, zoom)
     
-    def get_indigenous_regions(self,parent_label=None,as_gdf=True):
-        return self.graph.query("IREG", parent_label, as_gdf)
+    def get_indigenous_regions(self,parent_label=None,as_gdf=True,resolution=None,zoom=None):
+        return self.graph.query("IREG", parent_label, as_gdf, resolution, zoom)
     
-    def get_indigenous_areas(self,parent_label=None,as_gdf=True):
-        return self.graph.query("IREA", parent_label, as_gdf)
+    def get_indigenous_areas(self,parent_label=None,as_gdf=True,resolution=None,zoom=None):
+        return self.graph.query("IREA", parent_label, as_gdf, resolution, zoom)
     
-    def get_lgas(self,parent_label=None,as_gdf=True):
-        return self.graph.query("LGA", parent_label, as_gdf)
+    def get_lgas(self,parent_label=None,as_gdf=True,resolution=None,zoom=None):
+        return self.graph.query("LGA", parent_label, as_gdf, resolution, zoom)
     
-    def get_electoral_divisions(self,parent_label=None,as_gdf=True):
-        return self.graph.query("CED", parent_label, as_gdf)
+    def get_electoral_divisions(self,parent_label=None,as_gdf=True,resolution=None,zoom=None):
+        return self.graph.query("CED", parent_label, as_gdf, resolution, zoom)
     
-    def get_meshblocks(self,parent_label=None,as_gdf=True):
-        return self.graph.query("MB", parent_label, as_gdf)
+    def get_meshblocks(self,parent_label=None,as_gdf=True,resolution=None,zoom=None):
+        return self.graph.query("MB", parent_label, as_gdf, resolution, zoom)
     
-    def get_gccs(self,as_gdf=True):
-        node_ids = get_nodes_by_level(self.graph.G,"GCCSA")
+    def get_gccs(self,as_gdf=True,resolution=None,zoom=None):
+        node_ids = self.graph.level_index.get("GCCSA",[])
         if as_gdf:
-            gdf = node_to_gdf(self.graph.G,node_ids)
+            gdf = self.graph.query("GCCSA", None, True, resolution, zoom)
             gdf = gdf[~gdf['label'].str.contains("Rest of")]
             gdf = gdf[~gdf['label'].str.contains("Other")]
             return gdf
         else:
             return node_ids
     
-    def get_gcc(self,city):
+    def get_gcc(self,city,resolution=None,zoom=None):
         #node_ids = get_nodes_by_level_and_label(self.graph.G,level="GCCSA",label=city)
        # node_ids = self.graph.get_nodes(level="GGCSA",label=city)
         #return self.graph.query("SA3", city, as_gdf=True)
-        return self.get_sa3(belonging_to=city)
+        return self.get_sa3(belonging_to=city,resolution=resolution,zoom=zoom)
         
         #gdf = node_to_gdf(node_ids)
         #gdf = gdf[~gdf['label'].str.contains("Rest of")]
         #return gdf
     
-    def get_sa1(self,belonging_to=None,as_gdf=True):
-        return self.graph.query("SA1", belonging_to, as_gdf)
+    def get_sa1(self,belonging_to=None,as_gdf=True,resolution=None,zoom=None):
+        return self.graph.query("SA1", belonging_to, as_gdf, resolution, zoom)
     
-    def get_sa2(self,belonging_to=None,as_gdf=True):
-        return self.graph.query("SA2", belonging_to, as_gdf)
+    def get_sa2(self,belonging_to=None,as_gdf=True,resolution=None,zoom=None):
+        return self.graph.query("SA2", belonging_to, as_gdf, resolution, zoom)
     
-    def get_sa3(self,belonging_to=None,as_gdf=True):
-        return self.graph.query("SA3", belonging_to, as_gdf)
+    def get_sa3(self,belonging_to=None,as_gdf=True,resolution=None,zoom=None):
+        return self.graph.query("SA3", belonging_to, as_gdf, resolution, zoom)
     
-    def get_sa4(self,belonging_to=None,as_gdf=True):
-        return self.graph.query("SA4", belonging_to, as_gdf)
+    def get_sa4(self,belonging_to=None,as_gdf=True,resolution=None,zoom=None):
+        return self.graph.query("SA4", belonging_to, as_gdf, resolution, zoom)
     
-    def get_tr(self,belonging_to=None,as_gdf=True):
-        return self.graph.query("TR", belonging_to, as_gdf)
+    def get_tr(self,belonging_to=None,as_gdf=True,resolution=None,zoom=None):
+        return self.graph.query("TR", belonging_to, as_gdf, resolution, zoom)
     
-    def get_sua(self,belonging_to=None,as_gdf=True):
-        return self.graph.query("SUA", belonging_to, as_gdf)
+    def get_sua(self,belonging_to=None,as_gdf=True,resolution=None,zoom=None):
+        return self.graph.query("SUA", belonging_to, as_gdf, resolution, zoom)
     
     def get_full_df(self,column_name=None,filter_value=None):
         list_nodes = list(self.graph.G.nodes(data=True))
@@ -799,13 +1275,13 @@ class Boundary(Datasets):
     def get_parents_with_label_recursive(self, node, label):
         return get_parents_with_label(node,parent_label=label)
     
-    def get_children_with_level_recursive(self, node, level):
+    def get_children_with_level_recursive(self, node, level, resolution=None, zoom=None):
         node_ids = self.graph.get_children_with_level(node,child_level=level)
-        return node_to_gdf(self.graph.G,node_ids)
+        return self.graph.to_gdf(node_ids,resolution=resolution,zoom=zoom)
     
-    def get_children_with_label_recursive(self,node, label):
+    def get_children_with_label_recursive(self,node, label, resolution=None, zoom=None):
         node_ids = self.graph.get_children_with_label(node,child_label=label)
-        return node_to_gdf(self.graph.G,node_ids)
+        return self.graph.to_gdf(node_ids,resolution=resolution,zoom=zoom)
     
     def pyvis(self,subG):
         nt = pyvisNetwork('500px', '100%')
@@ -815,6 +1291,29 @@ class Boundary(Datasets):
     def get_subnetwork(self, node, depth,remove_geometry=True):
         return self.graph.get_subnetwork(node,depth,remove_geometry)
     
+    def locate(self,lons,lats,levels=['MB','SA1','SA2','SA3','SA4','GCCSA','STATE'],chunk_size=100000,workers=None):
+        return self.graph.locate(lons,lats,levels=levels,chunk_size=chunk_size,workers=workers)
+    
+    def within_radius(self,lons,lats,radii,level='SA2'):
+        """Batched radius selection, see GeoHierarchy.within_radius."""
+        return self.graph.within_radius(lons,lats,radii,level)
+    
+    def get_neighbours(self,node,contiguity='queen'):
+        return self.graph.get_neighbours(node,contiguity=contiguity)
+    
+    def get_spatial_weights(self,level,contiguity='queen',row_standardise=False):
+        return self.graph.spatial_weights(level,contiguity=contiguity,row_standardise=row_standardise)
+    
+    def aggregate(self,values,from_level='MB',to_levels=['SA1','SA2','SA3','SA4','GCCSA','STATE'],how='sum',weights=None):
+        return self.graph.aggregate(values,from_level=from_level,to_levels=to_levels,how=how,weights=weights)
+    
+    def cache_info(self):
+        """Hit/miss counters of the boundary query cache."""
+        return self.graph.cache_info()
+    
+    def clear_cache(self):
+        self.graph.query_cache.clear()
+    
 class OpenStreetMap:
     def __init__(self,dataset_path):
         self.dataset_path = dataset_path
@@ -0,0 +1,89 @@
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    """Thread-safe least-recently-used cache bounded by entry count and/or total size.
+
+    Args:
+        maxsize (int, optional): Maximum number of entries. Defaults to 128, None for no limit.
+        max_bytes (int, optional): Maximum total size of the entries. Defaults to None (no limit).
+        sizeof (callable, optional): Returns the size in bytes of a value. Defaults to counting
+            every entry as 0 bytes.
+    """
+    def __init__(self, maxsize=128, max_bytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof if sizeof is not None else (lambda value: 0)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def get(self, key, default=None):
+        """Return a cached value and mark it as recently used, counting a hit or a miss."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """Insert a value, evicting least-recently-used entries to respect the limits."""
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= self._sizes.pop(key)
+                del self._data[key]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = value
+            self._sizes[key] = size
+            self.nbytes += size
+            while ((self.maxsize is not None and len(self._data) > self.maxsize) or
+                   (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+                old, _ = self._data.popitem(last=False)
+                self.nbytes -= self._sizes.pop(old)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing and caching it on a miss.
+
+        The computation runs outside the lock, so concurrent misses on the same key may
+        compute it more than once; the last result wins.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """Drop all entries. Counters are kept."""
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """Hit/miss counters and current usage of the cache."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self._data),
+                    'nbytes': self.nbytes,
+                    'hit_rate': self.hits / total if total else 0.0}
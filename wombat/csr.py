@@ -0,0 +1,31 @@
+import numpy as np
+
+def expand_ranges(indptr, rows):
+    """Positions covered by the CSR rows, with the index (into rows) each position came from.
+
+    Args:
+        indptr (numpy.ndarray): CSR index pointer.
+        rows (numpy.ndarray): Rows to expand.
+
+    Returns:
+        tuple: (positions, owner) integer arrays of equal length.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    owner = np.repeat(np.arange(len(rows)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets, owner
+
+def csr_rows(indptr, indices, rows):
+    """Gather the column indices of several CSR rows in one go.
+
+    Args:
+        indptr (numpy.ndarray): CSR row pointer.
+        indices (numpy.ndarray): CSR column indices.
+        rows (array-like): Row positions to gather.
+
+    Returns:
+        numpy.ndarray: Concatenated column indices of the requested rows.
+    """
+    return indices[expand_ranges(indptr, rows)[0]]
@@ -7,9 +7,18 @@ import numpy as np
 import matplotlib.ticker as mticker
 from rasterio.transform import from_origin
 import os
+import threading
+from wombat.cache import LRUCache
+from wombat.raster import lonlat_to_pixel, RasterBlocks
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from wombat.viewshed import viewshed, cumulative_viewshed, pixel_size_m, CURVATURE_COEFF, EARTH_DIAMETER_M
+from wombat.terrain import compute_terrain
+from wombat.hydrology import priority_flood, flow_accumulation, d8_flow_direction, fill_tiled, InundationSweep
 
 import rasterio
+import rasterio.features
 from rasterio.transform import from_origin
+from shapely.geometry import box
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import plotly
@@ -265,22 +274,103 @@ def save_to_raster_rasterio(data, lon, lat, x_res, y_res,crs, filename):
     new_dataset.close()
 
 
-def latlon_to_elevation(ds,gt, lons,lats):
-    # Convert list of coordinates to numpy arrays
-    lons = np.array(lons)
-    lats = np.array(lats)
-
-    # Vectorized computation of x and y
-    xs = ((lons - gt[0]) / gt[1]) #.astype('int')
-    ys = ((lats - gt[3]) / gt[5]) #.astype('int')
-
-    # Initialize elevation array
-    elevations = np.empty_like(lons, dtype=np.float32)
+def latlon_to_elevation(ds,gt,lons,lats):
+    """Elevation of the pixel containing each point.
+    
+    All points are converted to pixel indices at once and grouped by the raster's
+    internal blocks, so each block is read a single time.
+    
+    Args:
+        ds (gdal.Dataset): Elevation raster.
+        gt (tuple): Geotransform of ds.
+        lons (array-like): Longitudes.
+        lats (array-like): Latitudes.
+    
+    Returns:
+        numpy.ndarray: float32 elevations, NaN for points outside the raster or on nodata.
+    """
+    cols, rows = lonlat_to_pixel(gt,lons,lats)
+    return RasterBlocks(ds).gather(np.floor(rows),np.floor(cols)).astype(np.float32)
 
-    # Read each pixel value. Looping here as GDAL's ReadAsArray does not support vectorized reads.
-    for i in range(len(lons)):
-        elevations[i] = ds.ReadAsArray(xs[i], ys[i], 1, 1)[0][0]
-    return elevations
+def rays_visible(blocks,gt,src_cols,src_rows,src_h,dst_cols,dst_rows,dst_h,method='bilinear',step=1.0,
+                 curvature_coeff=CURVATURE_COEFF):
+    """Line-of-sight test for a batch of rays, sampled as one padded matrix.
+    
+    Each ray is sampled every step pixels between its end points. Rays of different
+    lengths are padded to the longest so the terrain under every ray is gathered in a
+    single block-wise read and compared with the sight line in array form.
+    
+    Args:
+        blocks (RasterBlocks): DEM reader.
+        gt (tuple): Geotransform of the DEM.
+        src_cols, src_rows (numpy.ndarray): Fractional pixel coordinates of the sources.
+        src_h (numpy.ndarray): Source heights above the ground in metres.
+        dst_cols, dst_rows (numpy.ndarray): Fractional pixel coordinates of the targets.
+        dst_h (numpy.ndarray): Target heights above the ground in metres.
+        method (str, optional): Terrain interpolation, see RasterBlocks.sample. Defaults to 'bilinear'.
+        step (float, optional): Sample spacing in pixels. Defaults to 1.
+        curvature_coeff (float, optional): Earth curvature/refraction coefficient. Defaults to 0.85714.
+    
+    Returns:
+        numpy.ndarray: True where no terrain rises above the sight line. Rays with an end
+            point outside the DEM or on nodata are False; nodata in between does not block.
+    """
+    dc, dr = dst_cols - src_cols, dst_rows - src_rows
+    n = np.maximum(np.ceil(np.maximum(np.abs(dc),np.abs(dr)) / step).astype(np.int64) + 1,2)
+    N = n.max()
+    k = np.arange(N)[None,:]
+    frac = np.minimum(k / (n[:,None] - 1),1.0)
+    Z = blocks.sample(src_cols[:,None] + dc[:,None]*frac,src_rows[:,None] + dr[:,None]*frac,method=method).reshape(frac.shape)
+    
+    lat = gt[3] + (src_rows + dr/2)*gt[5]
+    px, py = pixel_size_m(gt,lat)
+    length = np.hypot(dc*px,dr*py)
+    dist = length[:,None]*frac
+    Z = Z - curvature_coeff*dist**2/EARTH_DIAMETER_M
+    z_src = Z[:,0] + src_h
+    z_dst = Z[np.arange(len(n)),n-1] + dst_h
+    sight = z_src[:,None] + (z_dst - z_src)[:,None]*frac
+    interior = (k > 0) & (k < n[:,None] - 1)
+    blocked = (np.where(interior,Z,-np.inf) > sight).any(axis=1)
+    return np.isfinite(z_src) & np.isfinite(z_dst) & ~blocked
+
+_los_blocks = {}
+
+def _los_init(filename):
+    """Process pool initializer: open the DEM once per worker."""
+    _los_blocks['ds'] = gdal.Open(filename)
+    _los_blocks['blocks'] = RasterBlocks(_los_blocks['ds'],cache=LRUCache(maxsize=256),key=filename)
+
+def _los_chunk(gt,args,kwargs):
+    return rays_visible(_los_blocks['blocks'],gt,*args,**kwargs)
+
+def bresenham(x0, y0, x1, y1):
+    """Integer grid cells on the line from (x0, y0) to (x1, y1), end points included.
+    
+    Args:
+        x0, y0 (int): Start cell.
+        x1, y1 (int): End cell.
+    
+    Yields:
+        tuple: (x, y) cells in order from the start to the end.
+    """
+    x0, y0, x1, y1 = int(x0), int(y0), int(x1), int(y1)
+    dx = abs(x1 - x0)
+    dy = -abs(y1 - y0)
+    sx = 1 if x0 < x1 else -1
+    sy = 1 if y0 < y1 else -1
+    err = dx + dy
+    while True:
+        yield x0, y0
+        if x0 == x1 and y0 == y1:
+            return
+        e2 = 2*err
+        if e2 >= dy:
+            err += dy
+            x0 += sx
+        if e2 <= dx:
+            err += dx
+            y0 += sy
 
 def visibility_map_target(elevation_grid, point):
     """Determines the visibility map for a target point in an elevation grid.
@@ -361,6 +451,199 @@ def run_gdal_viewshed(x_index, y_index, a_nodata='-9999', f_format='GTiff', oz_v
            
     subprocess.call(cmd)
 
+def open_section_dataset(array,pixel_size):
+    """Wrap a DEM section as an in-memory GDAL dataset without copying it.
+    
+    The dataset gets a local metric geotransform with its origin at the top-left corner,
+    so observer positions, maximum distances and heights are all in metres.
+    
+    Args:
+        array (numpy.ndarray): float32/float64 DEM section, NaN for nodata.
+        pixel_size (tuple): (x, y) pixel size in metres.
+    
+    Returns:
+        gdal.Dataset: MEM dataset sharing array's memory.
+    """
+    ds = gdal_array.OpenArray(array)
+    ds.SetGeoTransform((0.0,pixel_size[0],0.0,0.0,0.0,-pixel_size[1]))
+    ds.GetRasterBand(1).SetNoDataValue(float('nan'))
+    return ds
+
+def gdal_viewshed_array(ds,row,col,observer_height=1.7,target_height=0.0,max_distance=0.0,
+                        curvature_coeff=CURVATURE_COEFF):
+    """Run GDAL's viewshed in process on a dataset made by open_section_dataset.
+    
+    Args:
+        ds (gdal.Dataset): Section dataset.
+        row (int): Observer row.
+        col (int): Observer column.
+        observer_height (float, optional): Observer height above the ground in metres. Defaults to 1.7.
+        target_height (float, optional): Target height above the ground in metres. Defaults to 0.
+        max_distance (float, optional): Maximum distance in metres, 0 for none. Defaults to 0.
+        curvature_coeff (float, optional): Earth curvature/refraction coefficient. Defaults to 0.85714.
+    
+    Returns:
+        numpy.ndarray: Boolean visibility.
+    """
+    gt = ds.GetGeoTransform()
+    out = gdal.ViewshedGenerate(ds.GetRasterBand(1),'MEM','',[],
+                                (col + 0.5)*gt[1],(row + 0.5)*gt[5],
+                                observer_height,target_height,
+                                1,0,0,0,
+                                curvature_coeff,gdal.GVM_Edge,max_distance)
+    visible = out.GetRasterBand(1).ReadAsArray() == 1
+    out = None
+    return visible
+
+def bounds_window(gt,nx,ny,bounds=None):
+    """Pixel window covering lon/lat bounds, clipped to the raster.
+    
+    Args:
+        gt (tuple): GDAL geotransform of the raster.
+        nx (int): Raster width.
+        ny (int): Raster height.
+        bounds (tuple, optional): (lon_min, lat_min, lon_max, lat_max). Defaults to the whole raster.
+    
+    Returns:
+        tuple: (xoff, yoff, width, height).
+    """
+    if bounds is None:
+        return (0, 0, nx, ny)
+    cols, rows = lonlat_to_pixel(gt,np.array([bounds[0],bounds[2]]),np.array([bounds[3],bounds[1]]))
+    x0, y0 = max(0,int(np.floor(cols[0]))), max(0,int(np.floor(rows[0])))
+    x1, y1 = min(nx,int(np.ceil(cols[1]))), min(ny,int(np.ceil(rows[1])))
+    return (x0, y0, x1 - x0, y1 - y0)
+
+def warp_to_window(src_filename,ref_ds,window,resampling='bilinear'):
+    """Virtual warp of a raster onto a pixel window of a reference grid.
+    
+    The result is a VRT dataset, so nothing is resampled until windows of it are read.
+    
+    Args:
+        src_filename (str): Raster to warp.
+        ref_ds (gdal.Dataset): Reference raster.
+        window (tuple): (xoff, yoff, width, height) of the reference grid.
+        resampling (str, optional): GDAL resampling method. Defaults to 'bilinear'.
+    
+    Returns:
+        gdal.Dataset: float32 VRT aligned with the window, NaN for nodata.
+    """
+    gt = ref_ds.GetGeoTransform()
+    x0, y0, width, height = window
+    west, north = gt[0] + x0*gt[1], gt[3] + y0*gt[5]
+    return gdal.Warp('',src_filename,format='VRT',dstSRS=ref_ds.GetProjection(),
+                     outputBounds=(west,north + height*gt[5],west + width*gt[1],north),
+                     width=width,height=height,resampleAlg=resampling,
+                     outputType=gdal.GDT_Float32,dstNodata=float('nan'))
+
+ZONAL_STATS = ['count','mean','std','min','max','rmse']
+
+def zonal_accumulate(totals,zone,values):
+    """Add values to running per-zone totals (count, sum, sum of squares, min, max).
+    
+    Args:
+        totals (dict): Arrays of length n_zones, updated in place.
+        zone (numpy.ndarray): Zone position of each value, negative for none.
+        values (numpy.ndarray): Values, NaN ignored.
+    """
+    keep = (zone >= 0) & np.isfinite(values)
+    zone, values = zone[keep], values[keep]
+    n = len(totals['count'])
+    totals['count'] += np.bincount(zone,minlength=n)
+    totals['sum'] += np.bincount(zone,weights=values,minlength=n)
+    totals['sumsq'] += np.bincount(zone,weights=values**2,minlength=n)
+    np.minimum.at(totals['min'],zone,values)
+    np.maximum.at(totals['max'],zone,values)
+
+def zonal_summary(totals,index=None):
+    """ZONAL_STATS from the totals of zonal_accumulate, NaN for empty zones."""
+    count = totals['count']
+    with np.errstate(invalid='ignore',divide='ignore'):
+        mean = totals['sum'] / count
+        meansq = totals['sumsq'] / count
+    empty = count == 0
+    return pd.DataFrame({'count': count,
+                         'mean': mean,
+                         'std': np.sqrt(np.maximum(meansq - mean**2,0)),
+                         'min': np.where(empty,np.nan,totals['min']),
+                         'max': np.where(empty,np.nan,totals['max']),
+                         'rmse': np.sqrt(meansq)},index=index)
+
+def compare_dem_files(ref_filename,other_filename,fileout=None,zones=None,bounds=None,tile_size=1024,
+                      resampling='bilinear',all_touched=False):
+    """Difference two DEMs on the grid of the first, window by window.
+    
+    The second DEM is warped onto the reference grid through a VRT, so each window is
+    resampled only when it is read, and the difference (reference minus other) is written
+    out and summarised per zone one window at a time. Memory is bounded by the tile size
+    whatever the extent.
+    
+    Args:
+        ref_filename (str): Reference DEM, whose grid is used.
+        other_filename (str): DEM to compare, in any CRS and resolution.
+        fileout (str, optional): Difference raster (tiled, compressed GeoTIFF). Defaults to None (not written).
+        zones (GeoDataFrame, optional): Polygons to summarise the difference over (e.g. SA2s).
+            Defaults to None, which summarises the whole area.
+        bounds (tuple, optional): (lon_min, lat_min, lon_max, lat_max). Defaults to the whole reference DEM.
+        tile_size (int, optional): Window width and height in pixels. Defaults to 1024.
+        resampling (str, optional): GDAL resampling method. Defaults to 'bilinear'.
+        all_touched (bool, optional): Count every pixel a zone touches rather than only the pixels
+            whose centre falls inside it. Zones smaller than a pixel usually contain no pixel centre
+            and come back empty (count 0, NaN statistics) unless this is set; with it, a pixel on the
+            border of two zones is counted for only one of them. Defaults to False.
+    
+    Returns:
+        pandas.DataFrame: ZONAL_STATS of the difference, one row per zone (index of zones),
+        or a single row 'all'.
+    """
+    ref = gdal.Open(ref_filename)
+    gt = ref.GetGeoTransform()
+    window = bounds_window(gt,ref.RasterXSize,ref.RasterYSize,bounds)
+    x0, y0, width, height = window
+    ref_blocks = RasterBlocks(ref)
+    other_blocks = RasterBlocks(warp_to_window(other_filename,ref,window,resampling))
+    
+    if zones is not None:
+        zones = zones.to_crs(ref.GetProjection()) if zones.crs is not None else zones
+        index = zones.index
+    else:
+        index = ['all']
+    n = len(index)
+    totals = {'count': np.zeros(n,dtype=np.int64), 'sum': np.zeros(n), 'sumsq': np.zeros(n),
+              'min': np.full(n,np.inf), 'max': np.full(n,-np.inf)}
+    
+    if fileout is not None:
+        out = gdal.GetDriverByName('GTiff').Create(fileout,width,height,1,gdal.GDT_Float32,
+                                                   ['TILED=YES','BLOCKXSIZE=512','BLOCKYSIZE=512',
+                                                    'COMPRESS=DEFLATE','PREDICTOR=3','BIGTIFF=IF_SAFER'])
+        out.SetGeoTransform((gt[0] + x0*gt[1],gt[1],gt[2],gt[3] + y0*gt[5],gt[4],gt[5]))
+        out.SetProjection(ref.GetProjection())
+        out.GetRasterBand(1).SetNoDataValue(float('nan'))
+    
+    for ty in range(0,height,tile_size):
+        for tx in range(0,width,tile_size):
+            w, h = min(tile_size,width - tx), min(tile_size,height - ty)
+            diff = ref_blocks.window(x0 + tx,y0 + ty,w,h) - other_blocks.window(tx,ty,w,h)
+            if fileout is not None:
+                out.GetRasterBand(1).WriteArray(diff.astype(np.float32),tx,ty)
+            west, north = gt[0] + (x0 + tx)*gt[1], gt[3] + (y0 + ty)*gt[5]
+            if zones is None:
+                zone = np.zeros(diff.shape,dtype=np.int64)
+            else:
+                # only burn the polygons that reach this window
+                hits = zones.sindex.query(box(west,north + h*gt[5],west + w*gt[1],north))
+                if not len(hits):
+                    continue
+                zone = rasterio.features.rasterize(zip(zones.geometry.values[hits],hits),out_shape=diff.shape,
+                                                   transform=rasterio.Affine(gt[1],0.0,west,0.0,gt[5],north),
+                                                   fill=-1,all_touched=all_touched,dtype='int64')
+            zonal_accumulate(totals,zone.ravel(),diff.ravel())
+    print("Compared %d x %d pixels" % (width,height))
+    if fileout is not None:
+        out.FlushCache()
+        out = None
+    return zonal_summary(totals,index)
+
 def plot_vis_grid(visibility_grid,observer,title):
     """Plot a visibility grid with an observer.
     
@@ -429,11 +712,14 @@ def plot_grid(grid, x1=None, y1=None, x2=None, y2=None, points=None):
     plt.show()
     
 class Elevation(Datasets):
-    def __init__(self,dataset_path,city=None):
+    def __init__(self,dataset_path,city=None,cache_bytes=256*1024**2):
         super().__init__(dataset_path,city)
         
         if city is not None:
             self.City = City(city)
+        
+        # decoded DEM blocks, shared by every reader and thread of this object
+        self.block_cache = LRUCache(maxsize=None,max_bytes=cache_bytes,sizeof=lambda block: block.nbytes)
     
     def set_dataset(self,dataset='ELVIS'):
         assert dataset in ['ELVIS','fabdem'],print("Please use either 'ELVIS' or 'fabdem'.")
@@ -445,6 +731,8 @@ class Elevation(Datasets):
         self.dataset = dataset
         if os.path.exists(fread):
             self.ds = gdal.Open(fread)
+            self.filename = fread
+            self.blocks = RasterBlocks(self.ds,cache=self.block_cache,key=fread)
             #self.arr = self.ds.ReadAsArray()
             self.raster_proj = self.ds.GetProjection()
             self.gt = self.ds.GetGeoTransform()
@@ -462,7 +750,67 @@ class Elevation(Datasets):
     def get_elevation(self,lons,lats): 
         self.lons = lons
         self.lats = lats
-        self.elevations = latlon_to_elevation(self.ds,self.gt,lons,lats)
+        cols, rows = lonlat_to_pixel(self.gt,lons,lats)
+        self.elevations = self.blocks.gather(np.floor(rows),np.floor(cols)).astype(np.float32)
+        
+    def sample(self,lons,lats,method='nearest'):
+        """Elevation at each point, interpolated from the surrounding pixels.
+        
+        Args:
+            lons (array-like): Longitudes.
+            lats (array-like): Latitudes.
+            method (str, optional): 'nearest' (the containing pixel), 'bilinear' or 'bicubic'.
+                Defaults to 'nearest'.
+        
+        Returns:
+            numpy.ndarray: Elevations, NaN outside the raster or next to nodata.
+        """
+        cols, rows = lonlat_to_pixel(self.gt,lons,lats)
+        return self.blocks.sample(cols,rows,method=method).reshape(np.shape(cols))
+        
+    def line_of_sight(self,src_lons,src_lats,src_h,dst_lons,dst_lats,dst_h,method='bilinear',step=1.0,
+                      curvature_coeff=CURVATURE_COEFF,chunk_size=10000,workers=None):
+        """Whether each source point can see its target point over the terrain.
+        
+        Rays are sorted by length and processed in chunks, each chunk sampled as one padded
+        matrix from the cached DEM blocks (see rays_visible). With workers the chunks are
+        fanned out to processes that each open the DEM themselves.
+        
+        Args:
+            src_lons, src_lats (array-like): Source coordinates, e.g. properties.
+            src_h (float or array-like): Source heights above the ground in metres.
+            dst_lons, dst_lats (array-like): Target coordinates, e.g. landmarks.
+            dst_h (float or array-like): Target heights above the ground in metres.
+            method (str, optional): Terrain interpolation. Defaults to 'bilinear'.
+            step (float, optional): Sample spacing along each ray in pixels. Defaults to 1.
+            curvature_coeff (float, optional): Earth curvature/refraction coefficient. Defaults to 0.85714.
+            chunk_size (int, optional): Rays per chunk. Defaults to 10000.
+            workers (int, optional): Number of processes; None or 1 runs in this process. Defaults to None.
+        
+        Returns:
+            numpy.ndarray: Boolean visibility per pair.
+        """
+        src_cols, src_rows = lonlat_to_pixel(self.gt,src_lons,src_lats)
+        dst_cols, dst_rows = lonlat_to_pixel(self.gt,dst_lons,dst_lats)
+        src_cols, src_rows, dst_cols, dst_rows = np.broadcast_arrays(src_cols,src_rows,dst_cols,dst_rows)
+        src_h = np.broadcast_to(np.asarray(src_h,dtype=np.float64),src_cols.shape)
+        dst_h = np.broadcast_to(np.asarray(dst_h,dtype=np.float64),src_cols.shape)
+        
+        # similar lengths in the same chunk keep the padding small
+        order = np.argsort(np.maximum(np.abs(dst_cols-src_cols),np.abs(dst_rows-src_rows)),kind='stable')
+        chunks = [order[i:i+chunk_size] for i in range(0,len(order),chunk_size)]
+        kwargs = dict(method=method,step=step,curvature_coeff=curvature_coeff)
+        args = [(src_cols[c],src_rows[c],src_h[c],dst_cols[c],dst_rows[c],dst_h[c]) for c in chunks]
+        
+        visible = np.zeros(len(order),dtype=bool)
+        if workers is None or workers <= 1:
+            results = [rays_visible(self.blocks,self.gt,*a,**kwargs) for a in args]
+        else:
+            with ProcessPoolExecutor(max_workers=workers,initializer=_los_init,initargs=(self.filename,)) as executor:
+                results = list(executor.map(_los_chunk,[self.gt]*len(args),args,[kwargs]*len(args)))
+        for c, r in zip(chunks,results):
+            visible[c] = r
+        return visible
         
     def make_section(self, lon, lat, box_width_km):
         
@@ -492,10 +840,11 @@ class Elevation(Datasets):
         self.x_end = self.x_start + box_width_pixels_x
         self.y_end = self.y_start + box_width_pixels_y
 
-        # Extract elevation data for this section
-        self.elevation_data = self.ds.ReadAsArray(self.x_start, self.y_start, 
-                                                  self.x_end-self.x_start, 
-                                                  self.y_end-self.y_start)
+        # Extract elevation data for this section from the (cached) raster blocks, in the
+        # raster's own dtype and nodata value (see section_values for float64 with NaN)
+        self.elevation_data = self.blocks.window(self.x_start, self.y_start, 
+                                                 self.x_end-self.x_start, 
+                                                 self.y_end-self.y_start, native=True)
          # The extent parameter takes bounding box in the form of (left, right, bottom, top)
         lon_min = self.gt[0] + (self.x_start * self.gt[1])
         lon_max = self.gt[0] + (self.x_end * self.gt[1])
@@ -503,6 +852,311 @@ class Elevation(Datasets):
         lat_max = self.gt[3] + (self.y_start * self.gt[5])
         self.extent = [lon_min, lon_max, lat_min, lat_max]
         
+    def section_values(self):
+        """The current section as float64 with NaN for nodata, as the analysis functions expect.
+        
+        Returns:
+            numpy.ndarray: A converted copy of elevation_data.
+        """
+        values = self.elevation_data.astype(np.float64)
+        if self.blocks.nodata is not None:
+            values[self.elevation_data == self.blocks.nodata] = np.nan
+        return values
+    
+    def viewshed(self,lon,lat,observer_height=1.7,target_height=0.0,max_distance=None,
+                 curvature_coeff=CURVATURE_COEFF,output='boolean'):
+        """Viewshed of an observer over the current section (see make_section).
+        
+        Args:
+            lon (float): Observer longitude.
+            lat (float): Observer latitude.
+            observer_height (float, optional): Observer height above the ground in metres. Defaults to 1.7.
+            target_height (float, optional): Target height above the ground in metres. Defaults to 0.
+            max_distance (float, optional): Maximum distance in metres. Defaults to None.
+            curvature_coeff (float, optional): Earth curvature/refraction coefficient. Defaults to 0.85714.
+            output (str, optional): 'boolean' or 'angle', see wombat.viewshed.viewshed. Defaults to 'boolean'.
+        
+        Returns:
+            numpy.ndarray: Raster aligned with elevation_data.
+        """
+        col, row = lonlat_to_pixel(self.gt,lon,lat)
+        self.viewshed_data = viewshed(self.section_values(),
+                                      int(np.floor(row)) - self.y_start,
+                                      int(np.floor(col)) - self.x_start,
+                                      observer_height=observer_height,
+                                      target_height=target_height,
+                                      max_distance=max_distance,
+                                      pixel_size=pixel_size_m(self.gt,lat),
+                                      curvature_coeff=curvature_coeff,
+                                      output=output)
+        return self.viewshed_data
+    
+    def cumulative_viewshed(self,observers,observer_height=1.7,target_height=0.0,max_distance=None,
+                            curvature_coeff=CURVATURE_COEFF,workers=None):
+        """Number of observers from which each cell of the current section is visible.
+        
+        Args:
+            observers (array-like or GeoDataFrame): (n, 2) observer longitudes and latitudes, or points.
+            observer_height (float, optional): Observer height above the ground in metres. Defaults to 1.7.
+            target_height (float, optional): Target height above the ground in metres. Defaults to 0.
+            max_distance (float, optional): Maximum distance in metres. Defaults to None.
+            curvature_coeff (float, optional): Earth curvature/refraction coefficient. Defaults to 0.85714.
+            workers (int, optional): Number of processes. Defaults to the CPU count.
+        
+        Returns:
+            numpy.ndarray: int32 counts aligned with elevation_data.
+        """
+        if hasattr(observers,'geometry'):
+            observers = np.column_stack([observers.geometry.x,observers.geometry.y])
+        observers = np.asarray(observers,dtype=np.float64).reshape(-1,2)
+        cols, rows = lonlat_to_pixel(self.gt,observers[:,0],observers[:,1])
+        rows = np.floor(rows).astype(np.int64) - self.y_start
+        cols = np.floor(cols).astype(np.int64) - self.x_start
+        section = self.section_values()
+        nrows, ncols = section.shape
+        inside = (rows >= 0) & (rows < nrows) & (cols >= 0) & (cols < ncols)
+        inside[inside] = np.isfinite(section[rows[inside],cols[inside]])
+        if not inside.all():
+            print("Skipping %d observers outside the section or on nodata." % (~inside).sum())
+        lat = self.extent[2] + (self.extent[3] - self.extent[2])/2
+        self.cumulative_viewshed_data = cumulative_viewshed(section,rows[inside],cols[inside],
+                                                            observer_height=observer_height,
+                                                            target_height=target_height,
+                                                            max_distance=max_distance,
+                                                            pixel_size=pixel_size_m(self.gt,lat),
+                                                            curvature_coeff=curvature_coeff,
+                                                            workers=workers)
+        return self.cumulative_viewshed_data
+    
+    def gdal_viewshed(self,lons,lats,observer_height=1.7,target_height=0.0,max_distance=0.0,
+                      curvature_coeff=CURVATURE_COEFF,workers=None):
+        """Viewsheds of observers over the current section using GDAL in process.
+        
+        Unlike run_gdal_viewshed nothing is written to disk and no process is spawned. The
+        section is wrapped as a MEM dataset once per thread (sharing its memory) and reused
+        for every observer that thread handles; GDAL releases the GIL while it computes.
+        
+        Args:
+            lons (float or array-like): Observer longitudes.
+            lats (float or array-like): Observer latitudes.
+            observer_height (float, optional): Observer height above the ground in metres. Defaults to 1.7.
+            target_height (float, optional): Target height above the ground in metres. Defaults to 0.
+            max_distance (float, optional): Maximum distance in metres, 0 for none. Defaults to 0.
+            curvature_coeff (float, optional): Earth curvature/refraction coefficient. Defaults to 0.85714.
+            workers (int, optional): Threads used for several observers. Defaults to the executor default.
+        
+        Returns:
+            numpy.ndarray: Boolean visibility aligned with elevation_data, stacked along a first
+            axis when several observers are given.
+        """
+        single = np.ndim(lons) == 0
+        cols, rows = lonlat_to_pixel(self.gt,np.atleast_1d(lons),np.atleast_1d(lats))
+        rows = np.floor(rows).astype(np.int64) - self.y_start
+        cols = np.floor(cols).astype(np.int64) - self.x_start
+        section = np.ascontiguousarray(self.section_values(),dtype=np.float32)
+        lat = self.extent[2] + (self.extent[3] - self.extent[2])/2
+        pixel_size = pixel_size_m(self.gt,lat)
+        local = threading.local()
+        
+        def run(i):
+            if not hasattr(local,'ds'):
+                local.ds = open_section_dataset(section,pixel_size)
+            return gdal_viewshed_array(local.ds,rows[i],cols[i],observer_height,target_height,
+                                       max_distance,curvature_coeff)
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            visible = np.stack(list(executor.map(run,range(len(rows)))))
+        return visible[0] if single else visible
+
+    def terrain(self,fileout,products=['slope','aspect'],bounds=None,tile_size=1024,workers=None,cog=True,**kwargs):
+        """Write terrain derivatives of the DEM to a tiled, compressed (COG) GeoTIFF.
+
+        The DEM is processed in tiles with halo cells in a process pool, so memory stays
+        bounded however large the area (see wombat.terrain.compute_terrain).
+
+        Args:
+            fileout (str): Output raster, one band per product.
+            products (list, optional): Any of 'slope', 'aspect', 'hillshade', 'tpi' and 'tri'. Defaults to ['slope','aspect'].
+            bounds (tuple, optional): (lon_min, lat_min, lon_max, lat_max). Defaults to the current
+                section if make_section has been called, otherwise the whole DEM.
+            tile_size (int, optional): Tile width and height in pixels. Defaults to 1024.
+            workers (int, optional): Number of processes. Defaults to the CPU count.
+            cog (bool, optional): Write a Cloud Optimised GeoTIFF. Defaults to True.
+            **kwargs: tpi_radius, azimuth and altitude, see compute_terrain.
+
+        Returns:
+            str: fileout.
+        """
+        return compute_terrain(self.filename,fileout,products=products,window=self.pixel_window(bounds),
+                               tile_size=tile_size,workers=workers,cog=cog,**kwargs)
+
+    def pixel_window(self,bounds=None):
+        """Pixel window (xoff, yoff, width, height) of lon/lat bounds, the current section or the whole DEM.
+
+        Args:
+            bounds (tuple, optional): (lon_min, lat_min, lon_max, lat_max). Defaults to the current
+                section if make_section has been called, otherwise the whole DEM.
+
+        Returns:
+            tuple: Window clipped to the DEM.
+        """
+        if bounds is not None or not hasattr(self,'x_start'):
+            return bounds_window(self.gt,self.ds.RasterXSize,self.ds.RasterYSize,bounds)
+        x0, y0, x1, y1 = max(0,self.x_start), max(0,self.y_start), self.x_end, self.y_end
+        x1, y1 = min(self.ds.RasterXSize,int(x1)), min(self.ds.RasterYSize,int(y1))
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    def section_pixel_size(self):
+        """(x, y) pixel size in metres at the middle of the current section."""
+        return pixel_size_m(self.gt,self.extent[2] + (self.extent[3] - self.extent[2])/2)
+
+    def fill_depressions(self,epsilon=True):
+        """Depression filled elevations of the current section (see wombat.hydrology.priority_flood).
+
+        Args:
+            epsilon (bool, optional): Give flats a tiny gradient so that they drain. Defaults to True.
+
+        Returns:
+            numpy.ndarray: Filled elevations aligned with elevation_data.
+        """
+        self.filled_data = priority_flood(self.section_values(),epsilon=epsilon)
+        return self.filled_data
+
+    def flow_accumulation(self,method='d8',weights=None):
+        """Flow accumulation over the current section, filling its depressions first if needed.
+
+        Args:
+            method (str, optional): 'd8' or 'dinf'. Defaults to 'd8'.
+            weights (numpy.ndarray, optional): Flow generated by each cell. Defaults to 1 (upslope cell count).
+
+        Returns:
+            numpy.ndarray: Accumulated flow aligned with elevation_data.
+        """
+        if getattr(self,'filled_data',None) is None or self.filled_data.shape != self.elevation_data.shape:
+            self.fill_depressions()
+        pixel_size = self.section_pixel_size()
+        if method == 'd8':
+            self.flow_direction_data = d8_flow_direction(self.filled_data,pixel_size)
+        self.flow_accumulation_data = flow_accumulation(self.filled_data,method=method,
+                                                        pixel_size=pixel_size,weights=weights)
+        return self.flow_accumulation_data
+
+    def fill_depressions_tiled(self,fileout,bounds=None,tile_size=2048,workers=None):
+        """Fill depressions of an area too large for memory, writing the result to a GeoTIFF.
+
+        Args:
+            fileout (str): Output filled DEM.
+            bounds (tuple, optional): (lon_min, lat_min, lon_max, lat_max), see pixel_window.
+            tile_size (int, optional): Tile width and height in pixels. Defaults to 2048.
+            workers (int, optional): Number of processes. Defaults to the CPU count.
+
+        Returns:
+            str: fileout.
+        """
+        return fill_tiled(self.filename,fileout,window=self.pixel_window(bounds),tile_size=tile_size,workers=workers)
+
+    def rasterize_section(self,gdf,values=None,all_touched=True):
+        """Burn geometries onto the grid of the current section.
+
+        Args:
+            gdf (GeoDataFrame): Geometries, reprojected to the DEM's CRS if they have one.
+            values (array-like, optional): Value burnt for each geometry. Defaults to 1.
+            all_touched (bool, optional): Burn every cell a geometry touches, so that footprints
+                smaller than a cell are kept. Defaults to True.
+
+        Returns:
+            numpy.ndarray: int64 raster aligned with elevation_data, -1 where no geometry falls.
+        """
+        if gdf.crs is not None:
+            gdf = gdf.to_crs(self.raster_proj)
+        values = np.ones(len(gdf),dtype=np.int64) if values is None else np.asarray(values,dtype=np.int64)
+        transform = rasterio.Affine(self.gt[1],0.0,self.extent[0],0.0,self.gt[5],self.extent[3])
+        return rasterio.features.rasterize(zip(gdf.geometry,values),out_shape=self.elevation_data.shape,
+                                           transform=transform,fill=-1,all_touched=all_touched,dtype='int64')
+
+    def inundation_sweep(self,seeds=None):
+        """Bathtub inundation of the current section for all water levels at once.
+
+        Args:
+            seeds (numpy.ndarray or GeoDataFrame, optional): Water sources (coast, rivers) as a
+                boolean mask aligned with elevation_data or as geometries. Defaults to the cells
+                next to nodata, which is the coastline when the sea is nodata, or to the section
+                border when the section has no nodata.
+
+        Returns:
+            wombat.hydrology.InundationSweep: Use extent(level), depth(level) and curves(zones, levels).
+        """
+        if hasattr(seeds,'geometry'):
+            seeds = self.rasterize_section(seeds) >= 0
+        self.inundation = InundationSweep(self.section_values(),seeds=seeds)
+        return self.inundation
+
+    def inundation_curves(self,zones,levels=np.arange(0.5,10.01,0.5),id_column=None,seeds=None):
+        """Inundated fraction and depth of every footprint or meshblock at every water level.
+
+        Args:
+            zones (GeoDataFrame): Building footprints, meshblocks or other polygons.
+            levels (array-like, optional): Water levels in metres. Defaults to 0.5 m steps up to 10 m.
+            id_column (str, optional): Column identifying each polygon. Defaults to the index.
+            seeds (numpy.ndarray or GeoDataFrame, optional): See inundation_sweep. Only used when
+                no sweep has been run on the current section yet.
+
+        Returns:
+            pandas.DataFrame: One row per polygon and level, see InundationSweep.curves.
+        """
+        if getattr(self,'inundation',None) is None or self.inundation.dem.shape != self.elevation_data.shape:
+            self.inundation_sweep(seeds)
+        ids = zones.index if id_column is None else zones[id_column]
+        raster = self.rasterize_section(zones,values=np.arange(len(zones)))
+        curves = self.inundation.curves(raster,levels)
+        curves['zone'] = np.asarray(ids)[curves['zone'].values]
+        return curves
+
+    def compare_datasets(self,fileout=None,zones=None,id_column=None,bounds=None,reference='ELVIS',
+                         tile_size=1024,resampling='bilinear',all_touched=False):
+        """Difference ELVIS and FABDEM on a common grid, summarised per polygon.
+
+        The other dataset is warped onto the reference grid window by window (see
+        compare_dem_files), so no national-scale array is ever held in memory and there is
+        no need to cut matching sections by hand.
+
+        Args:
+            fileout (str, optional): Difference raster (reference minus other). Defaults to None (not written).
+            zones (GeoDataFrame, optional): Polygons to summarise over, e.g. from GeoHierarchy.to_gdf. Defaults to None.
+            id_column (str, optional): Column identifying each polygon. Defaults to the index.
+            bounds (tuple, optional): (lon_min, lat_min, lon_max, lat_max). Defaults to the current
+                section if make_section has been called, otherwise the whole reference DEM.
+            reference (str, optional): 'ELVIS' or 'fabdem', the dataset whose grid is used. Defaults to 'ELVIS'.
+            tile_size (int, optional): Window width and height in pixels. Defaults to 1024.
+            resampling (str, optional): GDAL resampling method. Defaults to 'bilinear'.
+            all_touched (bool, optional): Count every pixel a polygon touches, so polygons smaller
+                than a pixel are not left empty, see compare_dem_files. Defaults to False.
+
+        Returns:
+            pandas.DataFrame: count, mean, std, min, max and rmse of the difference per polygon.
+        """
+        assert reference in ['ELVIS','fabdem'],print("Please use either 'ELVIS' or 'fabdem'.")
+        files = [self.elevation_tif_filename_elvis,self.elevation_tif_filename_FABDEM]
+        if reference == 'fabdem':
+            files = files[::-1]
+        for fread in files:
+            assert os.path.exists(fread),print("Missing DEM", fread)
+        if bounds is None and hasattr(self,'extent'):
+            bounds = (self.extent[0],self.extent[2],self.extent[1],self.extent[3])
+        if zones is not None and id_column is not None:
+            zones = zones.set_index(id_column)
+        self.dem_difference_stats = compare_dem_files(files[0],files[1],fileout=fileout,zones=zones,bounds=bounds,
+                                                      tile_size=tile_size,resampling=resampling,
+                                                      all_touched=all_touched)
+        return self.dem_difference_stats
+
+    def cache_info(self):
+        """Hit/miss counters and memory use of the DEM block cache."""
+        return self.block_cache.stats()
+    
+    def clear_cache(self):
+        self.block_cache.clear()
+        
     def save_subregion(self, output_filename):
         # Create a new geotransform where the origin is moved to the start of the subarray
         new_gt = list(self.gt)
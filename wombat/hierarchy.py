@@ -0,0 +1,978 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import networkx as nx
+import shapely
+import pyogrio
+from scipy import sparse
+from wombat.topology import Topology, TOPOLOGY_STEP
+from wombat.csr import csr_rows
+
+STORE_VERSION = 2
+NODE_COLUMNS = ['label','uri','area_sqkm','level']
+UNLABELLED = ['SA1_CODE_2021','MB_CODE_2021','DZN_CODE_2021']
+# simplification tolerances in degrees, roughly 10m, 50m, 100m, 500m and 1km
+PYRAMID_TOLERANCES = [0.0001, 0.0005, 0.001, 0.005, 0.01]
+
+def edges_to_csr(src, dst, n):
+    """Pack an edge list into CSR arrays keyed on the source node position.
+
+    Args:
+        src (numpy.ndarray): Integer positions of the edge sources.
+        dst (numpy.ndarray): Integer positions of the edge targets.
+        n (int): Number of nodes.
+
+    Returns:
+        tuple: (indptr, indices) where the targets of node i are indices[indptr[i]:indptr[i+1]].
+    """
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    order = np.lexsort((dst, src))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return indptr, dst[order].astype(np.int32)
+
+def write_wkb_blob(wkb, path):
+    """Write WKB geometries back to back into a single blob with an offset table.
+
+    Args:
+        wkb (array-like): WKB bytes per node, None for missing geometries.
+        path (str): Store directory; writes ``geometry.wkb`` and ``geometry_offsets.npy``.
+    """
+    lengths = np.array([0 if g is None else len(g) for g in wkb], dtype=np.int64)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    with open(os.path.join(path, "geometry.wkb"), "wb") as f:
+        for g in wkb:
+            if g is not None:
+                f.write(g)
+    np.save(os.path.join(path, "geometry_offsets.npy"), offsets)
+
+def open_wkb_blob(path):
+    """Memory-map a geometry blob written by write_wkb_blob.
+
+    Returns:
+        tuple: (blob, offsets) where node i's WKB is blob[offsets[i]:offsets[i+1]].
+    """
+    fblob = os.path.join(path, "geometry.wkb")
+    offsets = np.load(os.path.join(path, "geometry_offsets.npy"), mmap_mode='r')
+    if os.path.getsize(fblob) == 0:
+        return np.empty(0, dtype=np.uint8), offsets
+    return np.memmap(fblob, dtype=np.uint8, mode='r'), offsets
+
+def zoom_to_resolution(zoom):
+    """Size of a 256px web map tile pixel in degrees at a zoom level (at the equator)."""
+    return 360.0 / (256 * 2 ** zoom)
+
+def finalise_gdf(gdf, level=None, label=None):
+    """Apply the sorting and filtering used by node_to_gdf to a boundary GeoDataFrame."""
+    gdf = gdf.sort_values(['level','label'])
+    gdf = gdf[~gdf['geometry'].isna()]
+    if level is not None:
+        gdf = gdf[gdf['level'] == level]
+    if label is not None:
+        gdf = gdf[gdf['label'] == label]
+    return gdf
+
+class HierarchyStore:
+    """Columnar, on-disk representation of a GeoHierarchy.
+
+    Node attributes are held in a DataFrame indexed by node id (the ASGS code), parent to
+    child edges as CSR integer arrays over node positions and geometries as WKB. A store is
+    saved as a directory holding ``nodes.parquet``, ``edges.npz`` and a ``geometry.wkb`` blob
+    with an offset table keyed by node position. The blob is memory-mapped on load, so only
+    the geometries that are actually returned are paged in and decoded.
+    """
+    def __init__(self, nodes, child_indptr, child_indices, geometry=None, path=None):
+        self.nodes = nodes
+        self.ids = nodes.index
+        self.path = path
+        self.child_indptr = child_indptr
+        self.child_indices = child_indices
+        n = len(nodes)
+        src = np.repeat(np.arange(n), np.diff(child_indptr))
+        self.parent_indptr, self.parent_indices = edges_to_csr(child_indices, src, n)
+        self._geometry = geometry
+        self._blob = None
+        self._offsets = None
+        self._pyramids = None
+        self._pyramid_blobs = {}
+        self._topologies = {}
+        self._adjacency = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @property
+    def has_geometry(self):
+        return self._geometry is not None or self.path is not None
+
+    @classmethod
+    def from_tables(cls, nodes, edges, geometry=None):
+        """Create a store from a node table and a (parent, child) edge table.
+
+        Args:
+            nodes (pandas.DataFrame): Node attributes indexed by node id.
+            edges (pandas.DataFrame): Edge table with 'parent' and 'child' node id columns.
+            geometry (array-like, optional): WKB geometries aligned with nodes. Defaults to None.
+
+        Returns:
+            HierarchyStore: The columnar hierarchy.
+        """
+        nodes = nodes[NODE_COLUMNS].copy()
+        nodes.index.name = 'id'
+        nodes['level'] = nodes['level'].astype('category')
+        src = nodes.index.get_indexer(edges['parent'])
+        dst = nodes.index.get_indexer(edges['child'])
+        assert (src >= 0).all() and (dst >= 0).all(), print("Edges reference unknown nodes.")
+        indptr, indices = edges_to_csr(src, dst, len(nodes))
+        if geometry is not None:
+            geometry = np.asarray(geometry, dtype=object)
+        return cls(nodes, indptr, indices, geometry=geometry)
+
+    @classmethod
+    def from_graph(cls, G, geometry=True):
+        """Create a store from a GeoHierarchy networkx DiGraph.
+
+        Args:
+            G (networkx.DiGraph): The hierarchy graph.
+            geometry (bool, optional): Whether to encode the node geometries as WKB. Defaults to True.
+
+        Returns:
+            HierarchyStore: The columnar hierarchy.
+        """
+        ids = list(G.nodes)
+        data = [G.nodes[n] for n in ids]
+        nodes = pd.DataFrame({c: [d.get(c) for d in data] for c in NODE_COLUMNS},
+                             index=pd.Index(ids, dtype=object, name='id'))
+        edges = pd.DataFrame(list(G.edges), columns=['parent','child'])
+        wkb = None
+        if geometry:
+            wkb = shapely.to_wkb(np.array([d.get('geometry') for d in data], dtype=object))
+        return cls.from_tables(nodes, edges, geometry=wkb)
+
+    def save(self, path, stale_levels=None):
+        """Write the store to a directory.
+
+        Args:
+            path (str): Output directory, created if needed.
+            stale_levels (list, optional): Levels whose nodes may have changed, see clear_derived.
+                Defaults to None (all levels).
+        """
+        os.makedirs(path, exist_ok=True)
+        clear_derived(path, stale_levels)
+        table = self.nodes.copy()
+        table['level'] = table['level'].astype(str)
+        table.reset_index().to_parquet(os.path.join(path, "nodes.parquet"), index=False)
+        if self.has_geometry:
+            write_wkb_blob(self.get_wkb(np.arange(len(self))), path)
+        else:
+            write_wkb_blob([None]*len(self), path)
+        np.savez(os.path.join(path, "edges.npz"),
+                 child_indptr=self.child_indptr,
+                 child_indices=self.child_indices)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({'version': STORE_VERSION,
+                       'nodes': len(self),
+                       'edges': len(self.child_indices)}, f)
+
+    @classmethod
+    def load(cls, path):
+        """Load a store written by HierarchyStore.save. Geometries stay on disk until used.
+
+        Args:
+            path (str): Store directory.
+
+        Returns:
+            HierarchyStore: The columnar hierarchy.
+        """
+        nodes = pd.read_parquet(os.path.join(path, "nodes.parquet"))
+        nodes = nodes.set_index('id')
+        nodes.index = nodes.index.astype(object)
+        nodes['label'] = nodes['label'].astype(object).where(nodes['label'].notna(), None)
+        nodes['level'] = nodes['level'].astype('category')
+        edges = np.load(os.path.join(path, "edges.npz"))
+        return cls(nodes, edges['child_indptr'], edges['child_indices'], path=path)
+
+    def positions(self, node_ids):
+        """Convert node ids to integer positions."""
+        pos = self.ids.get_indexer(list(node_ids))
+        if (pos < 0).any():
+            raise KeyError("Unknown node ids: %s" % list(np.asarray(list(node_ids), dtype=object)[pos < 0][:5]))
+        return pos
+
+    def build_index(self, column):
+        """Group node ids by the value of a node attribute.
+
+        Args:
+            column (str): Node attribute, e.g. 'level' or 'label'.
+
+        Returns:
+            dict: Attribute value -> list of node ids, as produced by build_index for graphs.
+        """
+        codes, uniques = pd.factorize(self.nodes[column].to_numpy(dtype=object), use_na_sentinel=False)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(uniques)))])
+        ids = self.ids.to_numpy()[order]
+        index = {}
+        for k, value in enumerate(uniques):
+            key = None if pd.isna(value) else value
+            index[key] = ids[bounds[k]:bounds[k+1]].tolist()
+        return index
+
+    @property
+    def level_codes(self):
+        """Integer level code per node position."""
+        return self.nodes['level'].cat.codes.to_numpy()
+
+    def level_code(self, level):
+        """Integer code of a level name, -1 if the level is not in the store."""
+        categories = self.nodes['level'].cat.categories
+        return categories.get_loc(level) if level in categories else -1
+
+    def level_positions(self, level):
+        """Return the positions of all nodes at a level, in store order."""
+        code = self.level_code(level)
+        if code < 0:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.level_codes == code)
+
+    def get_wkb(self, pos):
+        """Return the WKB geometries of the given node positions, reading only their byte ranges."""
+        pos = np.asarray(pos, dtype=np.int64)
+        if self._geometry is not None:
+            return self._geometry[pos]
+        if self._blob is None:
+            if self.path is None:
+                raise ValueError("geometry not available - run build() to create the columnar store")
+            self._blob, self._offsets = open_wkb_blob(self.path)
+        starts = self._offsets[pos]
+        ends = self._offsets[pos + 1]
+        wkb = np.empty(len(pos), dtype=object)
+        for i, (start, end) in enumerate(zip(starts, ends)):
+            if end > start:
+                wkb[i] = self._blob[start:end].tobytes()
+        return wkb
+
+    @property
+    def pyramids(self):
+        """Precomputed simplification tolerances per level, as {level: [tolerance, ...]}."""
+        if self._pyramids is None:
+            findex = os.path.join(self.path, "pyramid", "index.json") if self.path is not None else None
+            self._pyramids = {}
+            if findex is not None and os.path.exists(findex):
+                with open(findex) as f:
+                    self._pyramids = json.load(f)
+        return self._pyramids
+
+    def pyramid_path(self, level, tolerance):
+        return os.path.join(self.path, "pyramid", "%s_%g" % (level, tolerance))
+
+    def build_pyramid(self, level, tolerances=PYRAMID_TOLERANCES):
+        """Precompute simplified geometries of one level at several tolerances.
+
+        Each polygon is simplified with shapely's topology-preserving simplification and the
+        results are written as WKB blobs next to the full-resolution geometry.
+
+        Args:
+            level (str): Level to simplify, e.g. 'SA1'.
+            tolerances (list, optional): Tolerances in degrees. Defaults to PYRAMID_TOLERANCES.
+        """
+        assert self.path is not None, print("Save the hierarchy as a columnar store first.")
+        geoms = self.get_geometry(self.level_positions(level))
+        for tolerance in tolerances:
+            fpath = self.pyramid_path(level, tolerance)
+            os.makedirs(fpath, exist_ok=True)
+            simplified = shapely.simplify(geoms, tolerance, preserve_topology=True)
+            write_wkb_blob(shapely.to_wkb(simplified), fpath)
+            self._pyramid_blobs.pop((level, tolerance), None)
+        self.pyramids[level] = sorted(set(self.pyramids.get(level, [])) | set(tolerances))
+        with open(os.path.join(self.path, "pyramid", "index.json"), "w") as f:
+            json.dump(self.pyramids, f)
+
+    def pick_tolerance(self, level, resolution):
+        """Coarsest precomputed tolerance of a level that does not exceed resolution, or None."""
+        if resolution is None:
+            return None
+        available = [t for t in self.pyramids.get(level, []) if t <= resolution]
+        return max(available) if available else None
+
+    def topology_path(self, level):
+        return os.path.join(self.path, "topology", "%s.npz" % level)
+
+    def build_topology(self, level, step=TOPOLOGY_STEP):
+        """Encode the polygons of one level as shared, quantised arcs, see wombat.topology.
+
+        Args:
+            level (str): Level to encode, e.g. 'SA1'.
+            step (float, optional): Quantisation grid in degrees. Defaults to TOPOLOGY_STEP.
+
+        Returns:
+            Topology: The encoded level, also written under ``<store>/topology``.
+        """
+        assert self.path is not None, print("Save the hierarchy as a columnar store first.")
+        pos = self.level_positions(level)
+        topo = Topology.from_geometries(self.get_geometry(pos), ids=self.ids[pos], step=step)
+        os.makedirs(os.path.join(self.path, "topology"), exist_ok=True)
+        topo.save(self.topology_path(level))
+        self._topologies[level] = topo
+        return topo
+
+    def topology(self, level):
+        """Topology of a level if one was built, else None."""
+        if level not in self._topologies:
+            fpath = self.topology_path(level) if self.path is not None else None
+            self._topologies[level] = Topology.load(fpath) if fpath is not None and os.path.exists(fpath) else None
+        return self._topologies[level]
+
+    def get_topology_geometry(self, pos, resolution=None):
+        """Decode geometries from the level topologies, simplifying shared arcs seam-free.
+
+        Levels without a topology fall back to get_geometry. The arcs are simplified at the
+        coarsest of PYRAMID_TOLERANCES within resolution.
+        """
+        pos = np.asarray(pos, dtype=np.int64)
+        out = np.empty(len(pos), dtype=object)
+        codes = self.level_codes[pos]
+        categories = self.nodes['level'].cat.categories
+        for code in np.unique(codes):
+            sel = np.flatnonzero(codes == code)
+            topo = self.topology(categories[code])
+            if topo is None:
+                out[sel] = self.get_geometry(pos[sel], resolution=resolution)
+                continue
+            tolerances = [t for t in PYRAMID_TOLERANCES if resolution is not None and t <= resolution]
+            if tolerances:
+                topo = topo.simplify(max(tolerances))
+            out[sel] = topo.geometries(np.searchsorted(self.level_positions(categories[code]), pos[sel]))
+        return out
+
+    def adjacency_path(self, level, contiguity):
+        return os.path.join(self.path, "adjacency", "%s_%s.npz" % (level, contiguity))
+
+    def build_adjacency(self, level, contiguity='queen'):
+        """Compute the contiguity graph of one level with an STRtree.
+
+        Queen neighbours share at least one boundary point; rook neighbours share a boundary
+        segment of non-zero length. Candidate pairs come from a single bulk tree query and the
+        rook test is a vectorised DE-9IM pattern match on the candidates.
+
+        Args:
+            level (str): Level, e.g. 'SA2'.
+            contiguity (str, optional): 'queen' or 'rook'. Defaults to 'queen'.
+
+        Returns:
+            tuple: (indptr, indices) CSR arrays over the positions within level_positions(level).
+        """
+        assert contiguity in ['queen','rook'], print("Please use 'queen' or 'rook'.")
+        geoms = self.get_geometry(self.level_positions(level))
+        tree = shapely.STRtree(geoms)
+        src, dst = tree.query(geoms, predicate='intersects')
+        keep = src != dst
+        src, dst = src[keep], dst[keep]
+        if contiguity == 'rook':
+            shared_edge = shapely.relate_pattern(geoms[src], geoms[dst], '****1****')
+            src, dst = src[shared_edge], dst[shared_edge]
+        indptr, indices = edges_to_csr(src, dst, len(geoms))
+        if self.path is not None:
+            os.makedirs(os.path.join(self.path, "adjacency"), exist_ok=True)
+            np.savez(self.adjacency_path(level, contiguity), indptr=indptr, indices=indices)
+        self._adjacency[(level, contiguity)] = (indptr, indices)
+        return indptr, indices
+
+    def adjacency(self, level, contiguity='queen'):
+        """Contiguity CSR arrays of a level, loaded from the store or computed on first use."""
+        key = (level, contiguity)
+        if key not in self._adjacency:
+            fpath = self.adjacency_path(level, contiguity) if self.path is not None else None
+            if fpath is not None and os.path.exists(fpath):
+                with np.load(fpath) as f:
+                    self._adjacency[key] = (f['indptr'], f['indices'])
+            else:
+                self.build_adjacency(level, contiguity)
+        return self._adjacency[key]
+
+    def get_geometry(self, pos, resolution=None):
+        """Decode the geometries of the given node positions.
+
+        Args:
+            pos (array-like): Node positions.
+            resolution (float, optional): Acceptable simplification in degrees. Levels with a
+                precomputed pyramid return the coarsest version within it; everything else is
+                returned at full resolution. Defaults to None (full resolution).
+
+        Returns:
+            numpy.ndarray: Shapely geometries.
+        """
+        pos = np.asarray(pos, dtype=np.int64)
+        if resolution is None or not self.pyramids:
+            return shapely.from_wkb(self.get_wkb(pos))
+        wkb = np.empty(len(pos), dtype=object)
+        codes = self.level_codes[pos]
+        categories = self.nodes['level'].cat.categories
+        for code in np.unique(codes):
+            sel = np.flatnonzero(codes == code)
+            level = categories[code]
+            tolerance = self.pick_tolerance(level, resolution)
+            if tolerance is None:
+                wkb[sel] = self.get_wkb(pos[sel])
+                continue
+            if (level, tolerance) not in self._pyramid_blobs:
+                self._pyramid_blobs[(level, tolerance)] = open_wkb_blob(self.pyramid_path(level, tolerance))
+            blob, offsets = self._pyramid_blobs[(level, tolerance)]
+            idx = np.searchsorted(self.level_positions(level), pos[sel])
+            for i, k in zip(sel, idx):
+                if offsets[k+1] > offsets[k]:
+                    wkb[i] = blob[offsets[k]:offsets[k+1]].tobytes()
+        return shapely.from_wkb(wkb)
+
+    def to_gdf(self, node_ids, level=None, label=None, resolution=None, topology=False):
+        """Build a GeoDataFrame for the given nodes, decoding only their geometries.
+
+        Args:
+            node_ids (list): Node ids to return.
+            level (str, optional): Keep only nodes at this level. Defaults to None.
+            label (str, optional): Keep only nodes with this label. Defaults to None.
+            resolution (float, optional): Acceptable simplification in degrees, see get_geometry.
+                Defaults to None (full resolution).
+            topology (bool, optional): Reassemble the polygons from the level topologies, see
+                get_topology_geometry. Defaults to False.
+
+        Returns:
+            GeoDataFrame: One row per node, indexed by node id.
+        """
+        node_ids = list(node_ids)
+        pos = self.positions(node_ids)
+        attrs = self.nodes.iloc[pos]
+        geometry = self.get_topology_geometry(pos, resolution) if topology else self.get_geometry(pos, resolution=resolution)
+        gdf = gpd.GeoDataFrame({'label': attrs['label'].to_numpy(dtype=object),
+                                'uri': attrs['uri'].to_numpy(dtype=object),
+                                'geometry': geometry,
+                                'area_sqkm': attrs['area_sqkm'].to_numpy(),
+                                'level': attrs['level'].to_numpy(dtype=object)},
+                               index=node_ids, crs="EPSG:4326")
+        return finalise_gdf(gdf, level=level, label=label)
+
+    def to_networkx(self, geometry=False):
+        """Materialise the hierarchy as a networkx DiGraph.
+
+        Args:
+            geometry (bool, optional): Attach decoded geometries to the nodes. Defaults to False.
+
+        Returns:
+            networkx.DiGraph: The hierarchy graph.
+        """
+        G = nx.DiGraph()
+        ids = self.ids.to_numpy()
+        records = self.nodes.astype({'level': object}).to_dict('records')
+        if geometry:
+            for rec, geom in zip(records, self.get_geometry(np.arange(len(self)))):
+                rec['geometry'] = geom
+        G.add_nodes_from(zip(ids, records))
+        src = np.repeat(np.arange(len(self)), np.diff(self.child_indptr))
+        G.add_edges_from(zip(ids[src], ids[self.child_indices]))
+        return G
+
+class AncestorIndex:
+    """Precomputed ancestor closure of a hierarchy DAG.
+
+    The ASGS hierarchy is a DAG rather than a tree (an SA4 sits under both its STATE and
+    its GCCSA), so pre/post-order intervals would miss descendants reached through a second
+    parent. Instead the closure is held as a sparse boolean matrix with one row of
+    (strict) ancestors per node, plus its transpose for descendants. Rows are at most as
+    long as the hierarchy is deep, so membership tests are a binary search over a handful
+    of integers and descendant queries are a single CSR gather.
+    """
+    def __init__(self, parent_indptr, parent_indices):
+        n = len(parent_indptr) - 1
+        parents = sparse.csr_matrix((np.ones(len(parent_indices), dtype=np.int32),
+                                     parent_indices, parent_indptr), shape=(n, n))
+        closure = parents.copy()
+        frontier = parents
+        for _ in range(n):
+            frontier = frontier @ parents
+            if frontier.nnz == 0:
+                break
+            frontier.data[:] = 1
+            closure = closure + frontier
+            closure.data[:] = 1
+        else:
+            raise ValueError("Hierarchy contains a cycle.")
+        self.ancestors = closure.astype(bool).tocsr()
+        self.ancestors.sort_indices()
+        self.descendants = self.ancestors.T.tocsr()
+        self.descendants.sort_indices()
+
+    def __len__(self):
+        return self.ancestors.shape[0]
+
+    def is_ancestor(self, ancestor, node):
+        """Check whether ancestor lies on any path from the root down to node.
+
+        Args:
+            ancestor (int): Position of the candidate ancestor.
+            node (int): Position of the node.
+
+        Returns:
+            bool: True if ancestor is a strict ancestor of node.
+        """
+        row = self.ancestors.indices[self.ancestors.indptr[node]:self.ancestors.indptr[node+1]]
+        i = np.searchsorted(row, ancestor)
+        return bool(i < len(row) and row[i] == ancestor)
+
+    def ancestors_of(self, positions):
+        """Return the sorted, unique positions of all ancestors of the given nodes."""
+        return np.unique(csr_rows(self.ancestors.indptr, self.ancestors.indices, positions))
+
+    def descendant_mask(self, positions):
+        """Boolean mask over all nodes marking the descendants of any of the given nodes."""
+        mask = np.zeros(len(self), dtype=bool)
+        mask[csr_rows(self.descendants.indptr, self.descendants.indices, positions)] = True
+        return mask
+
+    def descendants_of(self, positions, candidates=None):
+        """Return the positions of the descendants of any of the given nodes.
+
+        Args:
+            positions (array-like): Positions of the ancestor nodes.
+            candidates (numpy.ndarray, optional): Restrict the result to these positions, e.g. one
+                level of the hierarchy. Defaults to None.
+
+        Returns:
+            numpy.ndarray: Sorted descendant positions.
+        """
+        mask = self.descendant_mask(positions)
+        if candidates is None:
+            return np.flatnonzero(mask)
+        return candidates[mask[candidates]]
+
+    def membership(self, from_positions, to_positions):
+        """Sparse membership matrix between two sets of nodes, e.g. two levels.
+
+        Args:
+            from_positions (numpy.ndarray): Positions of the member nodes (columns).
+            to_positions (numpy.ndarray): Positions of the candidate ancestors (rows).
+
+        Returns:
+            scipy.sparse.csr_matrix: float64 matrix of shape (len(to_positions), len(from_positions))
+                with a 1 where the row node is an ancestor of the column node.
+        """
+        sub = self.ancestors[np.asarray(from_positions)][:, np.asarray(to_positions)]
+        return sub.T.astype(np.float64).tocsr()
+
+class LabelIndex:
+    """Inverted index over node labels for exact, prefix and substring lookups.
+
+    Distinct labels are indexed once: a sorted array of lower-cased labels answers prefix
+    queries with a binary search, and an n-gram posting list narrows substring queries to
+    the few labels sharing every n-gram of the query before the final substring check.
+    Matching labels are mapped back to node positions through a CSR posting table.
+    """
+    def __init__(self, labels, ngram=3):
+        self.ngram = ngram
+        codes, uniques = pd.factorize(np.asarray(labels, dtype=object))
+        self.labels = np.asarray(uniques, dtype=object)
+        self.lower = np.array([l.lower() for l in self.labels], dtype=object)
+        self.lookup = {l: k for k, l in enumerate(self.labels)}
+
+        # label -> node positions
+        positions = np.flatnonzero(codes >= 0)
+        self.label_indptr, self.label_positions = edges_to_csr(codes[positions], positions, len(self.labels))
+
+        # sorted lower-cased labels for prefix search
+        self.sorted_ids = np.argsort(self.lower.astype(str), kind='stable')
+        self.sorted_lower = self.lower[self.sorted_ids].astype(str)
+
+        # n-gram -> label ids
+        grams = {}
+        for k, l in enumerate(self.lower):
+            for g in {l[i:i+ngram] for i in range(len(l) - ngram + 1)}:
+                grams.setdefault(g, []).append(k)
+        self.grams = {g: np.array(v, dtype=np.int32) for g, v in grams.items()}
+
+    def __len__(self):
+        return len(self.labels)
+
+    def match_labels(self, text, mode='substring', case=True):
+        """Find the distinct labels matching a query.
+
+        Args:
+            text (str): Query string.
+            mode (str, optional): 'exact', 'prefix' or 'substring'. Defaults to 'substring'.
+            case (bool, optional): Case-sensitive matching. Defaults to True.
+
+        Returns:
+            numpy.ndarray: Ids of the matching labels (positions in self.labels).
+        """
+        assert mode in ['exact','prefix','substring'], print("Please use 'exact', 'prefix' or 'substring'.")
+        query = text.lower()
+        if mode == 'exact' and case:
+            k = self.lookup.get(text)
+            return np.array([] if k is None else [k], dtype=np.int64)
+        if mode in ['exact','prefix']:
+            lo = np.searchsorted(self.sorted_lower, query, side='left')
+            hi = np.searchsorted(self.sorted_lower, query + '\U0010ffff' if mode == 'prefix' else query, side='right')
+            ids = self.sorted_ids[lo:hi]
+            if case and mode == 'prefix':
+                ids = ids[[self.labels[k].startswith(text) for k in ids]]
+            return np.sort(ids)
+        if len(query) >= self.ngram:
+            grams = sorted({query[i:i+self.ngram] for i in range(len(query) - self.ngram + 1)},
+                           key=lambda g: len(self.grams.get(g, ())))
+            candidates = self.grams.get(grams[0], np.empty(0, dtype=np.int32))
+            for g in grams[1:]:
+                if len(candidates) == 0:
+                    break
+                candidates = np.intersect1d(candidates, self.grams.get(g, np.empty(0, dtype=np.int32)), assume_unique=True)
+        else:
+            candidates = np.arange(len(self.labels))
+        if case:
+            keep = [text in self.labels[k] for k in candidates]
+        else:
+            keep = [query in self.lower[k] for k in candidates]
+        return np.asarray(candidates, dtype=np.int64)[np.asarray(keep, dtype=bool)]
+
+    def search(self, text, mode='substring', case=True):
+        """Find the positions of all nodes whose label matches a query.
+
+        Args:
+            text (str): Query string, e.g. "Brisbane".
+            mode (str, optional): 'exact', 'prefix' or 'substring'. Defaults to 'substring'.
+            case (bool, optional): Case-sensitive matching. Defaults to True.
+
+        Returns:
+            numpy.ndarray: Sorted node positions.
+        """
+        ids = self.match_labels(text, mode=mode, case=case)
+        return np.sort(csr_rows(self.label_indptr, self.label_positions, ids))
+
+def layer_columns(specs):
+    """Attribute columns each layer has to supply for a list of layer specs.
+
+    Args:
+        specs (list): (filename, spec) tuples where spec has 'layer', 'node_col' and 'parent_col'.
+
+    Returns:
+        dict: (filename, layer) -> sorted list of column names.
+    """
+    columns = {}
+    for fpath, spec in specs:
+        cols = columns.setdefault((fpath, spec['layer']), {'AUS_CODE_2021','AREA_ALBERS_SQKM','ASGS_LOCI_URI_2021'})
+        cols.add(spec['node_col'])
+        if spec['parent_col'] is not None:
+            cols.add(spec['parent_col'])
+        if spec['node_col'] not in UNLABELLED:
+            cols.add(spec['node_col'].replace("CODE","NAME"))
+    return {k: sorted(v) for k, v in columns.items()}
+
+def read_layer_table(fpath, layer, columns):
+    """Read one GeoPackage layer through pyogrio's Arrow reader, with geometry as WKB.
+
+    Intended to run in a worker process: WKB bytes pickle far more cheaply than shapely objects.
+
+    Args:
+        fpath (str): GeoPackage filename.
+        layer (str): Layer name.
+        columns (list): Attribute columns to read.
+
+    Returns:
+        tuple: (DataFrame, seconds taken).
+    """
+    t0 = time.time()
+    gdf = pyogrio.read_dataframe(fpath, layer=layer, columns=columns, use_arrow=True)
+    df = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+    df['geometry'] = shapely.to_wkb(np.asarray(gdf.geometry.values))
+    return df, time.time() - t0
+
+def spec_tables(df, spec):
+    """Vectorised equivalent of construct_hierarchy_for_file for one layer spec.
+
+    Each row contributes its parent node (created with the row's attributes if not already
+    present, as the graph builder does) followed by its own node, so keeping the first
+    occurrence of every node id across all specs reproduces the graph's node attributes.
+
+    Args:
+        df (pandas.DataFrame): Layer table from read_layer_table.
+        spec (dict): Layer spec with 'layer', 'node_col' and 'parent_col'.
+
+    Returns:
+        tuple: (nodes, edges) DataFrames.
+    """
+    node_col = spec['node_col']
+    parent_col = spec['parent_col']
+    df = df[df['AUS_CODE_2021'] != "ZZZ"]
+    label = None if node_col in UNLABELLED else df[node_col.replace("CODE","NAME")].to_numpy(dtype=object)
+    nodes = pd.DataFrame({'id': df[node_col].to_numpy(dtype=object),
+                          'label': label,
+                          'uri': df['ASGS_LOCI_URI_2021'].to_numpy(dtype=object),
+                          'area_sqkm': df['AREA_ALBERS_SQKM'].to_numpy(dtype=float),
+                          'level': node_col.split("_")[0],
+                          'geometry': df['geometry'].to_numpy(dtype=object)})
+    if parent_col is None:
+        return nodes, pd.DataFrame({'parent': [], 'child': []}, dtype=object)
+    parents = nodes.copy()
+    parents['id'] = df[parent_col].to_numpy(dtype=object)
+    parents['level'] = parent_col.split("_")[0]
+    order = np.argsort(np.concatenate([2*np.arange(len(df)), 2*np.arange(len(df)) + 1]), kind='stable')
+    nodes = pd.concat([parents, nodes], ignore_index=True).iloc[order]
+    edges = pd.DataFrame({'parent': parents['id'].to_numpy(), 'child': df[node_col].to_numpy(dtype=object)})
+    return nodes, edges
+
+def assemble_hierarchy(tables):
+    """Splice per-spec node and edge tables into a HierarchyStore.
+
+    Args:
+        tables (list): (nodes, edges) tuples from spec_tables, in build order.
+
+    Returns:
+        HierarchyStore: The assembled hierarchy.
+    """
+    nodes = pd.concat([t[0] for t in tables], ignore_index=True)
+    nodes = nodes.drop_duplicates('id', keep='first').set_index('id')
+    edges = pd.concat([t[1] for t in tables], ignore_index=True).drop_duplicates()
+    return HierarchyStore.from_tables(nodes, edges, geometry=nodes['geometry'].to_numpy(dtype=object))
+
+def clear_derived(path, levels=None):
+    """Delete the pyramids, topologies and adjacency of some levels of a saved store.
+
+    These files are indexed by position within their level, so they only go stale when the
+    nodes of that level change.
+
+    Args:
+        path (str): Store directory.
+        levels (list, optional): Levels to clear. Defaults to None (everything).
+    """
+    if levels is None:
+        for derived in ["pyramid", "topology", "adjacency"]:
+            shutil.rmtree(os.path.join(path, derived), ignore_errors=True)
+        return
+    levels = set(levels)
+    for derived in ["pyramid", "topology", "adjacency"]:
+        folder = os.path.join(path, derived)
+        if not os.path.isdir(folder):
+            continue
+        # entries are named <level>.npz or <level>_<tolerance|contiguity>
+        for name in os.listdir(folder):
+            if os.path.splitext(name)[0].split("_")[0] in levels:
+                fpath = os.path.join(folder, name)
+                if os.path.isdir(fpath):
+                    shutil.rmtree(fpath)
+                else:
+                    os.remove(fpath)
+    findex = os.path.join(path, "pyramid", "index.json")
+    if os.path.exists(findex):
+        with open(findex) as f:
+            index = json.load(f)
+        with open(findex, "w") as f:
+            json.dump({level: t for level, t in index.items() if level not in levels}, f)
+
+def fingerprint_layer(fpath, layer, method='metadata'):
+    """Fingerprint a GeoPackage layer so unchanged layers can be skipped on rebuild.
+
+    Args:
+        fpath (str): GeoPackage filename.
+        layer (str): Layer (table) name.
+        method (str, optional): 'metadata' hashes the layer's gpkg_contents entry (last change
+            timestamp and extent) and row count, which is cheap; 'content' hashes every row of
+            the table. Defaults to 'metadata'.
+
+    Returns:
+        str: Hex digest.
+    """
+    assert method in ['metadata','content'], print("Please use 'metadata' or 'content'.")
+    h = hashlib.sha1(layer.encode())
+    con = sqlite3.connect(f"file:{fpath}?mode=ro", uri=True)
+    try:
+        if method == 'metadata':
+            contents = con.execute("SELECT last_change, min_x, min_y, max_x, max_y FROM gpkg_contents WHERE table_name=?",
+                                   (layer,)).fetchone()
+            count = con.execute(f'SELECT COUNT(*) FROM "{layer}"').fetchone()
+            h.update(repr((contents, count)).encode())
+        else:
+            for row in con.execute(f'SELECT * FROM "{layer}" ORDER BY rowid'):
+                for value in row:
+                    h.update(value if isinstance(value, bytes) else repr(value).encode())
+    finally:
+        con.close()
+    return h.hexdigest()
+
+def build_hierarchy_store(specs, fileout, workers=None, incremental=True, fingerprint='metadata'):
+    """Build and save a HierarchyStore straight from GeoPackage layers.
+
+    Every distinct layer is read once, in parallel across processes, and the node and
+    edge tables are assembled with columnar operations. Each layer table is also kept as a
+    sub-artefact under ``<fileout>/layers`` together with a fingerprint of its source, so an
+    incremental rebuild only re-reads the layers that changed (e.g. a new LGA release) and
+    splices them back in with the cached tables of every other layer.
+
+    Args:
+        specs (list): (filename, spec) tuples in build order; see ASGS_LAYERS in wombat.boundary.
+        fileout (str): Store directory to write.
+        workers (int, optional): Number of reader processes. Defaults to the CPU count.
+        incremental (bool, optional): Reuse cached layer tables whose fingerprint is unchanged. Defaults to True.
+        fingerprint (str, optional): Fingerprint method, see fingerprint_layer. Defaults to 'metadata'.
+
+    Returns:
+        dict: Timings in seconds, keyed by layer name plus 'assemble' and 'save'.
+    """
+    timings = {}
+    frames = {}
+    layers_dir = os.path.join(fileout, "layers")
+    fmanifest = os.path.join(layers_dir, "manifest.json")
+    os.makedirs(layers_dir, exist_ok=True)
+    manifest = {}
+    if incremental and os.path.exists(fmanifest):
+        with open(fmanifest) as f:
+            manifest = json.load(f)
+
+    t0 = time.time()
+    columns = layer_columns(specs)
+    entries = {(fpath, layer): {'file': os.path.basename(fpath),
+                                'fingerprint': fingerprint_layer(fpath, layer, fingerprint),
+                                'columns': cols}
+               for (fpath, layer), cols in columns.items()}
+    stale, reused = [], []
+    for (fpath, layer), entry in entries.items():
+        fcache = os.path.join(layers_dir, layer + ".parquet")
+        if manifest.get(layer) == entry and os.path.exists(fcache):
+            reused.append((fpath, layer))
+        else:
+            stale.append((fpath, layer))
+    print(f"Checked {len(entries)} layers in {time.time()-t0:.1f}s, {len(stale)} to read")
+    if not stale and os.path.exists(os.path.join(fileout, "nodes.parquet")):
+        print(f"Store {fileout} is up to date")
+        return timings
+    for fpath, layer in reused:
+        frames[(fpath, layer)] = pd.read_parquet(os.path.join(layers_dir, layer + ".parquet"))
+        print(f"Reused {layer}: unchanged")
+    # derived files are per level, so only the levels a changed layer adds nodes to go stale
+    stale_levels = None
+    if manifest:
+        stale_levels = sorted({col.split("_")[0] for fpath, spec in specs if (fpath, spec['layer']) in stale
+                               for col in [spec['node_col'], spec['parent_col']] if col is not None})
+
+    t0 = time.time()
+    if stale:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(read_layer_table, fpath, layer, columns[(fpath, layer)]): (fpath, layer)
+                       for fpath, layer in stale}
+            for future in as_completed(futures):
+                key = futures[future]
+                frames[key], timings[key[1]] = future.result()
+                print(f"Read {key[1]}: {len(frames[key])} rows in {timings[key[1]]:.1f}s")
+                frames[key].to_parquet(os.path.join(layers_dir, key[1] + ".parquet"), index=False)
+                manifest[key[1]] = entries[key]
+                with open(fmanifest, "w") as f:
+                    json.dump(manifest, f, indent=1)
+        print(f"Read {len(stale)} layers in {time.time()-t0:.1f}s")
+
+    t0 = time.time()
+    tables = [spec_tables(frames[(fpath, spec['layer'])], spec) for fpath, spec in specs]
+    store = assemble_hierarchy(tables)
+    timings['assemble'] = time.time() - t0
+    print(f"Assembled {len(store)} nodes, {len(store.child_indices)} edges in {timings['assemble']:.1f}s")
+
+    t0 = time.time()
+    store.save(fileout, stale_levels=stale_levels)
+    timings['save'] = time.time() - t0
+    print(f"Saved {fileout} in {timings['save']:.1f}s")
+    return timings
+
+def file_signature(fpath, validate='mtime'):
+    """Cheap identity of a file used to validate cached metadata about it.
+
+    Args:
+        fpath (str): Filename.
+        validate (str, optional): 'mtime' uses the size and modification time, 'hash' the
+            SHA-1 of the file contents. Defaults to 'mtime'.
+
+    Returns:
+        list: JSON serialisable signature.
+    """
+    assert validate in ['mtime','hash'], print("Please use 'mtime' or 'hash'.")
+    stat = os.stat(fpath)
+    if validate == 'mtime':
+        return [stat.st_size, stat.st_mtime_ns]
+    h = hashlib.sha1()
+    with open(fpath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 24), b''):
+            h.update(chunk)
+    return [stat.st_size, h.hexdigest()]
+
+def scan_gpkg_layers(fpath):
+    """List the layers of a GeoPackage with their row counts and bounds.
+
+    The GeoPackage tables are read directly with sqlite3, which avoids opening the file
+    through GDAL. Row counts come from gpkg_ogr_contents when OGR maintains it.
+
+    Args:
+        fpath (str): GeoPackage filename.
+
+    Returns:
+        dict: Layer name -> {'rows', 'bounds', 'data_type'}, where bounds is
+            [min_x, min_y, max_x, max_y] or None.
+    """
+    con = sqlite3.connect(f"file:{fpath}?mode=ro", uri=True)
+    try:
+        tables = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        counts = {}
+        if 'gpkg_ogr_contents' in tables:
+            counts = dict(con.execute("SELECT table_name, feature_count FROM gpkg_ogr_contents"))
+        layers = {}
+        for name, data_type, minx, miny, maxx, maxy in con.execute(
+                "SELECT table_name, data_type, min_x, min_y, max_x, max_y FROM gpkg_contents ORDER BY rowid"):
+            rows = counts.get(name)
+            if rows is None:
+                rows = con.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+            bounds = None if minx is None else [minx, miny, maxx, maxy]
+            layers[name] = {'rows': int(rows), 'bounds': bounds, 'data_type': data_type}
+    finally:
+        con.close()
+    return layers
+
+def load_layer_manifest(fpaths, manifest_path, validate='mtime'):
+    """Load the persisted manifest of GeoPackage layers, rescanning only changed files.
+
+    Args:
+        fpaths (list): GeoPackage filenames to describe.
+        manifest_path (str): JSON file holding the manifest. It is rewritten when any
+            entry was added, refreshed or dropped.
+        validate (str, optional): How cached entries are validated, see file_signature. Defaults to 'mtime'.
+
+    Returns:
+        dict: Filename -> {'signature', 'layers'} where layers is as in scan_gpkg_layers.
+    """
+    cached = {}
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = {}
+    if cached.get('validate') != validate:
+        cached = {}
+    cached = cached.get('files', {})
+
+    manifest = {}
+    for fpath in fpaths:
+        key = os.path.abspath(fpath)
+        signature = file_signature(fpath, validate)
+        entry = cached.get(key)
+        if entry is None or entry['signature'] != signature:
+            entry = {'signature': signature, 'layers': scan_gpkg_layers(fpath)}
+        manifest[key] = entry
+
+    if manifest != cached:
+        try:
+            with open(manifest_path, 'w') as f:
+                json.dump({'validate': validate, 'files': manifest}, f, indent=1)
+        except OSError:
+            pass
+    return manifest
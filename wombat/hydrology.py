@@ -0,0 +1,588 @@
+import os
+import math
+import heapq
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from osgeo import gdal
+from wombat.cache import LRUCache
+from wombat.raster import RasterBlocks
+from wombat.csr import expand_ranges
+
+# (row, col) offsets of the 8 neighbours, indexed by D8 direction code
+D8_OFFSETS = [(-1,-1),(-1,0),(-1,1),(0,-1),(0,1),(1,-1),(1,0),(1,1)]
+
+# Tarboton's 8 triangular facets as (cardinal, diagonal) neighbour offsets
+DINF_FACETS = [((0,1),(-1,1)), ((-1,0),(-1,1)), ((-1,0),(-1,-1)), ((0,-1),(-1,-1)),
+               ((0,-1),(1,-1)), ((1,0),(1,-1)), ((1,0),(1,1)), ((0,1),(1,1))]
+
+def _padded(dem):
+    """Flattened copy of dem with a NaN border, and the flat offsets of the 8 neighbours."""
+    z = np.pad(np.asarray(dem, dtype=np.float64), 1, constant_values=np.nan)
+    width = z.shape[1]
+    return z, [dy*width + dx for dy, dx in D8_OFFSETS]
+
+def _edge_seeds(z):
+    """Valid cells of a NaN padded grid that touch nodata (including the grid border)."""
+    valid = np.isfinite(z)
+    touches = np.zeros_like(valid)
+    for dy, dx in D8_OFFSETS:
+        touches[1:-1,1:-1] |= ~valid[1+dy:z.shape[0]-1+dy, 1+dx:z.shape[1]-1+dx]
+    return valid & touches
+
+def priority_flood(dem, seeds=None, epsilon=True):
+    """Fill depressions with the priority-flood algorithm (Barnes et al. 2014).
+
+    Cells are visited from the seeds in order of their (filled) elevation with a heap, so
+    each cell is raised to the lowest level at which water can leave it towards a seed,
+    in O(n log n). Cells raised into a depression go to a plain FIFO queue rather than
+    the heap, which keeps the cost of flat and filled areas linear.
+
+    Args:
+        dem (numpy.ndarray): Elevations, NaN for nodata.
+        seeds (numpy.ndarray, optional): Boolean mask of outlet cells. Defaults to the cells
+            on the grid border or next to nodata.
+        epsilon (bool, optional): Raise filled cells by the smallest representable increment
+            over the cell they are reached from, so that flats drain. Defaults to True.
+
+    Returns:
+        numpy.ndarray: Filled float64 elevations (NaN where dem is NaN or where no seed is reachable).
+    """
+    z, offsets = _padded(dem)
+    if seeds is None:
+        seeds = _edge_seeds(z)
+    else:
+        seeds = np.pad(np.asarray(seeds, dtype=bool), 1) & np.isfinite(z)
+    out = z.ravel().tolist()
+    closed = bytearray((~np.isfinite(z)).ravel().astype(np.uint8).tobytes())
+    heap = []
+    for c in np.flatnonzero(seeds.ravel()).tolist():
+        closed[c] = 1
+        heap.append((out[c], c))
+    heapq.heapify(heap)
+    pit = deque()
+    while heap or pit:
+        if pit:
+            c = pit.popleft()
+            zc = out[c]
+        else:
+            zc, c = heapq.heappop(heap)
+        for off in offsets:
+            n = c + off
+            if closed[n]:
+                continue
+            closed[n] = 1
+            if out[n] <= zc:
+                out[n] = math.nextafter(zc, math.inf) if epsilon else zc
+                pit.append(n)
+            else:
+                heapq.heappush(heap, (out[n], n))
+    out = np.array(out).reshape(z.shape)
+    out[np.frombuffer(bytes(closed), dtype=np.uint8).reshape(z.shape) == 0] = np.nan
+    return out[1:-1,1:-1]
+
+def d8_flow_direction(filled, pixel_size=(1.0, 1.0)):
+    """Steepest descent (D8) flow direction.
+
+    Args:
+        filled (numpy.ndarray): Depression filled elevations, NaN for nodata.
+        pixel_size (tuple, optional): (x, y) pixel size in metres. Defaults to (1, 1).
+
+    Returns:
+        numpy.ndarray: int8 index into D8_OFFSETS, -1 for cells without a lower neighbour
+            (outlets, pits and nodata).
+    """
+    px, py = pixel_size
+    z = np.pad(np.asarray(filled, dtype=np.float64), 1, constant_values=np.nan)
+    nrows, ncols = filled.shape
+    best = np.zeros(filled.shape)
+    direction = np.full(filled.shape, -1, dtype=np.int8)
+    for k, (dy, dx) in enumerate(D8_OFFSETS):
+        drop = (filled - z[1+dy:1+dy+nrows, 1+dx:1+dx+ncols]) / math.hypot(dy*py, dx*px)
+        steeper = drop > best
+        best[steeper] = drop[steeper]
+        direction[steeper] = k
+    return direction
+
+def d8_receivers(direction):
+    """Flat (source, receiver) cell indices of the D8 flow graph."""
+    ncols = direction.shape[1]
+    flat = direction.ravel()
+    src = np.flatnonzero(flat >= 0)
+    offsets = np.array([dy*ncols + dx for dy, dx in D8_OFFSETS])
+    return src, src + offsets[flat[src]]
+
+def dinf_receivers(filled, pixel_size=(1.0, 1.0)):
+    """Flow graph of the D-infinity method (Tarboton 1997).
+
+    Each cell drains along the steepest of its 8 triangular facets, and its flow is split
+    between the facet's two neighbours in proportion to how close the flow angle is to each.
+
+    Args:
+        filled (numpy.ndarray): Depression filled elevations, NaN for nodata.
+        pixel_size (tuple, optional): (x, y) pixel size in metres. Defaults to (1, 1).
+
+    Returns:
+        tuple: (source, receiver, fraction) arrays over flat cell indices.
+    """
+    px, py = pixel_size
+    nrows, ncols = filled.shape
+    z = np.pad(np.asarray(filled, dtype=np.float64), 1, constant_values=np.nan)
+    best = np.zeros(filled.shape)
+    facet = np.full(filled.shape, -1, dtype=np.int8)
+    share = np.zeros(filled.shape)
+    for k, ((cy, cx), (gy, gx)) in enumerate(DINF_FACETS):
+        e1 = z[1+cy:1+cy+nrows, 1+cx:1+cx+ncols]
+        e2 = z[1+gy:1+gy+nrows, 1+gx:1+gx+ncols]
+        d1 = py if cy else px
+        d2 = px if cy else py
+        s1 = (filled - e1) / d1
+        s2 = (e1 - e2) / d2
+        r = np.arctan2(s2, s1)
+        s = np.hypot(s1, s2)
+        rmax = math.atan2(d2, d1)
+        low = r < 0
+        r[low], s[low] = 0.0, s1[low]
+        high = r > rmax
+        r[high], s[high] = rmax, ((filled - e2) / math.hypot(d1, d2))[high]
+        # next to nodata only the cardinal edge of the facet exists
+        edge = np.isnan(e2) & np.isfinite(e1)
+        r[edge], s[edge] = 0.0, s1[edge]
+        steeper = s > best
+        best[steeper] = s[steeper]
+        facet[steeper] = k
+        share[steeper] = (r / rmax)[steeper]
+    src = np.flatnonzero(facet.ravel() >= 0)
+    k = facet.ravel()[src]
+    t = share.ravel()[src]
+    card = np.array([cy*ncols + cx for (cy, cx), _ in DINF_FACETS])
+    diag = np.array([gy*ncols + gx for _, (gy, gx) in DINF_FACETS])
+    src, dst, frac = np.concatenate([src, src]), np.concatenate([src + card[k], src + diag[k]]), np.concatenate([1 - t, t])
+    keep = frac > 0
+    return src[keep], dst[keep], frac[keep]
+
+def accumulate(n_cells, src, dst, frac=None, weights=None):
+    """Accumulate weights down a flow graph, one front of ready cells at a time.
+
+    A cell is ready once every cell draining into it has been processed. Each front is
+    handled with whole-array operations, so the number of Python steps is the length of
+    the longest flow path rather than the number of cells.
+
+    Args:
+        n_cells (int): Number of cells.
+        src (numpy.ndarray): Flat index of each edge's source cell.
+        dst (numpy.ndarray): Flat index of each edge's receiving cell.
+        frac (numpy.ndarray, optional): Fraction of the source's flow along each edge. Defaults to 1.
+        weights (numpy.ndarray, optional): Flow generated by each cell. Defaults to 1 per cell.
+
+    Returns:
+        numpy.ndarray: float64 accumulated flow per cell, including its own weight.
+    """
+    acc = np.ones(n_cells) if weights is None else np.asarray(weights, dtype=np.float64).ravel().copy()
+    frac = np.ones(len(src)) if frac is None else frac
+    order = np.argsort(src, kind='stable')
+    src, dst, frac = src[order], dst[order], frac[order]
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(src, minlength=n_cells))])
+    indegree = np.bincount(dst, minlength=n_cells)
+    front = np.flatnonzero(indegree == 0)
+    while front.size:
+        edges, _ = expand_ranges(indptr, front)
+        if not edges.size:
+            break
+        receivers = dst[edges]
+        np.add.at(acc, receivers, acc[src[edges]] * frac[edges])
+        np.subtract.at(indegree, receivers, 1)
+        receivers = np.unique(receivers)
+        front = receivers[indegree[receivers] == 0]
+    return acc
+
+def flow_accumulation(filled, method='d8', pixel_size=(1.0, 1.0), weights=None):
+    """Flow accumulation over a depression filled DEM.
+
+    Args:
+        filled (numpy.ndarray): Depression filled elevations, NaN for nodata (see priority_flood).
+        method (str, optional): 'd8' or 'dinf'. Defaults to 'd8'.
+        pixel_size (tuple, optional): (x, y) pixel size in metres. Defaults to (1, 1).
+        weights (numpy.ndarray, optional): Flow generated by each cell (e.g. rainfall). Defaults to 1.
+
+    Returns:
+        numpy.ndarray: Accumulated flow (upslope cell count by default), NaN on nodata.
+    """
+    assert method in ['d8', 'dinf'], print("Please use 'd8' or 'dinf'.")
+    if method == 'd8':
+        src, dst = d8_receivers(d8_flow_direction(filled, pixel_size))
+        frac = None
+    else:
+        src, dst, frac = dinf_receivers(filled, pixel_size)
+    acc = accumulate(filled.size, src, dst, frac, weights).reshape(filled.shape)
+    acc[~np.isfinite(filled)] = np.nan
+    return acc
+
+def _label_flood(z, labels, seeds, offsets, next_label):
+    """Priority flood of a tile from its edge cells, labelling watersheds and recording where they meet.
+
+    Edge cells start in the queue unlabelled (unless they drain outside, label 0). One that
+    is reached by another watershed's flood before it is popped joins that watershed; the
+    others start a new label when popped. Labels therefore count watersheds rather than
+    edge cells (Barnes et al. 2016).
+
+    Args:
+        z (list): Flattened NaN padded elevations, filled in place.
+        labels (list): Flattened labels (-2 nodata, -1 unlabelled, 0 outside), completed in place.
+        seeds (list): Flat indices of the cells the flood starts from.
+        offsets (list): Flat neighbour offsets.
+        next_label (int): First label to hand out.
+
+    Returns:
+        tuple: ({(label, label): lowest elevation at which the two watersheds meet}, number of labels handed out).
+    """
+    first = next_label
+    queued = bytearray(len(z))
+    heap = []
+    for c in seeds:
+        queued[c] = 1
+        heap.append((z[c], c))
+    heapq.heapify(heap)
+    pit = deque()
+    spill = {}
+    while heap or pit:
+        if pit:
+            c = pit.popleft()
+            zc = z[c]
+        else:
+            zc, c = heapq.heappop(heap)
+        lc = labels[c]
+        if lc == -1:
+            lc = labels[c] = next_label
+            next_label += 1
+        for off in offsets:
+            n = c + off
+            ln = labels[n]
+            if ln == -2:
+                continue
+            if ln >= 0:
+                if ln != lc:
+                    key = (lc, ln) if lc < ln else (ln, lc)
+                    level = max(zc, z[n])
+                    if level < spill.get(key, math.inf):
+                        spill[key] = level
+                continue
+            labels[n] = lc
+            if queued[n]:
+                # an edge cell still waiting in the queue, at a level no lower than zc
+                continue
+            queued[n] = 1
+            if z[n] <= zc:
+                z[n] = zc
+                pit.append(n)
+            else:
+                heapq.heappush(heap, (z[n], n))
+    return spill, next_label - first
+
+_tiles = {}
+
+def _tile_init(src_filename, window, tile_size):
+    """Process pool initializer: open the DEM once per worker."""
+    _tiles['ds'] = gdal.Open(src_filename)
+    _tiles['blocks'] = RasterBlocks(_tiles['ds'], cache=LRUCache(maxsize=64), key=src_filename)
+    _tiles['window'] = window
+    _tiles['tile_size'] = tile_size
+
+def tile_label_base(t, tile_size):
+    """First watershed label of tile t; a tile has fewer than 4*tile_size edge cells."""
+    return 1 + t * 4 * tile_size
+
+def _tile_flood(t, xoff, yoff, width, height):
+    """Fill one tile from its own edges.
+
+    Edge cells on the window border or next to nodata drain outside (label 0); the other
+    edge cells are grouped into watersheds with labels unique across tiles (see
+    _label_flood), so that the tile's watersheds can be joined to those of its neighbours.
+
+    Returns:
+        tuple: (filled tile, labels tile, spill dict, number of labels, perimeter (rows, cols, labels, z)).
+    """
+    x0, y0, wwidth, wheight = _tiles['window']
+    tile = _tiles['blocks'].window(xoff, yoff, width, height)
+    z, offsets = _padded(tile)
+    valid = np.isfinite(z)
+    ring = np.zeros_like(valid)
+    ring[1,1:-1] = ring[-2,1:-1] = ring[1:-1,1] = ring[1:-1,-2] = True
+    window_edge = np.zeros_like(valid)
+    window_edge[1,1:-1] = yoff == y0
+    window_edge[-2,1:-1] |= yoff + height == y0 + wheight
+    window_edge[1:-1,1] |= xoff == x0
+    window_edge[1:-1,-2] |= xoff + width == x0 + wwidth
+    nodata = np.zeros_like(valid)
+    nodata[1:-1,1:-1] = ~np.isfinite(tile)
+    touches = np.zeros_like(valid)
+    for dy, dx in D8_OFFSETS:
+        touches[1:-1,1:-1] |= nodata[1+dy:z.shape[0]-1+dy, 1+dx:z.shape[1]-1+dx]
+
+    labels = np.where(valid, -1, -2).astype(np.int64)
+    outside = valid & (window_edge | touches)
+    labels[outside] = 0
+    seeds = np.flatnonzero((valid & (ring | outside)).ravel()).tolist()
+    zf = z.ravel().tolist()
+    lf = labels.ravel().tolist()
+    spill, n_labels = _label_flood(zf, lf, seeds, offsets, tile_label_base(t, _tiles['tile_size']))
+    filled = np.array(zf).reshape(z.shape)
+    labels = np.array(lf, dtype=np.int64).reshape(z.shape)
+    # edge cells are never raised, so the perimeter keeps its own elevations (nodata reads as outside)
+    rows, cols = np.nonzero(ring)
+    perimeter = (rows - 1 + yoff, cols - 1 + xoff, np.maximum(labels[rows, cols], 0),
+                 np.where(valid[rows, cols], filled[rows, cols], -np.inf))
+    return filled[1:-1,1:-1], labels[1:-1,1:-1], spill, n_labels, perimeter
+
+def _tile_spill(t, xoff, yoff, width, height):
+    _, _, spill, n_labels, perimeter = _tile_flood(t, xoff, yoff, width, height)
+    return spill, n_labels, perimeter
+
+def _tile_fill(t, xoff, yoff, width, height, tile_levels):
+    """Flood a tile again and raise each watershed to the spill level of its label.
+
+    Args:
+        tile_levels (numpy.ndarray): Spill level of each of the tile's own labels, in label order.
+    """
+    filled, labels, _, _, _ = _tile_flood(t, xoff, yoff, width, height)
+    edge = labels > 0
+    level = np.full(labels.shape, -np.inf)
+    level[edge] = tile_levels[labels[edge] - tile_label_base(t, _tiles['tile_size'])]
+    filled = np.where(edge, np.fmax(filled, level), filled)
+    # watersheds with no way out of the window
+    filled[np.isposinf(level)] = np.nan
+    return xoff, yoff, filled.astype(np.float32)
+
+def reduce_edges(a, b, level):
+    """Keep the lowest level of every undirected label pair, dropping self loops."""
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+    keep = lo != hi
+    lo, hi, level = lo[keep], hi[keep], np.asarray(level, dtype=np.float64)[keep]
+    order = np.lexsort((level, hi, lo))
+    lo, hi, level = lo[order], hi[order], level[order]
+    first = np.ones(len(lo), dtype=bool)
+    first[1:] = (lo[1:] != lo[:-1]) | (hi[1:] != hi[:-1])
+    return lo[first], hi[first], level[first]
+
+def tile_adjacency(perimeters):
+    """Spill levels between labels on the touching edges of neighbouring tiles.
+
+    Args:
+        perimeters (list): (rows, cols, labels, z) of each tile's edge cells.
+
+    Returns:
+        tuple: (label_a, label_b, level) arrays, one entry per label pair.
+    """
+    rows = np.concatenate([p[0] for p in perimeters])
+    cols = np.concatenate([p[1] for p in perimeters])
+    labels = np.concatenate([p[2] for p in perimeters])
+    z = np.concatenate([p[3] for p in perimeters])
+    tile = np.repeat(np.arange(len(perimeters)), [len(p[0]) for p in perimeters])
+    width = cols.max() + 3
+    keys = (rows + 1) * width + cols + 1
+    order = np.argsort(keys)
+    keys, labels, z, tile = keys[order], labels[order], z[order], tile[order]
+    a, b, level = [], [], []
+    for dy, dx in D8_OFFSETS:
+        pos = np.searchsorted(keys, keys + dy*width + dx)
+        pos = np.minimum(pos, len(keys) - 1)
+        hit = (keys[pos] == keys + dy*width + dx) & (tile[pos] != tile) & (labels[pos] != labels)
+        a.append(labels[hit])
+        b.append(labels[pos[hit]])
+        level.append(np.maximum(z[hit], z[pos[hit]]))
+    return reduce_edges(np.concatenate(a), np.concatenate(b), np.concatenate(level))
+
+def spill_levels(n_labels, a, b, level):
+    """Lowest level at which each label drains to label 0, by a priority flood over the label graph.
+
+    Returns:
+        numpy.ndarray: Level per label, -inf for label 0 and inf for labels that never drain.
+    """
+    order = np.argsort(a, kind='stable')
+    a, b, level = a[order], b[order], level[order]
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(a, minlength=n_labels))])
+    b, level = b.tolist(), level.tolist()
+    levels = np.full(n_labels, np.inf)
+    done = bytearray(n_labels)
+    heap = [(-math.inf, 0)]
+    while heap:
+        lc, c = heapq.heappop(heap)
+        if done[c]:
+            continue
+        done[c] = 1
+        levels[c] = lc
+        for e in range(indptr[c], indptr[c + 1]):
+            n = b[e]
+            if not done[n]:
+                heapq.heappush(heap, (max(lc, level[e]), n))
+    return levels
+
+def fill_tiled(src_filename, dst_filename, window=None, tile_size=2048, workers=None):
+    """Priority-flood fill of a DEM too large for memory, tile by tile (Barnes et al. 2016).
+
+    The first pass floods each tile from its own edges, grouping its edge cells into
+    watersheds (labels) and recording the levels at which watersheds meet, inside the
+    tile and across the edges it shares with its neighbours. Only this small label graph
+    is kept. A priority flood over the graph then gives the level at which each
+    label spills to the outside, and the second pass floods every tile again and raises
+    its cells to their label's spill level. No epsilon gradient is applied across flats.
+
+    Args:
+        src_filename (str): Input DEM.
+        dst_filename (str): Output filled DEM (tiled, compressed GeoTIFF).
+        window (tuple, optional): (xoff, yoff, width, height) pixel window. Defaults to the whole DEM.
+        tile_size (int, optional): Tile width and height in pixels. Defaults to 2048.
+        workers (int, optional): Number of processes. Defaults to the CPU count.
+
+    Returns:
+        str: dst_filename.
+    """
+    src = gdal.Open(src_filename)
+    gt = src.GetGeoTransform()
+    if window is None:
+        window = (0, 0, src.RasterXSize, src.RasterYSize)
+    window = tuple(int(v) for v in window)
+    x0, y0, width, height = window
+    tiles = [(t, x0 + tx, y0 + ty, min(tile_size, width - tx), min(tile_size, height - ty))
+             for t, (ty, tx) in enumerate((ty, tx) for ty in range(0, height, tile_size)
+                                          for tx in range(0, width, tile_size))]
+    workers = workers or os.cpu_count() or 1
+
+    # join each tile to the neighbours before it in row order as results arrive, keeping
+    # only the perimeters a later tile can still touch
+    ntx = -(-width // tile_size)
+    counts, edges, perimeters = [], [], {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_tile_init,
+                             initargs=(src_filename, window, tile_size)) as executor:
+        for t, (spill, n_labels, perimeter) in enumerate(executor.map(_tile_spill, *zip(*tiles))):
+            counts.append(n_labels)
+            if spill:
+                keys = np.array(list(spill.keys()), dtype=np.int64)
+                edges.append((keys[:,0], keys[:,1], np.array(list(spill.values()))))
+            perimeters[t] = perimeter
+            r, c = divmod(t, ntx)
+            for nr, nc in [(r, c - 1), (r - 1, c - 1), (r - 1, c), (r - 1, c + 1)]:
+                if nr >= 0 and 0 <= nc < ntx:
+                    edges.append(tile_adjacency([perimeters[nr*ntx + nc], perimeter]))
+            perimeters.pop(t - ntx - 1, None)
+    a, b, level = reduce_edges(*[np.concatenate(e) for e in zip(*edges)]) if edges else \
+        (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0))
+
+    # renumber labels contiguously: tile t's labels follow those of the tiles before it
+    offsets = np.concatenate([[1], 1 + np.cumsum(counts)])
+    def compact(labels):
+        t = np.maximum(labels - 1, 0) // (4 * tile_size)
+        return np.where(labels > 0, offsets[t] + labels - (1 + t * 4 * tile_size), 0)
+    a, b = compact(a), compact(b)
+    levels = spill_levels(offsets[-1], np.concatenate([a, b]), np.concatenate([b, a]), np.concatenate([level, level]))
+    print("Joined %d tiles (%d watersheds) through %d watershed edges" % (len(tiles), offsets[-1] - 1, len(a)))
+    tile_levels = [levels[offsets[t]:offsets[t + 1]] for t in range(len(tiles))]
+
+    out = gdal.GetDriverByName('GTiff').Create(dst_filename, width, height, 1, gdal.GDT_Float32,
+                                               ['TILED=YES', 'BLOCKXSIZE=512', 'BLOCKYSIZE=512',
+                                                'COMPRESS=DEFLATE', 'PREDICTOR=3', 'BIGTIFF=IF_SAFER'])
+    out.SetGeoTransform((gt[0] + x0*gt[1], gt[1], gt[2], gt[3] + y0*gt[5], gt[4], gt[5]))
+    out.SetProjection(src.GetProjection())
+    band = out.GetRasterBand(1)
+    band.SetNoDataValue(float('nan'))
+    src = None
+    with ProcessPoolExecutor(max_workers=workers, initializer=_tile_init,
+                             initargs=(src_filename, window, tile_size)) as executor:
+        for xoff, yoff, filled in executor.map(_tile_fill, *zip(*tiles), tile_levels):
+            band.WriteArray(filled, xoff - x0, yoff - y0)
+    out.FlushCache()
+    out = None
+    return dst_filename
+
+def nodata_seeds(dem):
+    """Valid cells next to nodata inside the grid, e.g. the coastline of a DEM whose sea is nodata."""
+    z = np.pad(np.asarray(dem, dtype=np.float64), 1, constant_values=np.inf)
+    valid = np.isfinite(z)
+    touches = np.zeros_like(valid)
+    for dy, dx in D8_OFFSETS:
+        touches[1:-1,1:-1] |= np.isnan(z[1+dy:z.shape[0]-1+dy, 1+dx:z.shape[1]-1+dx])
+    return (valid & touches)[1:-1,1:-1]
+
+class InundationSweep:
+    """Bathtub inundation for every water level at once.
+
+    A single priority flood from the seeds gives each cell the lowest water level at which
+    it is flooded through cells connected to a seed (its first inundation level). A cell
+    is then inundated at level L exactly when its first level is <= L, so extents and
+    depths for any level are one comparison, and per-zone curves over many levels come
+    from one sort of the cells by zone and first level.
+
+    Args:
+        dem (numpy.ndarray): Elevations in metres, NaN for nodata.
+        seeds (numpy.ndarray, optional): Boolean mask of water source cells (coast, river).
+            Defaults to the cells next to nodata (see nodata_seeds), or to the grid border
+            when the DEM has no nodata, as in priority_flood.
+
+    Raises:
+        ValueError: If seeds are given but contain no valid cell.
+    """
+    def __init__(self, dem, seeds=None):
+        self.dem = np.asarray(dem, dtype=np.float64)
+        if seeds is None:
+            seeds = nodata_seeds(self.dem)
+            if not np.any(seeds):
+                seeds = _edge_seeds(np.pad(self.dem, 1, constant_values=np.nan))[1:-1,1:-1]
+        elif not np.any(np.asarray(seeds, dtype=bool) & np.isfinite(self.dem)):
+            raise ValueError("No valid seed cells to flood from, please pass seeds that cover water sources with elevation data.")
+        self.first_level = priority_flood(self.dem, seeds=seeds, epsilon=False)
+
+    def extent(self, level):
+        """Boolean mask of the cells inundated at a water level."""
+        return self.first_level <= level
+
+    def depth(self, level):
+        """Water depth at a level, NaN where dry."""
+        return np.where(self.extent(level), level - self.dem, np.nan)
+
+    def curves(self, zones, levels):
+        """Inundation of every zone at every water level.
+
+        Args:
+            zones (numpy.ndarray): Integer zone per cell (e.g. rasterised footprints or
+                meshblocks), negative outside any zone.
+            levels (array-like): Water levels in metres.
+
+        Returns:
+            pandas.DataFrame: One row per zone and level with columns zone, level, cells,
+                inundated (cell count), fraction, mean_depth (over the zone) and max_depth.
+        """
+        levels = np.sort(np.asarray(levels, dtype=np.float64))
+        zones = np.asarray(zones).ravel()
+        first = self.first_level.ravel()
+        inside = (zones >= 0) & np.isfinite(self.dem.ravel())
+        if not inside.any():
+            return pd.DataFrame(columns=['zone','level','cells','inundated','fraction','mean_depth','max_depth'])
+        ids, zone = np.unique(zones[inside], return_inverse=True)
+        first = np.where(np.isnan(first[inside]), np.inf, first[inside])
+        ground = self.dem.ravel()[inside]
+
+        # exact ranks of cell and query levels so that (zone, level) sorts as one integer key
+        values, rank = np.unique(np.concatenate([first, levels]), return_inverse=True)
+        nrank = len(values) + 1
+        key = zone * nrank + rank[:len(first)]
+        order = np.argsort(key, kind='stable')
+        key, ground = key[order], ground[order]
+        cum_ground = np.concatenate([[0.0], np.cumsum(ground)])
+        cells = np.bincount(zone, minlength=len(ids))
+        start = np.concatenate([[0], np.cumsum(cells)])[:-1]
+        # running minimum of the ground within each zone (for the maximum depth), offsetting
+        # each zone below the previous one so that a single accumulate restarts per zone
+        shift = (np.ptp(ground) + 1.0) * zone[order]
+        cum_min = np.minimum.accumulate(ground - shift) + shift
+
+        zz = np.repeat(np.arange(len(ids)), len(levels))
+        ll = np.tile(np.arange(len(levels)), len(ids))
+        end = np.searchsorted(key, zz * nrank + rank[len(first):][ll], side='right')
+        inundated = end - start[zz]
+        level = levels[ll]
+        depth_sum = inundated * level - (cum_ground[end] - cum_ground[start[zz]])
+        max_depth = np.where(inundated > 0, level - cum_min[np.maximum(end - 1, 0)], 0.0)
+        return pd.DataFrame({'zone': ids[zz], 'level': level, 'cells': cells[zz], 'inundated': inundated,
+                             'fraction': inundated / cells[zz], 'mean_depth': depth_sum / cells[zz],
+                             'max_depth': max_depth})
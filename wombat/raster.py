@@ -0,0 +1,217 @@
+import threading
+import numpy as np
+
+# numpy dtypes of GDAL band data types (GDT_Byte ... GDT_Int8), as gdal_array maps them
+GDAL_DTYPES = {1: np.uint8, 2: np.uint16, 3: np.int16, 4: np.uint32, 5: np.int32, 6: np.float32,
+               7: np.float64, 12: np.uint64, 13: np.int64, 14: np.int8}
+
+def lonlat_to_pixel(gt,lons,lats):
+    """Convert coordinates to fractional pixel coordinates of a north-up raster.
+    
+    Args:
+        gt (tuple): GDAL geotransform of the raster.
+        lons (array-like): Longitudes (or x in the raster CRS).
+        lats (array-like): Latitudes (or y in the raster CRS).
+    
+    Returns:
+        tuple: (cols, rows) float arrays, where pixel (r, c) covers [c, c+1) x [r, r+1).
+    """
+    lons = np.asarray(lons,dtype=np.float64)
+    lats = np.asarray(lats,dtype=np.float64)
+    return (lons - gt[0]) / gt[1], (lats - gt[3]) / gt[5]
+
+def cubic_weights(t,a=-0.5):
+    """Keys cubic convolution weights of the four samples at offsets -1, 0, 1, 2 from floor(x).
+    
+    Args:
+        t (numpy.ndarray): Fractional offset of x from floor(x), in [0, 1).
+        a (float, optional): Kernel parameter. Defaults to -0.5 (Catmull-Rom).
+    
+    Returns:
+        numpy.ndarray: (n, 4) weights summing to one.
+    """
+    d = np.abs(t[:,None] - np.arange(-1,3)[None,:])
+    near = ((a+2)*d - (a+3))*d*d + 1
+    far = ((a*d - 5*a)*d + 8*a)*d - 4*a
+    return np.where(d <= 1,near,np.where(d < 2,far,0.0))
+
+def interpolation_stencil(cols,rows,method,nx,ny):
+    """Pixel indices and weights that interpolate a raster at fractional pixel coordinates.
+    
+    Sample positions refer to pixel centres, and neighbours beyond the raster edge are
+    clamped to the edge pixels.
+    
+    Args:
+        cols (numpy.ndarray): Fractional pixel columns.
+        rows (numpy.ndarray): Fractional pixel rows.
+        method (str): 'nearest', 'bilinear' or 'bicubic'.
+        nx (int): Raster width.
+        ny (int): Raster height.
+    
+    Returns:
+        tuple: (rows, cols, weights), each of shape (n, k) with k = 1, 4 or 16.
+    """
+    assert method in ['nearest','bilinear','bicubic'], print("Please use 'nearest', 'bilinear' or 'bicubic'.")
+    if method == 'nearest':
+        return np.floor(rows)[:,None], np.floor(cols)[:,None], np.ones((len(rows),1))
+    u = cols - 0.5
+    v = rows - 0.5
+    i0 = np.floor(u)
+    j0 = np.floor(v)
+    if method == 'bilinear':
+        offsets = np.arange(2)
+        wx = np.column_stack([1 - (u - i0), u - i0])
+        wy = np.column_stack([1 - (v - j0), v - j0])
+    else:
+        offsets = np.arange(-1,3)
+        wx = cubic_weights(u - i0)
+        wy = cubic_weights(v - j0)
+    k = len(offsets)
+    cc = np.clip(i0[:,None] + offsets[None,:],0,nx-1)
+    rr = np.clip(j0[:,None] + offsets[None,:],0,ny-1)
+    n = len(rows)
+    rr = np.broadcast_to(rr[:,:,None],(n,k,k)).reshape(n,k*k)
+    cc = np.broadcast_to(cc[:,None,:],(n,k,k)).reshape(n,k*k)
+    weights = (wy[:,:,None]*wx[:,None,:]).reshape(n,k*k)
+    return rr, cc, weights
+
+class RasterBlocks:
+    """Block-wise reader for one band of a GDAL dataset.
+    
+    Reads are aligned to the band's internal blocks (the tiles of a COG), so a batch of
+    pixel lookups touches each block once, however many points fall in it. Values are
+    returned as float64 with nodata and out-of-bounds pixels set to NaN.
+    
+    Decoded blocks can be kept in an LRUCache shared between readers and threads. GDAL
+    datasets are not thread-safe, so the reads themselves are serialised with a lock.
+    
+    Args:
+        ds (gdal.Dataset): Open raster dataset.
+        band (int, optional): Band number. Defaults to 1.
+        cache (LRUCache, optional): Cache of decoded blocks. Defaults to None (no caching).
+        key (str, optional): Identifies the raster in a shared cache, e.g. its filename.
+            Defaults to the dataset description.
+    """
+    def __init__(self,ds,band=1,cache=None,key=None):
+        self.ds = ds
+        self.band_number = band
+        self.band = ds.GetRasterBand(band)
+        self.nx = ds.RasterXSize
+        self.ny = ds.RasterYSize
+        self.bx, self.by = self.band.GetBlockSize()
+        self.nbx = -(-self.nx // self.bx)
+        self.nby = -(-self.ny // self.by)
+        self.nodata = self.band.GetNoDataValue()
+        self.cache = cache
+        self.key = key if key is not None else ds.GetDescription()
+        self._lock = threading.Lock()
+        
+    def read_block(self,i,j):
+        """Read block (column i, row j) as float64 with nodata set to NaN.
+        
+        Cached blocks are shared, so they are returned read-only.
+        """
+        if self.cache is None:
+            return self._read_block(i,j)
+        return self.cache.get_or_compute((self.key,self.band_number,i,j),lambda: self._read_block(i,j))
+    
+    def _read_block(self,i,j):
+        x0, y0 = i*self.bx, j*self.by
+        with self._lock:
+            block = self.band.ReadAsArray(x0,y0,min(self.bx,self.nx-x0),min(self.by,self.ny-y0))
+        block = block.astype(np.float64)
+        if self.nodata is not None:
+            block[block == self.nodata] = np.nan
+        block.setflags(write=False)
+        return block
+    
+    def window(self,xoff,yoff,width,height,native=False):
+        """Read a pixel window assembled from (cached) blocks, NaN outside the raster.
+        
+        Args:
+            xoff (int): First column.
+            yoff (int): First row.
+            width (int): Number of columns.
+            height (int): Number of rows.
+            native (bool, optional): Return the band's own dtype with its nodata value, as
+                ReadAsArray does, instead of float64 with NaN. Defaults to False.
+        
+        Returns:
+            numpy.ndarray: (height, width) array.
+        """
+        out = np.full((height,width),np.nan)
+        x0, x1 = max(xoff,0), min(xoff+width,self.nx)
+        y0, y1 = max(yoff,0), min(yoff+height,self.ny)
+        if x1 > x0 and y1 > y0:
+            self._fill_window(out,xoff,yoff,x0,x1,y0,y1)
+        if native:
+            if self.nodata is not None:
+                out[np.isnan(out)] = self.nodata
+            out = out.astype(GDAL_DTYPES.get(self.band.DataType,np.float64))
+        return out
+    
+    def _fill_window(self,out,xoff,yoff,x0,x1,y0,y1):
+        """Copy the blocks overlapping the in-raster part [x0,x1) x [y0,y1) of a window into out."""
+        for j in range(y0 // self.by,(y1-1) // self.by + 1):
+            for i in range(x0 // self.bx,(x1-1) // self.bx + 1):
+                block = self.read_block(i,j)
+                bx0, by0 = i*self.bx, j*self.by
+                cx0, cx1 = max(x0,bx0), min(x1,bx0+block.shape[1])
+                cy0, cy1 = max(y0,by0), min(y1,by0+block.shape[0])
+                out[cy0-yoff:cy1-yoff,cx0-xoff:cx1-xoff] = block[cy0-by0:cy1-by0,cx0-bx0:cx1-bx0]
+    
+    def gather(self,rows,cols):
+        """Values at integer pixel indices, NaN where out of bounds or nodata.
+        
+        Args:
+            rows (array-like): Pixel rows.
+            cols (array-like): Pixel columns.
+        
+        Returns:
+            numpy.ndarray: float64 values with the shape of rows.
+        """
+        rows = np.asarray(rows)
+        cols = np.asarray(cols)
+        finite = np.isfinite(rows) & np.isfinite(cols)
+        rows = np.where(finite,rows,-1).astype(np.int64)
+        cols = np.where(finite,cols,-1).astype(np.int64)
+        values = np.full(rows.shape,np.nan)
+        inside = np.flatnonzero(((rows >= 0) & (rows < self.ny) & (cols >= 0) & (cols < self.nx)).ravel())
+        r, c = rows.ravel()[inside], cols.ravel()[inside]
+        flat = values.reshape(-1)
+        if len(r) == 0:
+            return values
+        # dense batches are cheaper to index from one window assembled from the same blocks
+        r0, r1, c0, c1 = r.min(), r.max(), c.min(), c.max()
+        if (r1-r0+1)*(c1-c0+1) <= 4*len(r):
+            flat[inside] = self.window(c0,r0,c1-c0+1,r1-r0+1)[r-r0,c-c0]
+            return values
+        block_id = (r // self.by) * self.nbx + (c // self.bx)
+        order = np.argsort(block_id,kind='stable')
+        block_ids, starts = np.unique(block_id[order],return_index=True)
+        for b, sel in zip(block_ids,np.split(order,starts[1:])):
+            block = self.read_block(b % self.nbx,b // self.nbx)
+            flat[inside[sel]] = block[r[sel] % self.by,c[sel] % self.bx]
+        return values
+    
+    def sample(self,cols,rows,method='nearest'):
+        """Interpolate the band at fractional pixel coordinates.
+        
+        The stencils of all points are gathered in a single block-wise pass. Points outside
+        the raster are NaN, as are points whose stencil touches a nodata pixel.
+        
+        Args:
+            cols (array-like): Fractional pixel columns.
+            rows (array-like): Fractional pixel rows.
+            method (str, optional): 'nearest', 'bilinear' or 'bicubic'. Defaults to 'nearest'.
+        
+        Returns:
+            numpy.ndarray: float64 values.
+        """
+        cols = np.asarray(cols,dtype=np.float64).ravel()
+        rows = np.asarray(rows,dtype=np.float64).ravel()
+        inside = (cols >= 0) & (cols < self.nx) & (rows >= 0) & (rows < self.ny)
+        values = np.full(len(cols),np.nan)
+        rr, cc, weights = interpolation_stencil(cols[inside],rows[inside],method,self.nx,self.ny)
+        values[inside] = (self.gather(rr,cc)*weights).sum(axis=1)
+        return values
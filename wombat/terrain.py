@@ -0,0 +1,202 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+from scipy import ndimage
+from osgeo import gdal, osr
+from wombat.cache import LRUCache
+from wombat.raster import RasterBlocks
+from wombat.viewshed import pixel_size_m
+
+TERRAIN_PRODUCTS = ['slope','aspect','hillshade','tpi','tri']
+
+def horn_gradient(z, px, py):
+    """Horn's 3x3 finite differences of a haloed array.
+
+    Args:
+        z (numpy.ndarray): Elevations with a one cell halo on every side.
+        px (float): Pixel width in metres.
+        py (float): Pixel height in metres.
+
+    Returns:
+        tuple: (dz/dx towards the east, dz/dy towards the south) for the interior cells.
+    """
+    a, b, c = z[:-2,:-2], z[:-2,1:-1], z[:-2,2:]
+    d, f = z[1:-1,:-2], z[1:-1,2:]
+    g, h, i = z[2:,:-2], z[2:,1:-1], z[2:,2:]
+    dzdx = ((c + 2*f + i) - (a + 2*d + g)) / (8*px)
+    dzdy = ((g + 2*h + i) - (a + 2*b + c)) / (8*py)
+    return dzdx, dzdy
+
+def slope(z, px, py):
+    """Slope in degrees."""
+    dzdx, dzdy = horn_gradient(z, px, py)
+    return np.degrees(np.arctan(np.hypot(dzdx, dzdy)))
+
+def aspect(z, px, py):
+    """Aspect in degrees clockwise from north (the downslope direction), NaN on flat cells."""
+    dzdx, dzdy = horn_gradient(z, px, py)
+    out = np.degrees(np.arctan2(dzdx, -dzdy)) % 360
+    # the downslope direction is opposite the gradient
+    out = (out + 180) % 360
+    out[(dzdx == 0) & (dzdy == 0)] = np.nan
+    return out
+
+def hillshade(z, px, py, azimuth=315.0, altitude=45.0):
+    """Hillshade (0-255) lit from azimuth (degrees clockwise from north) and altitude."""
+    dzdx, dzdy = horn_gradient(z, px, py)
+    zenith = np.radians(90.0 - altitude)
+    az = np.radians(azimuth)
+    slope_rad = np.arctan(np.hypot(dzdx, dzdy))
+    # direction the surface faces, clockwise from north
+    facing = np.arctan2(dzdx, -dzdy) + np.pi
+    shade = np.cos(zenith)*np.cos(slope_rad) + np.sin(zenith)*np.sin(slope_rad)*np.cos(az - facing)
+    return 255.0*np.clip(shade, 0, 1)
+
+def tpi(z, radius=1):
+    """Topographic position index: elevation minus the mean of the surrounding (2r+1)^2 cells."""
+    size = 2*radius + 1
+    # running sums smear NaN along whole lines, so filter zero-filled values and flag nodata windows
+    valid = np.isfinite(z)
+    total = ndimage.uniform_filter(np.where(valid, z, 0.0), size=size, mode='nearest') * size**2
+    complete = ndimage.minimum_filter(valid, size=size, mode='nearest')
+    mean = (total - z) / (size**2 - 1)
+    out = np.where(complete, z - mean, np.nan)
+    return out[radius:-radius, radius:-radius]
+
+def tri(z):
+    """Terrain ruggedness index (Riley): root of the summed squared differences to the 8 neighbours."""
+    centre = z[1:-1,1:-1]
+    total = np.zeros_like(centre)
+    for dy in range(3):
+        for dx in range(3):
+            if dy == 1 and dx == 1:
+                continue
+            total += (z[dy:dy+centre.shape[0], dx:dx+centre.shape[1]] - centre)**2
+    return np.sqrt(total)
+
+def terrain_halo(products, tpi_radius=1):
+    """Number of halo cells the requested products need around each tile."""
+    return max(tpi_radius if 'tpi' in products else 1, 1)
+
+def compute_products(z, products, px, py, halo, tpi_radius=1, azimuth=315.0, altitude=45.0):
+    """Compute terrain products for the interior of a haloed tile.
+
+    Args:
+        z (numpy.ndarray): Elevations with halo cells on every side.
+        products (list): Names from TERRAIN_PRODUCTS.
+        px, py (float): Pixel size in metres.
+        halo (int): Halo width of z.
+
+    Returns:
+        list: float32 arrays, one per product, without the halo.
+    """
+    out = []
+    for name in products:
+        # every kernel but TPI uses a one cell halo
+        h = tpi_radius if name == 'tpi' else 1
+        zz = z[halo-h:z.shape[0]-(halo-h), halo-h:z.shape[1]-(halo-h)]
+        if name == 'slope':
+            arr = slope(zz, px, py)
+        elif name == 'aspect':
+            arr = aspect(zz, px, py)
+        elif name == 'hillshade':
+            arr = hillshade(zz, px, py, azimuth, altitude)
+        elif name == 'tpi':
+            arr = tpi(zz, tpi_radius)
+        else:
+            arr = tri(zz)
+        out.append(arr.astype(np.float32))
+    return out
+
+_terrain = {}
+
+def _terrain_init(src_filename):
+    """Process pool initializer: open the DEM once per worker."""
+    _terrain['ds'] = gdal.Open(src_filename)
+    _terrain['blocks'] = RasterBlocks(_terrain['ds'], cache=LRUCache(maxsize=64), key=src_filename)
+    srs = osr.SpatialReference(wkt=_terrain['ds'].GetProjection())
+    _terrain['geographic'] = bool(srs.IsGeographic())
+
+def _terrain_tile(xoff, yoff, width, height, products, halo, kwargs):
+    blocks = _terrain['blocks']
+    gt = _terrain['ds'].GetGeoTransform()
+    z = blocks.window(xoff - halo, yoff - halo, width + 2*halo, height + 2*halo)
+    if _terrain['geographic']:
+        px, py = pixel_size_m(gt, gt[3] + (yoff + height/2)*gt[5])
+    else:
+        px, py = abs(gt[1]), abs(gt[5])
+    return xoff, yoff, compute_products(z, products, px, py, halo, **kwargs)
+
+def compute_terrain(src_filename, dst_filename, products=['slope','aspect'], window=None, tile_size=1024,
+                    workers=None, cog=True, tpi_radius=1, azimuth=315.0, altitude=45.0):
+    """Compute terrain derivatives of a DEM tile by tile into a compressed (COG) GeoTIFF.
+
+    Each tile is read with the halo its kernels need, so results are seamless across tile
+    edges. Tiles are computed in a process pool, each worker opening the DEM itself.
+    Results are written as they arrive, with at most two tiles per worker in flight, so
+    memory does not grow with the area. Geographic DEMs use metre pixel sizes at each
+    tile's latitude.
+
+    Args:
+        src_filename (str): Input DEM.
+        dst_filename (str): Output raster, one band per product.
+        products (list, optional): Names from TERRAIN_PRODUCTS. Defaults to ['slope','aspect'].
+        window (tuple, optional): (xoff, yoff, width, height) pixel window of the DEM. Defaults to the whole DEM.
+        tile_size (int, optional): Tile width and height in pixels. Defaults to 1024.
+        workers (int, optional): Number of processes. Defaults to the CPU count.
+        cog (bool, optional): Convert the tiled GeoTIFF to a Cloud Optimised GeoTIFF. Defaults to True.
+        tpi_radius (int, optional): TPI neighbourhood radius in cells. Defaults to 1.
+        azimuth (float, optional): Hillshade sun azimuth in degrees. Defaults to 315.
+        altitude (float, optional): Hillshade sun altitude in degrees. Defaults to 45.
+
+    Returns:
+        str: dst_filename.
+    """
+    for name in products:
+        assert name in TERRAIN_PRODUCTS, print("Please choose products from", TERRAIN_PRODUCTS)
+    src = gdal.Open(src_filename)
+    gt = src.GetGeoTransform()
+    if window is None:
+        window = (0, 0, src.RasterXSize, src.RasterYSize)
+    x0, y0, width, height = [int(v) for v in window]
+    halo = terrain_halo(products, tpi_radius)
+    kwargs = dict(tpi_radius=tpi_radius, azimuth=azimuth, altitude=altitude)
+
+    tiled = dst_filename + ".tiles.tif" if cog else dst_filename
+    out = gdal.GetDriverByName('GTiff').Create(tiled, width, height, len(products), gdal.GDT_Float32,
+                                               ['TILED=YES', 'BLOCKXSIZE=512', 'BLOCKYSIZE=512',
+                                                'COMPRESS=DEFLATE', 'PREDICTOR=3', 'BIGTIFF=IF_SAFER'])
+    out.SetGeoTransform((gt[0] + x0*gt[1], gt[1], gt[2], gt[3] + y0*gt[5], gt[4], gt[5]))
+    out.SetProjection(src.GetProjection())
+    for b, name in enumerate(products):
+        band = out.GetRasterBand(b + 1)
+        band.SetNoDataValue(float('nan'))
+        band.SetDescription(name)
+    src = None
+
+    tiles = [(x0 + tx, y0 + ty, min(tile_size, width - tx), min(tile_size, height - ty))
+             for ty in range(0, height, tile_size) for tx in range(0, width, tile_size)]
+    def write(done):
+        for future in done:
+            xoff, yoff, arrays = future.result()
+            for b, arr in enumerate(arrays):
+                out.GetRasterBand(b + 1).WriteArray(arr, xoff - x0, yoff - y0)
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_terrain_init, initargs=(src_filename,)) as executor:
+        pending = set()
+        for tile in tiles:
+            if len(pending) >= 2*workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                write(done)
+            pending.add(executor.submit(_terrain_tile, *tile, products, halo, kwargs))
+        write(wait(pending).done)
+        print("Computed %d tiles of %s" % (len(tiles), ", ".join(products)))
+    out.FlushCache()
+    out = None
+
+    if cog:
+        gdal.Translate(dst_filename, tiled, format='COG',
+                       creationOptions=['COMPRESS=DEFLATE', 'PREDICTOR=YES', 'BLOCKSIZE=512', 'BIGTIFF=IF_SAFER'])
+        os.remove(tiled)
+    return dst_filename
@@ -0,0 +1,330 @@
+import json
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from wombat.csr import expand_ranges
+
+# quantisation grid in degrees, roughly 10cm
+TOPOLOGY_STEP = 1e-6
+
+def mix_ids(ids):
+    """Hash integers to well spread uint64 values (splitmix64 finaliser)."""
+    z = np.asarray(ids, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+def canonical_arc(arc):
+    """Orientation-independent form of an arc, and whether it had to be reversed."""
+    if arc[0] != arc[-1]:
+        reverse = arc[0] > arc[-1]
+    else:
+        reverse = tuple(arc[::-1]) < tuple(arc)
+    return (arc[::-1] if reverse else arc), reverse
+
+class Topology:
+    """Polygons encoded as rings of shared, quantised arcs, in the manner of TopoJSON.
+
+    Coordinates are snapped to a regular grid and every ring is cut at the junctions where
+    the set of rings sharing its edges changes. The resulting arcs are stored once, so an
+    edge between two neighbouring areas is held a single time and referenced by both rings
+    (reversed in one of them, as ``~index``). Simplifying the arcs rather than the polygons
+    moves both sides of a shared edge together, so simplified layers have no gaps or
+    overlaps between neighbours.
+
+    Args:
+        ids (numpy.ndarray): Identifier of each geometry.
+        multi (numpy.ndarray): Whether each geometry was a MultiPolygon.
+        geom_indptr (numpy.ndarray): CSR pointer from geometries to polygon parts.
+        part_indptr (numpy.ndarray): CSR pointer from parts to rings, exterior ring first.
+        ring_indptr (numpy.ndarray): CSR pointer from rings to arc references.
+        ring_arcs (numpy.ndarray): Arc references, ``~i`` for arc i traversed backwards.
+        arc_indptr (numpy.ndarray): CSR pointer from arcs to their points.
+        arc_xy (numpy.ndarray): (n, 2) int32 quantised arc coordinates.
+        translate (tuple): Coordinates of the grid origin.
+        step (float): Grid spacing in degrees.
+    """
+    def __init__(self, ids, multi, geom_indptr, part_indptr, ring_indptr, ring_arcs,
+                 arc_indptr, arc_xy, translate, step=TOPOLOGY_STEP):
+        self.ids = pd.Index(ids)
+        self.multi = np.asarray(multi, dtype=bool)
+        self.geom_indptr = np.asarray(geom_indptr, dtype=np.int64)
+        self.part_indptr = np.asarray(part_indptr, dtype=np.int64)
+        self.ring_indptr = np.asarray(ring_indptr, dtype=np.int64)
+        self.ring_arcs = np.asarray(ring_arcs, dtype=np.int32)
+        self.arc_indptr = np.asarray(arc_indptr, dtype=np.int64)
+        self.arc_xy = np.asarray(arc_xy, dtype=np.int32).reshape(-1, 2)
+        self.translate = np.asarray(translate, dtype=np.float64)
+        self.step = float(step)
+        self._simplified = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def n_arcs(self):
+        return len(self.arc_indptr) - 1
+
+    @property
+    def nbytes(self):
+        """Size of the encoded arrays in bytes."""
+        return sum(a.nbytes for a in [self.multi, self.geom_indptr, self.part_indptr, self.ring_indptr,
+                                      self.ring_arcs, self.arc_indptr, self.arc_xy])
+
+    @classmethod
+    def from_geometries(cls, geometries, ids=None, step=TOPOLOGY_STEP):
+        """Encode (Multi)Polygons into a topology.
+
+        Args:
+            geometries (array-like): Polygons or MultiPolygons in EPSG:4326. Missing geometries
+                are kept as empty entries.
+            ids (array-like, optional): Identifier of each geometry. Defaults to 0..n-1.
+            step (float, optional): Quantisation grid in degrees. Defaults to TOPOLOGY_STEP.
+
+        Returns:
+            Topology: The encoded geometries.
+        """
+        geometries = np.asarray(geometries, dtype=object)
+        ids = np.arange(len(geometries)) if ids is None else np.asarray(ids)
+        multi = shapely.get_type_id(geometries) == 6
+        parts, part_geom = shapely.get_parts(geometries, return_index=True)
+        assert (shapely.get_type_id(parts) == 3).all(), print("Only Polygons and MultiPolygons can be encoded.")
+        rings, ring_part = shapely.get_rings(parts, return_index=True)
+        is_exterior = np.r_[True, ring_part[1:] != ring_part[:-1]]
+        coords, ring_of = shapely.get_coordinates(rings, return_index=True)
+
+        translate = coords.min(axis=0) if len(coords) else np.zeros(2)
+        q = np.round((coords - translate) / step).astype(np.int64)
+        # snapping can repeat a point, drop consecutive duplicates within a ring
+        keep = np.r_[True, (ring_of[1:] != ring_of[:-1]) | (q[1:] != q[:-1]).any(axis=1)]
+        q, ring_of = q[keep], ring_of[keep]
+
+        # rings that collapsed on the grid are dropped, together with parts that lost their exterior
+        ring_len = np.bincount(ring_of, minlength=len(rings))
+        part_ok = np.ones(len(parts), dtype=bool)
+        part_ok[ring_part[is_exterior & (ring_len < 4)]] = False
+        ring_ok = (ring_len >= 4) & part_ok[ring_part]
+        pt_ok = ring_ok[ring_of]
+        q, ring_of = q[pt_ok], np.cumsum(ring_ok)[ring_of[pt_ok]] - 1
+        ring_part = np.cumsum(part_ok)[ring_part[ring_ok]] - 1
+        part_geom = part_geom[part_ok]
+        n_rings = int(ring_ok.sum())
+
+        # open rings (closing point removed) of integer vertex ids
+        closing = np.r_[ring_of[1:] != ring_of[:-1], True] if len(ring_of) else np.zeros(0, dtype=bool)
+        q, ring_of = q[~closing], ring_of[~closing]
+        ny = q[:, 1].max() + 1 if len(q) else 1
+        uniq, vid = np.unique(q[:, 0] * ny + q[:, 1], return_inverse=True)
+        vid = vid.ravel()
+        ring_ptr = np.zeros(n_rings + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ring_of, minlength=n_rings), out=ring_ptr[1:])
+
+        # every edge is owned by a set of rings, summarised as a sum of ring hashes;
+        # a vertex is a junction where that set differs between its two edges
+        pos = np.arange(len(vid))
+        nxt = np.where(pos + 1 == ring_ptr[ring_of + 1], ring_ptr[ring_of], pos + 1)
+        prv = np.where(pos == ring_ptr[ring_of], ring_ptr[ring_of + 1] - 1, pos - 1)
+        a, b = vid[pos], vid[nxt]
+        edges, edge_of = np.unique(np.minimum(a, b) * len(uniq) + np.maximum(a, b), return_inverse=True)
+        edge_of = edge_of.ravel()
+        owners = np.zeros(len(edges), dtype=np.uint64)
+        np.add.at(owners, edge_of, mix_ids(ring_of))
+        junction = owners[edge_of[prv]] != owners[edge_of]
+
+        arc_lookup = {}
+        arcs = []
+        ring_arcs = []
+        ring_indptr = np.zeros(n_rings + 1, dtype=np.int64)
+        for r in range(n_rings):
+            s, e = ring_ptr[r], ring_ptr[r+1]
+            seq = vid[s:e]
+            cuts = np.flatnonzero(junction[s:e])
+            if len(cuts) == 0:
+                # rotate junction-free rings to a canonical start so shared rings match
+                seq = np.roll(seq, -int(np.argmin(seq)))
+                cuts = np.zeros(1, dtype=np.int64)
+            else:
+                seq = np.roll(seq, -int(cuts[0]))
+                cuts = cuts - cuts[0]
+            closed = np.append(seq, seq[0])
+            bounds = np.append(cuts, len(seq))
+            for k in range(len(cuts)):
+                arc, reverse = canonical_arc(closed[bounds[k]:bounds[k+1]+1])
+                key = arc.tobytes()
+                idx = arc_lookup.get(key)
+                if idx is None:
+                    idx = arc_lookup[key] = len(arcs)
+                    arcs.append(arc)
+                ring_arcs.append(~idx if reverse else idx)
+            ring_indptr[r+1] = len(ring_arcs)
+
+        arc_indptr = np.zeros(len(arcs) + 1, dtype=np.int64)
+        np.cumsum([len(arc) for arc in arcs], out=arc_indptr[1:])
+        arc_vid = np.concatenate(arcs) if arcs else np.zeros(0, dtype=np.int64)
+        arc_xy = np.column_stack([uniq[arc_vid] // ny, uniq[arc_vid] % ny])
+
+        geom_indptr = np.zeros(len(geometries) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(part_geom, minlength=len(geometries)), out=geom_indptr[1:])
+        part_indptr = np.zeros(len(part_geom) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ring_part, minlength=len(part_geom)), out=part_indptr[1:])
+        return cls(ids, multi, geom_indptr, part_indptr, ring_indptr, np.asarray(ring_arcs, dtype=np.int32),
+                   arc_indptr, arc_xy, translate, step)
+
+    @classmethod
+    def from_gdf(cls, gdf, step=TOPOLOGY_STEP):
+        """Encode the geometries of a GeoDataFrame, keyed on its index."""
+        return cls.from_geometries(gdf.to_crs("EPSG:4326").geometry.values, ids=gdf.index, step=step)
+
+    def save(self, path):
+        """Write the topology to a .npz file."""
+        np.savez(path, ids=np.asarray(self.ids).astype(str), multi=self.multi,
+                 geom_indptr=self.geom_indptr, part_indptr=self.part_indptr,
+                 ring_indptr=self.ring_indptr, ring_arcs=self.ring_arcs,
+                 arc_indptr=self.arc_indptr, arc_xy=self.arc_xy,
+                 translate=self.translate, step=np.float64(self.step))
+
+    @classmethod
+    def load(cls, path):
+        """Read a topology written by save."""
+        with np.load(path) as f:
+            return cls(f['ids'], f['multi'], f['geom_indptr'], f['part_indptr'], f['ring_indptr'],
+                       f['ring_arcs'], f['arc_indptr'], f['arc_xy'], f['translate'], float(f['step']))
+
+    def positions(self, ids):
+        """Convert geometry ids to integer positions."""
+        pos = self.ids.get_indexer(list(ids))
+        if (pos < 0).any():
+            raise KeyError("Unknown geometry ids: %s" % list(np.asarray(list(ids), dtype=object)[pos < 0][:5]))
+        return pos
+
+    def simplify(self, tolerance):
+        """Simplify every arc once, so neighbouring polygons stay seamless.
+
+        Arc end points (the junctions) never move. Results are kept per tolerance.
+
+        Args:
+            tolerance (float): Simplification tolerance in degrees.
+
+        Returns:
+            Topology: Topology with simplified arcs and the same rings.
+        """
+        if tolerance in self._simplified:
+            return self._simplified[tolerance]
+        coords = self.arc_xy * self.step + self.translate
+        arc_of = np.repeat(np.arange(self.n_arcs), np.diff(self.arc_indptr))
+        lines = shapely.linestrings(coords, indices=arc_of)
+        # topology preserving simplification keeps closed arcs as valid rings
+        coords, arc_of = shapely.get_coordinates(shapely.simplify(lines, tolerance, preserve_topology=True),
+                                                 return_index=True)
+        arc_indptr = np.zeros(self.n_arcs + 1, dtype=np.int64)
+        np.cumsum(np.bincount(arc_of, minlength=self.n_arcs), out=arc_indptr[1:])
+        arc_xy = np.round((coords - self.translate) / self.step)
+        topo = Topology(self.ids, self.multi, self.geom_indptr, self.part_indptr, self.ring_indptr,
+                        self.ring_arcs, arc_indptr, arc_xy, self.translate, self.step)
+        self._simplified[tolerance] = topo
+        return topo
+
+    def geometries(self, pos=None):
+        """Reassemble (Multi)Polygons from the arcs.
+
+        Args:
+            pos (array-like, optional): Positions of the geometries to decode. Defaults to all.
+
+        Returns:
+            numpy.ndarray: Shapely geometries, None where nothing is left (e.g. after simplification).
+        """
+        pos = np.arange(len(self)) if pos is None else np.asarray(pos, dtype=np.int64)
+        parts, part_owner = expand_ranges(self.geom_indptr, pos)
+        rings, ring_owner = expand_ranges(self.part_indptr, parts)
+        refs_at, ref_owner = expand_ranges(self.ring_indptr, rings)
+        refs = self.ring_arcs[refs_at].astype(np.int64)
+
+        # concatenate the arcs of each ring, dropping the repeated first point of every arc but the first
+        reverse = refs < 0
+        arc = np.where(reverse, ~refs, refs)
+        skip = np.r_[False, ref_owner[1:] == ref_owner[:-1]].astype(np.int64)
+        start, end = self.arc_indptr[arc], self.arc_indptr[arc + 1]
+        lengths = end - start - skip
+        ref_of = np.repeat(np.arange(len(refs)), lengths)
+        k = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        pts = np.where(reverse[ref_of], end[ref_of] - 1 - skip[ref_of] - k, start[ref_of] + skip[ref_of] + k)
+        ring_of = ref_owner[ref_of]
+        coords = self.arc_xy[pts] * self.step + self.translate
+
+        # rings that collapsed are dropped, as are parts whose exterior collapsed
+        ring_len = np.bincount(ring_of, minlength=len(rings))
+        is_exterior = np.r_[True, ring_owner[1:] != ring_owner[:-1]] if len(rings) else np.zeros(0, dtype=bool)
+        part_ok = np.ones(len(parts), dtype=bool)
+        part_ok[ring_owner[is_exterior & (ring_len < 4)]] = False
+        ring_ok = (ring_len >= 4) & part_ok[ring_owner]
+        pt_ok = ring_ok[ring_of]
+        out = np.full(len(pos), None, dtype=object)
+        if not ring_ok.any():
+            return out
+        ring_geoms = shapely.linearrings(coords[pt_ok], indices=np.cumsum(ring_ok)[ring_of[pt_ok]] - 1)
+        polygons = shapely.polygons(ring_geoms, indices=np.cumsum(part_ok)[ring_owner[ring_ok]] - 1)
+        owner = part_owner[part_ok]
+
+        multi = self.multi[pos]
+        single = ~multi[owner]
+        out[owner[single]] = polygons[single]
+        if (~single).any():
+            geoms, inverse = np.unique(owner[~single], return_inverse=True)
+            out[geoms] = shapely.multipolygons(polygons[~single], indices=inverse.ravel())
+        return out
+
+    def to_gdf(self, pos=None, tolerance=None):
+        """GeoDataFrame of the decoded geometries indexed by id, optionally simplified."""
+        topo = self if tolerance is None else self.simplify(tolerance)
+        pos = np.arange(len(self)) if pos is None else np.asarray(pos, dtype=np.int64)
+        return gpd.GeoDataFrame(geometry=topo.geometries(pos), index=self.ids[pos], crs="EPSG:4326")
+
+    def to_topojson(self, pos=None, properties=None, name='boundaries'):
+        """Export as a quantised TopoJSON dictionary.
+
+        Only the arcs used by the selected geometries are written.
+
+        Args:
+            pos (array-like, optional): Positions of the geometries to export. Defaults to all.
+            properties (pandas.DataFrame, optional): Properties of the selected geometries, one
+                row per geometry in the same order. Defaults to None.
+            name (str, optional): Name of the object collection. Defaults to 'boundaries'.
+
+        Returns:
+            dict: TopoJSON topology, e.g. for json.dump or folium.TopoJson.
+        """
+        pos = np.arange(len(self)) if pos is None else np.asarray(pos, dtype=np.int64)
+        refs_at, _ = expand_ranges(self.ring_indptr, expand_ranges(self.part_indptr,
+                                                                     expand_ranges(self.geom_indptr, pos)[0])[0])
+        refs = self.ring_arcs[refs_at].astype(np.int64)
+        used = np.unique(np.where(refs < 0, ~refs, refs))
+        remap = np.full(self.n_arcs, -1, dtype=np.int64)
+        remap[used] = np.arange(len(used))
+
+        arcs = []
+        for a in used:
+            xy = self.arc_xy[self.arc_indptr[a]:self.arc_indptr[a+1]].astype(np.int64)
+            arcs.append(np.vstack([xy[:1], np.diff(xy, axis=0)]).tolist())
+
+        records = properties.to_dict('records') if properties is not None else [None]*len(pos)
+        geometries = []
+        for g, record in zip(pos, records):
+            polys = []
+            for p in range(self.geom_indptr[g], self.geom_indptr[g+1]):
+                rings = []
+                for r in range(self.part_indptr[p], self.part_indptr[p+1]):
+                    refs = self.ring_arcs[self.ring_indptr[r]:self.ring_indptr[r+1]].astype(np.int64)
+                    rings.append([int(remap[i]) if i >= 0 else int(~remap[~i]) for i in refs])
+                polys.append(rings)
+            geom = {'type': 'MultiPolygon', 'arcs': polys} if self.multi[g] else \
+                   {'type': 'Polygon', 'arcs': polys[0] if polys else []}
+            geom['id'] = str(self.ids[g])
+            if record is not None:
+                geom['properties'] = json.loads(json.dumps(record, default=str))
+            geometries.append(geom)
+
+        return {'type': 'Topology',
+                'transform': {'scale': [self.step, self.step], 'translate': self.translate.tolist()},
+                'objects': {name: {'type': 'GeometryCollection', 'geometries': geometries}},
+                'arcs': arcs}
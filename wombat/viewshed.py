@@ -0,0 +1,183 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+EARTH_DIAMETER_M = 12742000.0
+# GDAL's default coefficient for earth curvature less atmospheric refraction (1 - 1/7)
+CURVATURE_COEFF = 0.85714
+
+def pixel_size_m(gt, lat):
+    """Approximate pixel size in metres of a geographic (degree) raster at a latitude.
+
+    Args:
+        gt (tuple): GDAL geotransform of the raster.
+        lat (float): Latitude in degrees.
+
+    Returns:
+        tuple: (x, y) pixel size in metres.
+    """
+    return abs(gt[1]) * 111320.0 * np.cos(np.radians(lat)), abs(gt[5]) * 110574.0
+
+def ring_cells(r0, c0, d, nrows, ncols):
+    """Cells at Chebyshev distance d from (r0, c0) that lie inside the grid.
+
+    Returns:
+        tuple: (dy, dx) integer offsets from the observer.
+    """
+    k = np.arange(-d, d + 1)
+    dy = np.concatenate([np.full(len(k), -d), np.full(len(k), d), k[1:-1], k[1:-1]])
+    dx = np.concatenate([k, k, np.full(len(k) - 2, -d), np.full(len(k) - 2, d)])
+    inside = (r0 + dy >= 0) & (r0 + dy < nrows) & (c0 + dx >= 0) & (c0 + dx < ncols)
+    return dy[inside], dx[inside]
+
+def viewshed(dem, observer_row, observer_col, observer_height=1.7, target_height=0.0, max_distance=None,
+             pixel_size=(1.0, 1.0), curvature_coeff=CURVATURE_COEFF, output='boolean'):
+    """Viewshed of a single observer over a DEM grid, XDraw style.
+
+    Cells are processed in square rings of increasing distance from the observer. The line
+    from a cell back to the observer crosses the previous ring between two cells, and the
+    cell's horizon is interpolated from their horizons (the steepest gradient met so far
+    on the way out). Each ring is a handful of array operations, so the whole grid costs
+    O(n^2) work with O(n) Python steps.
+
+    Args:
+        dem (numpy.ndarray): Elevations in metres, NaN for nodata.
+        observer_row (int): Row of the observer.
+        observer_col (int): Column of the observer.
+        observer_height (float, optional): Observer height above the ground in metres. Defaults to 1.7.
+        target_height (float, optional): Target height above the ground in metres. Defaults to 0.
+        max_distance (float, optional): Maximum distance in metres. Defaults to None (whole grid).
+        pixel_size (tuple, optional): (x, y) pixel size in metres, see pixel_size_m. Defaults to (1, 1).
+        curvature_coeff (float, optional): Curvature/refraction coefficient, as in gdal_viewshed:
+            elevations are lowered by curvature_coeff * distance^2 / earth diameter. Use 0 to
+            ignore curvature. Defaults to 0.85714.
+        output (str, optional): 'boolean' for visibility, or 'angle' for the angle in degrees
+            between the line of sight to the target and the horizon in front of it (>= 0
+            where visible). Defaults to 'boolean'.
+
+    Returns:
+        numpy.ndarray: Boolean visibility (False beyond max_distance or on nodata), or float
+            angles (NaN beyond max_distance or on nodata).
+    """
+    assert output in ['boolean', 'angle'], print("Please use 'boolean' or 'angle'.")
+    dem = np.asarray(dem, dtype=np.float64)
+    nrows, ncols = dem.shape
+    r0, c0 = int(observer_row), int(observer_col)
+    assert 0 <= r0 < nrows and 0 <= c0 < ncols, print("Observer is outside the grid.")
+    z0 = dem[r0, c0] + observer_height
+    assert np.isfinite(z0), print("Observer is on a nodata cell.")
+    px, py = pixel_size
+
+    # steepest gradient (tan of the elevation angle) from the observer seen so far along each line
+    horizon = np.full(dem.shape, -np.inf)
+    result = np.full(dem.shape, np.nan)
+    result[r0, c0] = np.inf
+
+    dmax = max(r0, nrows - 1 - r0, c0, ncols - 1 - c0)
+    if max_distance is not None:
+        dmax = min(dmax, int(np.ceil(max_distance / min(px, py))))
+    for d in range(1, dmax + 1):
+        dy, dx = ring_cells(r0, c0, d, nrows, ncols)
+        rows, cols = r0 + dy, c0 + dx
+
+        # where the line back to the observer crosses ring d-1
+        xmajor = np.abs(dx) == d
+        f = (d - 1) / d
+        major = np.where(xmajor, dx, dy)
+        minor = np.where(xmajor, dy, dx) * f
+        m0 = np.floor(minor)
+        t = minor - m0
+        m0 = m0.astype(np.int64)
+        m1 = np.where(t > 0, m0 + 1, m0)
+        step = np.sign(major) * (d - 1)
+        r_a = np.where(xmajor, r0 + m0, r0 + step)
+        c_a = np.where(xmajor, c0 + step, c0 + m0)
+        r_b = np.where(xmajor, r0 + m1, r0 + step)
+        c_b = np.where(xmajor, c0 + step, c0 + m1)
+        behind = horizon[r_a, c_a] * (1 - t) + np.where(t > 0, horizon[r_b, c_b], 0.0) * t
+        behind = np.where(np.isneginf(horizon[r_a, c_a]) | np.isneginf(horizon[r_b, c_b]), -np.inf, behind)
+
+        dist = np.hypot(dx * px, dy * py)
+        z = dem[rows, cols] - curvature_coeff * dist**2 / EARTH_DIAMETER_M
+        ground = (z - z0) / dist
+        target = (z + target_height - z0) / dist
+        horizon[rows, cols] = np.fmax(ground, behind)
+
+        within = np.isfinite(z) if max_distance is None else np.isfinite(z) & (dist <= max_distance)
+        angle = np.degrees(np.arctan(target)) - np.degrees(np.arctan(behind))
+        result[rows[within], cols[within]] = angle[within]
+
+    if output == 'angle':
+        result[r0, c0] = 90.0
+        return result
+    return result >= 0
+
+_shared = {}
+
+def _attach_shared(dem_name, shape, counts_name, n_slots):
+    """Process pool initializer: map the shared DEM and count rasters into the worker."""
+    dem_shm = shared_memory.SharedMemory(name=dem_name)
+    counts_shm = shared_memory.SharedMemory(name=counts_name)
+    _shared['shm'] = (dem_shm, counts_shm)
+    _shared['dem'] = np.ndarray(shape, dtype=np.float64, buffer=dem_shm.buf)
+    _shared['counts'] = np.ndarray((n_slots,) + tuple(shape), dtype=np.int32, buffer=counts_shm.buf)
+
+def _count_visible(slot, rows, cols, kwargs):
+    """Add the viewsheds of a batch of observers to the worker's count raster."""
+    dem, counts = _shared['dem'], _shared['counts'][slot]
+    for r, c in zip(rows, cols):
+        counts += viewshed(dem, r, c, output='boolean', **kwargs)
+    return len(rows)
+
+def cumulative_viewshed(dem, observer_rows, observer_cols, observer_height=1.7, target_height=0.0,
+                        max_distance=None, pixel_size=(1.0, 1.0), curvature_coeff=CURVATURE_COEFF, workers=None):
+    """Number of observers from which each cell is visible.
+
+    Observers are split into one batch per worker process. The DEM is placed in shared
+    memory rather than pickled to every task, and each batch accumulates into its own
+    int32 count raster, also in shared memory, which are summed at the end. Memory is
+    therefore bounded by (workers + 1) count rasters regardless of the number of observers.
+
+    Args:
+        dem (numpy.ndarray): Elevations in metres, NaN for nodata.
+        observer_rows (array-like): Observer rows.
+        observer_cols (array-like): Observer columns.
+        observer_height (float, optional): Observer height above the ground in metres. Defaults to 1.7.
+        target_height (float, optional): Target height above the ground in metres. Defaults to 0.
+        max_distance (float, optional): Maximum distance in metres. Defaults to None.
+        pixel_size (tuple, optional): (x, y) pixel size in metres. Defaults to (1, 1).
+        curvature_coeff (float, optional): Curvature/refraction coefficient. Defaults to 0.85714.
+        workers (int, optional): Number of processes. Defaults to the CPU count.
+
+    Returns:
+        numpy.ndarray: int32 counts with the shape of dem.
+    """
+    dem = np.asarray(dem, dtype=np.float64)
+    observer_rows = np.asarray(observer_rows, dtype=np.int64)
+    observer_cols = np.asarray(observer_cols, dtype=np.int64)
+    kwargs = dict(observer_height=observer_height, target_height=target_height, max_distance=max_distance,
+                  pixel_size=pixel_size, curvature_coeff=curvature_coeff)
+    workers = min(workers or os.cpu_count() or 1, max(len(observer_rows), 1))
+    batches = np.array_split(np.arange(len(observer_rows)), workers)
+
+    dem_shm = shared_memory.SharedMemory(create=True, size=dem.nbytes)
+    counts_shm = shared_memory.SharedMemory(create=True, size=workers * dem.size * 4)
+    try:
+        np.ndarray(dem.shape, dtype=np.float64, buffer=dem_shm.buf)[:] = dem
+        counts = np.ndarray((workers,) + dem.shape, dtype=np.int32, buffer=counts_shm.buf)
+        counts[:] = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared,
+                                 initargs=(dem_shm.name, dem.shape, counts_shm.name, workers)) as executor:
+            futures = [executor.submit(_count_visible, slot, observer_rows[b], observer_cols[b], kwargs)
+                       for slot, b in enumerate(batches)]
+            for future in futures:
+                future.result()
+        total = counts.sum(axis=0, dtype=np.int32)
+        del counts
+    finally:
+        dem_shm.close()
+        dem_shm.unlink()
+        counts_shm.close()
+        counts_shm.unlink()
+    return total
@@ -21,6 +21,9 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 from wombat.datasets import City
 import geopandas as gpd
 import leafmap.foliumap as leafmap
+import folium
+from wombat.topology import Topology
+from wombat.hierarchy import zoom_to_resolution
 
 def new_map(center,zoom=10):
     mymap = leafmap.Map() #location=center,zoom_start=zoom)
@@ -62,20 +65,43 @@ class Wombat(leafmap.Map):
     def set_area_as_states(self):
         self.gdf = self.Boundary.get_states()
     
-    def set_area_as_sa4(self,belonging_to):
-        self.gdf = self.Boundary.get_sa4(belonging_to)
+    def current_zoom(self):
+        """Zoom level the map is currently drawn at, or None if unknown."""
+        zoom = getattr(self,'zoom',None)
+        if zoom is None:
+            zoom = getattr(self,'options',{}).get('zoom')
+        return zoom
+    
+    def boundary_resolution(self,resolution=None,zoom=None):
+        """Simplification (degrees) for boundaries drawn on the map.
+        
+        Args:
+            resolution (float, optional): Explicit resolution, used as is. Defaults to None.
+            zoom (int, optional): Zoom level to derive the resolution from. Defaults to None (the map's current zoom).
+        
+        Returns:
+            float: Resolution in degrees, or None for full resolution when no zoom is known.
+        """
+        if resolution is not None:
+            return resolution
+        if zoom is None:
+            zoom = self.current_zoom()
+        return zoom_to_resolution(zoom) if zoom is not None else None
+    
+    def set_area_as_sa4(self,belonging_to,resolution=None,zoom=None):
+        self.gdf = self.Boundary.get_sa4(belonging_to,resolution=self.boundary_resolution(resolution,zoom))
       
-    def set_area_as_sa3(self,belonging_to):
-        self.gdf = self.Boundary.get_sa3(belonging_to)
+    def set_area_as_sa3(self,belonging_to,resolution=None,zoom=None):
+        self.gdf = self.Boundary.get_sa3(belonging_to,resolution=self.boundary_resolution(resolution,zoom))
     
-    def set_area_as_sa2(self,belonging_to):
-        self.gdf = self.Boundary.get_sa2(belonging_to)
+    def set_area_as_sa2(self,belonging_to,resolution=None,zoom=None):
+        self.gdf = self.Boundary.get_sa2(belonging_to,resolution=self.boundary_resolution(resolution,zoom))
         
-    def set_area_as_sa1(self,belonging_to):
-        self.gdf = self.Boundary.get_sa1(belonging_to)
+    def set_area_as_sa1(self,belonging_to,resolution=None,zoom=None):
+        self.gdf = self.Boundary.get_sa1(belonging_to,resolution=self.boundary_resolution(resolution,zoom))
     
-    def set_area_as_meshblocks(self,belonging_to):
-        self.gdf = self.Boundary.get_meshblocks(belonging_to)
+    def set_area_as_meshblocks(self,belonging_to,resolution=None,zoom=None):
+        self.gdf = self.Boundary.get_meshblocks(belonging_to,resolution=self.boundary_resolution(resolution,zoom))
         
     # Method to set the city for analysis and initialize Urbanity object instance
     def set_area_as_city(self,city):
@@ -108,9 +134,32 @@ class Wombat(leafmap.Map):
         else:
             print('No polygon layer found on map.')
 
-    def show_boundary(self):
+    def show_boundary(self,resolution=None,zoom=None):
         #self.Map = new_map([self.City.lat,self.City.lon],zoom=self.zoom)
-        self.add_gdf(self.Boundary.gdf.copy(),layer_name='[ SA3 Boundary ] %s'%self.City.name)
+        gdf = self.Boundary.gdf.copy()
+        resolution = self.boundary_resolution(resolution,zoom)
+        if resolution is not None:
+            gdf['geometry'] = gdf['geometry'].simplify(resolution,preserve_topology=True)
+        self.add_gdf(gdf,layer_name='[ SA3 Boundary ] %s'%self.City.name)
+    
+    def add_topojson(self,gdf,layer_name='Boundaries',tolerance=None,style=None,show=True):
+        """Add boundaries to the map as TopoJSON, sending each shared edge only once.
+        
+        Args:
+            gdf (GeoDataFrame): Boundaries to show, e.g. from Boundary.get_sa1.
+            layer_name (str, optional): Layer name. Defaults to 'Boundaries'.
+            tolerance (float, optional): Simplify the shared arcs by this many degrees. Defaults to None.
+            style (dict, optional): Leaflet path style. Defaults to None.
+            show (bool, optional): Whether the layer is shown initially. Defaults to True.
+        """
+        topo = Topology.from_gdf(gdf)
+        if tolerance is not None:
+            topo = topo.simplify(tolerance)
+        properties = gdf.drop(columns=gdf.geometry.name).reset_index()
+        data = topo.to_topojson(properties=properties,name='boundaries')
+        style = style if style is not None else {'color': 'black','fillOpacity':0,'weight':1}
+        folium.TopoJson(data,'objects.boundaries',name=layer_name,show=show,
+                        style_function=lambda feature: style).add_to(self)
     
     def show_schools(self,secondary_catchment=True,
                           primary_catchment=True,